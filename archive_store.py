@@ -0,0 +1,283 @@
+#
+# FILENAME: archive_store.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.0 (Content-Addressed Archive Store)
+#
+# DESCRIPTION:
+# Consolidates every output_vNN folder into one content-addressed
+# store, so a transcript that is unchanged between runs is kept once.
+# Each file is stored as a compressed blob named after the SHA-256 of
+# its contents (zstd if the optional 'zstandard' package is installed,
+# gzip otherwise), and each version gets a small manifest listing its
+# files and their hashes. output_vNN/ can be rebuilt from the store as
+# a plain export, or as a lightweight view in which the transcripts
+# are links into a shared, decompressed cache. The store can be
+# verified against its hashes, and blobs no manifest references can be
+# garbage-collected.
+#
+# USAGE:
+#   python scraper_master.py archive add 38 [--replace]   (store output_v38; --replace turns it into a view)
+#   python scraper_master.py archive materialize 38 [--link] [--target DIR]
+#   python scraper_master.py archive verify [38]
+#   python scraper_master.py archive gc [--dry-run]
+#   python scraper_master.py archive status
+#
+
+import os
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+from datetime import datetime
+
+from run_manifest import write_json_atomic, OUTPUT_DIR_PATTERN
+
+## ------------------- CONFIGURATION ------------------- ##
+ARCHIVE_DIR = "archive"
+BLOB_DIR_NAME = "blobs"
+VERSION_DIR_NAME = "versions"
+PLAIN_CACHE_DIR_NAME = "plain"  # decompressed blobs shared by linked views
+DEFAULT_COMPRESSION = "zstd"    # falls back to gzip without 'zstandard'
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+CHUNK_SIZE = 1024 * 1024
+LINKED_SUFFIXES = (".txt",)     # only files that are never rewritten in place become links
+## ----------------------------------------------------- ##
+
+CODEC_SUFFIXES = {'zstd': ".zst", 'gzip': ".gz"}
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+class ArchiveStore:
+    """Compressed, content-addressed blobs plus one file manifest per version."""
+
+    def __init__(self, root=ARCHIVE_DIR, compression=DEFAULT_COMPRESSION):
+        self.root = root
+        self.blob_dir = os.path.join(root, BLOB_DIR_NAME)
+        self.version_dir = os.path.join(root, VERSION_DIR_NAME)
+        self.plain_dir = os.path.join(root, PLAIN_CACHE_DIR_NAME)
+        self.fallback_warning = compression == "zstd" and not _zstd()
+        self.compression = "gzip" if self.fallback_warning else compression
+        for directory in (self.blob_dir, self.version_dir, self.plain_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    # --- blobs ---
+    def blob_path(self, digest):
+        """Path of an existing blob (any codec), or None."""
+        for suffix in CODEC_SUFFIXES.values():
+            path = os.path.join(self.blob_dir, digest[:2], digest + suffix)
+            if os.path.exists(path): return path
+        return None
+
+    def _compressed_writer(self, raw):
+        if self.compression == "zstd":
+            return _zstd().ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=False)
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL, mtime=0)
+
+    def put_file(self, path):
+        """Stores a file's contents (streamed). Returns (digest, size, newly_stored)."""
+        digest, size = hashlib.sha256(), 0
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(block); size += len(block)
+        digest = digest.hexdigest()
+        if self.blob_path(digest):
+            return digest, size, False
+        if self.fallback_warning:
+            print("[WARNING] The optional 'zstandard' package is not installed; new blobs use gzip.")
+            self.fallback_warning = False
+        target = os.path.join(self.blob_dir, digest[:2], digest + CODEC_SUFFIXES[self.compression])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = target + ".tmp"
+        with open(path, 'rb') as source, open(tmp_path, 'wb') as raw:
+            writer = self._compressed_writer(raw)
+            shutil.copyfileobj(source, writer, CHUNK_SIZE)
+            writer.close()
+        os.replace(tmp_path, target)
+        return digest, size, True
+
+    def open_blob(self, digest):
+        """Opens a blob for streaming, decompressed reads."""
+        path = self.blob_path(digest)
+        if not path: raise FileNotFoundError(f"Blob {digest} is missing from the archive.")
+        if path.endswith(CODEC_SUFFIXES['gzip']):
+            return gzip.open(path, 'rb')
+        zstandard = _zstd()
+        if not zstandard: raise RuntimeError(f"Blob {digest} is zstd-compressed; install 'zstandard' to read it.")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+
+    def extract_blob(self, digest, destination):
+        """Decompresses a blob to `destination` through a temporary file."""
+        tmp_path = destination + ".tmp"
+        with self.open_blob(digest) as source, open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(source, f, CHUNK_SIZE)
+        os.replace(tmp_path, destination)
+
+    def plain_copy(self, digest):
+        """The shared decompressed copy of a blob, created on first use."""
+        path = os.path.join(self.plain_dir, digest[:2], digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.extract_blob(digest, path)
+        return path
+
+    # --- versions ---
+    def version_manifest_path(self, version):
+        return os.path.join(self.version_dir, f"v{version}.json")
+
+    def versions(self):
+        names = [name[1:-5] for name in os.listdir(self.version_dir) if name.startswith('v') and name.endswith('.json')]
+        return sorted(names, key=lambda v: int(v) if v.isdigit() else v)
+
+    def load_version(self, version):
+        with open(self.version_manifest_path(version), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def add_version(self, version, output_dir=None):
+        """Stores every file of output_vNN and writes the version manifest."""
+        output_dir = output_dir or f"output_v{version}"
+        files, stored, stored_bytes, total_bytes = {}, 0, 0, 0
+        for folder, _, names in os.walk(output_dir):
+            for name in sorted(names):
+                if name.endswith(".tmp"): continue
+                path = os.path.join(folder, name)
+                digest, size, new = self.put_file(path)
+                files[os.path.relpath(path, output_dir).replace(os.sep, '/')] = {'hash': digest, 'size': size}
+                total_bytes += size
+                if new: stored += 1; stored_bytes += os.path.getsize(self.blob_path(digest))
+        write_json_atomic(self.version_manifest_path(version), {
+            'version': str(version), 'source': output_dir,
+            'archived_at': datetime.now().isoformat(timespec='seconds'), 'files': files
+        })
+        print(f"[SUCCESS] Archived v{version}: {len(files)} files ({total_bytes / 1024:.1f} KB), "
+              f"{stored} new blobs ({stored_bytes / 1024:.1f} KB compressed), {len(files) - stored} already stored.")
+        return files
+
+    def materialize(self, version, target=None, link=False):
+        """Rebuilds a version's folder from the store, as copies or as links into the plain cache."""
+        target = target or f"output_v{version}"
+        files = self.load_version(version)['files']
+        linked = 0
+        for relative, info in files.items():
+            destination = os.path.join(target, *relative.split('/'))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            if os.path.lexists(destination): os.remove(destination)
+            if link and relative.endswith(LINKED_SUFFIXES):
+                _link(self.plain_copy(info['hash']), destination); linked += 1
+            else:
+                self.extract_blob(info['hash'], destination)
+        print(f"[SUCCESS] Materialized v{version} into '{target}': {linked} linked, {len(files) - linked} copied.")
+        return target
+
+    def referenced_hashes(self):
+        hashes = set()
+        for version in self.versions():
+            hashes.update(info['hash'] for info in self.load_version(version)['files'].values())
+        return hashes
+
+    # --- maintenance ---
+    def verify(self, versions=None):
+        """Re-hashes every blob a version references. Returns the number of problems."""
+        problems, checked = 0, set()
+        for version in versions or self.versions():
+            for relative, info in self.load_version(version)['files'].items():
+                digest = info['hash']
+                if digest in checked: continue
+                checked.add(digest)
+                try:
+                    actual, size = hashlib.sha256(), 0
+                    with self.open_blob(digest) as f:
+                        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            actual.update(block); size += len(block)
+                    if actual.hexdigest() != digest or size != info['size']:
+                        problems += 1; print(f"[ERROR] v{version} '{relative}': blob {digest[:12]} is corrupt.")
+                except (OSError, EOFError, RuntimeError) as e:
+                    problems += 1; print(f"[ERROR] v{version} '{relative}': {e}")
+                plain = os.path.join(self.plain_dir, digest[:2], digest)
+                if os.path.exists(plain) and _file_digest(plain) != digest:
+                    problems += 1; print(f"[ERROR] Cached copy of {digest[:12]} was modified; delete '{plain}' to rebuild it.")
+        print(f"[{'SUCCESS' if not problems else 'WARNING'}] Verified {len(checked)} blobs: {problems} problem(s).")
+        return problems
+
+    def gc(self, dry_run=False):
+        """Deletes blobs and cached copies that no version manifest references."""
+        keep = self.referenced_hashes()
+        removed, freed = 0, 0
+        for directory in (self.blob_dir, self.plain_dir):
+            for folder, _, names in os.walk(directory):
+                for name in names:
+                    digest = name.split('.')[0]
+                    if digest in keep and not name.endswith(".tmp"): continue
+                    path = os.path.join(folder, name)
+                    freed += os.path.getsize(path); removed += 1
+                    if not dry_run: os.remove(path)
+        print(f"[SUCCESS] {'Would remove' if dry_run else 'Removed'} {removed} unreferenced files ({freed / 1024:.1f} KB).")
+        return removed
+
+    def status(self):
+        logical, blobs, stored = 0, 0, 0
+        for version in self.versions():
+            logical += sum(info['size'] for info in self.load_version(version)['files'].values())
+        for folder, _, names in os.walk(self.blob_dir):
+            for name in names:
+                blobs += 1; stored += os.path.getsize(os.path.join(folder, name))
+        ratio = logical / stored if stored else 0
+        print(f"[INFO] Archive '{self.root}': {len(self.versions())} versions, {blobs} blobs, "
+              f"{logical / 1024:.1f} KB of outputs stored in {stored / 1024:.1f} KB ({ratio:.1f}x).")
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _link(source, destination):
+    """Symlinks `destination` to `source`, falling back to a hard link (e.g. Windows without privileges)."""
+    try:
+        os.symlink(os.path.relpath(source, os.path.dirname(destination)), destination)
+    except OSError:
+        os.link(source, destination)
+
+def archive_command(argv):
+    """Handles the add/materialize/verify/gc/status sub-commands."""
+    parser = argparse.ArgumentParser(prog="archive", description="Manage the content-addressed archive store.")
+    parser.add_argument("command", choices=["add", "materialize", "verify", "gc", "status"])
+    parser.add_argument("version", nargs="?", help="Run version (e.g. 38); 'add' accepts 'all'.")
+    parser.add_argument("--replace", action="store_true", help="add: replace output_vNN with a linked view afterwards.")
+    parser.add_argument("--link", action="store_true", help="materialize: link transcripts instead of copying them.")
+    parser.add_argument("--target", help="materialize: folder to write to (default output_vNN).")
+    parser.add_argument("--dry-run", action="store_true", help="gc: only report what would be removed.")
+    parser.add_argument("--compression", choices=sorted(CODEC_SUFFIXES), default=DEFAULT_COMPRESSION)
+    args = parser.parse_args(argv)
+
+    store = ArchiveStore(compression=args.compression)
+    if args.command == "add":
+        if not args.version: parser.error("add needs a version number or 'all'.")
+        versions = [OUTPUT_DIR_PATTERN.match(d).group(1) for d in sorted(os.listdir('.')) if OUTPUT_DIR_PATTERN.match(d)] if args.version == "all" else [args.version]
+        for version in versions:
+            if not os.path.isdir(f"output_v{version}"):
+                print(f"[ERROR] 'output_v{version}' does not exist."); continue
+            store.add_version(version)
+            if args.replace:
+                shutil.rmtree(f"output_v{version}")
+                store.materialize(version, link=True)
+    elif args.command == "materialize":
+        if not args.version: parser.error("materialize needs a version number.")
+        store.materialize(args.version, target=args.target, link=args.link)
+    elif args.command == "verify":
+        store.verify([args.version] if args.version else None)
+    elif args.command == "gc":
+        store.gc(dry_run=args.dry_run)
+    else:
+        store.status()
+
+if __name__ == "__main__":
+    archive_command(sys.argv[1:])
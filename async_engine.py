@@ -0,0 +1,237 @@
+#
+# FILENAME: async_engine.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.1 (Async Engine)
+#
+# DESCRIPTION:
+# An alternative to scraper_engine.run_scraper that drives many tabs of
+# one Firefox from a single asyncio event loop over WebDriver BiDi
+# (bidi_client.py). It reads the same config and writes the same output
+# layout as the Selenium engine, so runs can be compared directly.
+# Blocking file work runs on worker threads, off the event loop.
+#
+# USAGE:
+#   python scraper_master.py 38 --engine async [--workers 8]
+#
+
+import time
+import asyncio
+
+from bidi_client import BiDiConnection, BiDiError
+from history_loader import SCROLL_TO_TOP_SCRIPT, DEFAULT_TIMEOUT_SECONDS, DEFAULT_STALL_ROUNDS, DEFAULT_POLL_SECONDS, DEFAULT_QUIET_MS
+from pacing import ThrottledError, WAIT_FOR_SELECTOR_SCRIPT, WAIT_FOR_QUIET_SCRIPT, DETECT_THROTTLING_SCRIPT
+import scraper_engine
+from scraper_engine import (
+    prepare_run, NOTHING_TO_DO, open_run_outputs, close_run_outputs, transcript_path, save_transcript, quit_driver,
+    EXTRACT_CONVERSATION_SCRIPT, COUNT_MESSAGES_SCRIPT, MESSAGE_CONTAINER_SELECTOR,
+    SCROLLABLE_ELEMENT_SELECTOR, PROMPT_SELECTOR, RESPONSE_SELECTOR, PROMPT_LOCK
+)
+
+## ------------------- CONFIGURATION ------------------- ##
+DEFAULT_TABS = 4
+## ----------------------------------------------------- ##
+
+class AsyncRateLimiter:
+    """At most one chat start per `interval_seconds`, shared by every task."""
+
+    def __init__(self, interval_seconds):
+        self.interval = max(0, interval_seconds)
+        self.next_slot = 0.0
+
+    async def acquire(self):
+        """Waits for the caller's slot. Returns the seconds waited."""
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        return slot - now
+
+async def wait_for_selector_async(tab, selector, timeout_seconds):
+    """Async twin of pacing.wait_for_page. Returns the seconds waited; raises ThrottledError or TimeoutError."""
+    result = await tab.run(WAIT_FOR_SELECTOR_SCRIPT, selector, int(timeout_seconds * 1000), is_async=True, timeout_seconds=timeout_seconds + 5)
+    if not result or not result.get('found'):
+        reason = await tab.run(DETECT_THROTTLING_SCRIPT, True)
+        if reason: raise ThrottledError(f"page looks throttled ({reason})")
+        raise TimeoutError(f"'{selector}' did not appear within {timeout_seconds}s.")
+    return result['waitedMs'] / 1000
+
+async def load_full_history_async(tab, settings):
+    """Async twin of history_loader.load_full_history. Returns (complete, message_count, elapsed)."""
+    timeout_seconds = settings.get('history_timeout_seconds', DEFAULT_TIMEOUT_SECONDS)
+    stall_rounds = settings.get('history_stall_rounds', DEFAULT_STALL_ROUNDS)
+    poll_seconds = settings.get('history_poll_seconds', DEFAULT_POLL_SECONDS)
+    started = time.monotonic()
+    message_count = await tab.run(SCROLL_TO_TOP_SCRIPT, MESSAGE_CONTAINER_SELECTOR, SCROLLABLE_ELEMENT_SELECTOR)
+    stalls = 0
+    while time.monotonic() - started < timeout_seconds:
+        round_started = time.monotonic()
+        await tab.run(WAIT_FOR_QUIET_SCRIPT, DEFAULT_QUIET_MS, int(poll_seconds * 1000), is_async=True, timeout_seconds=poll_seconds + 5)
+        current = await tab.run(SCROLL_TO_TOP_SCRIPT, MESSAGE_CONTAINER_SELECTOR, SCROLLABLE_ELEMENT_SELECTOR)
+        if current <= message_count:
+            # Same rule as history_loader: a stall needs a full poll window without growth.
+            await asyncio.sleep(max(0.0, poll_seconds - (time.monotonic() - round_started)))
+            current = await tab.run(SCROLL_TO_TOP_SCRIPT, MESSAGE_CONTAINER_SELECTOR, SCROLLABLE_ELEMENT_SELECTOR)
+        if current > message_count:
+            message_count, stalls = current, 0
+        else:
+            stalls += 1
+            if stalls >= stall_rounds:
+                return True, message_count, time.monotonic() - started
+    return False, message_count, time.monotonic() - started
+
+async def prompt_manual_scroll_async(chat_id, chat_title):
+    """Fallback: the manual scroll prompt, run off the event loop so other tabs keep going."""
+    def prompt():
+        with PROMPT_LOCK:
+            print(f"\n[ACTION REQUIRED] Manually scroll to the TOP of chat #{chat_id} ('{chat_title}') in its tab.")
+            input(">>> Once at the top, press Enter here to continue scraping...")
+    await asyncio.to_thread(prompt)
+
+async def load_history_async(tab, chat_id, chat_title, settings):
+    """Async twin of history_loader.load_history_or_prompt. Returns the seconds spent."""
+    started = time.monotonic()
+    if settings.get('history_load', 'auto') == 'manual':
+        await prompt_manual_scroll_async(chat_id, chat_title); return time.monotonic() - started
+    try:
+        complete, message_count, elapsed = await load_full_history_async(tab, settings)
+    except (BiDiError, TimeoutError) as e:
+        print(f"[WARNING] Automatic history loading failed for chat #{chat_id} ({e}). Falling back to manual scrolling.")
+        await prompt_manual_scroll_async(chat_id, chat_title); return time.monotonic() - started
+    if complete:
+        print(f"[INFO] Chat #{chat_id}: history loaded automatically, {message_count} messages in {elapsed:.1f}s.")
+    else:
+        print(f"[WARNING] Chat #{chat_id}: history still loading after {elapsed:.1f}s ({message_count} messages so far). Falling back to manual scrolling.")
+        await prompt_manual_scroll_async(chat_id, chat_title)
+    return time.monotonic() - started
+
+def stream_turns(tab, loop, window_size):
+    """Yields a tab's turns, extracting `window_size` containers per script call.
+
+    Runs on a worker thread: each batch is fetched through the event loop
+    that owns the BiDi connection.
+    """
+    start = 0
+    while True:
+        raw_turns = asyncio.run_coroutine_threadsafe(tab.run(
+            EXTRACT_CONVERSATION_SCRIPT, MESSAGE_CONTAINER_SELECTOR, PROMPT_SELECTOR, RESPONSE_SELECTOR, start, start + window_size
+        ), loop).result()
+        if not isinstance(raw_turns, list):
+            raise BiDiError("extraction script did not return a list of turns")
+        for turn in raw_turns:
+            if turn.get('text') is not None: yield {'role': turn['role'], 'text': turn['text']}
+        if len(raw_turns) < window_size: return
+        start += window_size
+
+async def scrape_chat_async(connection, chat, settings, limiter, slots):
+    """Scrapes one chat in its own tab. Returns True on success."""
+    chat_id, chat_title, chat_url = chat.get('id', 'N/A'), chat.get('title', 'Untitled'), chat.get('url', 'URL_MISSING')
+    pacer, metrics = settings['pacer'], settings['metrics']
+    async with slots:
+        pacer.add_wait('rate_limit', await limiter.acquire(), chat_id)
+        print(f"[INFO] Chat #{chat_id} started: {chat_title}")
+        pacer.start_chat(chat_id)
+        metrics.start_chat(chat_id)
+        tab = None
+        try:
+            delay = pacer.backoff_seconds()
+            if delay:
+                print(f"[INFO] Chat #{chat_id}: backing off for {delay:.1f}s after failed loads...")
+                await asyncio.sleep(delay)
+                pacer.add_wait('backoff', delay)
+            tab = await connection.new_tab()
+            with metrics.phase('navigate'):
+                await tab.navigate(chat_url)
+            reason = await tab.run(DETECT_THROTTLING_SCRIPT, False)
+            if reason:
+                raise ThrottledError(f"page looks throttled ({reason})")
+            with metrics.phase('wait_selector'):
+                pacer.add_wait('selector', await wait_for_selector_async(tab, MESSAGE_CONTAINER_SELECTOR, settings['selector_timeout_seconds']))
+            with metrics.phase('history'):
+                pacer.add_wait('history', await load_history_async(tab, chat_id, chat_title, settings))
+
+            with metrics.phase('extraction'):
+                message_count = await tab.run(COUNT_MESSAGES_SCRIPT, MESSAGE_CONTAINER_SELECTOR)
+            # Writing, hashing and indexing block, so they run on a worker thread while the
+            # other tabs keep going; the turns are fetched back on the event loop batch by batch.
+            loop = asyncio.get_running_loop()
+            get_turns = lambda: stream_turns(tab, loop, settings['window_size'])
+            await asyncio.to_thread(save_transcript, chat, transcript_path(chat, settings), get_turns, message_count, settings)
+            pacer.on_success()
+            return True
+
+        except (ThrottledError, TimeoutError, BiDiError) as e:
+            pacer.on_failure(f"chat #{chat_id} failed to load")
+            metrics.fail_chat()
+            print(f"\n[ERROR] Failed to scrape chat #{chat_id}. Error: {e}")
+            return False
+        except Exception as e:
+            metrics.fail_chat()
+            print(f"\n[ERROR] Failed to scrape chat #{chat_id}. Error: {e}")
+            return False
+        finally:
+            if tab and not connection.closed: await tab.close()
+            pacer.finish_chat()
+            metrics.finish_chat()
+
+async def _run_chats(driver, chats, settings, tabs):
+    connection = await BiDiConnection.connect(driver.caps['webSocketUrl'], on_command=settings['metrics'].count_command)
+    try:
+        limiter = AsyncRateLimiter(settings['delay_seconds'])
+        slots = asyncio.Semaphore(tabs)
+        return await asyncio.gather(*(scrape_chat_async(connection, chat, settings, limiter, slots) for chat in chats))
+    finally:
+        await connection.close()
+
+def apply_async_overrides(settings):
+    """Switches off the settings the async engine does not support, warning about each one."""
+    if settings['extraction_mode'] != "script":
+        print(f"[WARNING] The async engine always uses 'script' extraction ('{settings['extraction_mode']}' ignored).")
+        settings['extraction_mode'], settings['save_snapshots'] = "script", False
+    if settings['detach_processed']:
+        print("[WARNING] detach_processed is only supported by the Selenium engine's 'windowed' extraction.")
+        settings['detach_processed'] = False
+    if settings['delta_mode'] != "off":
+        print("[WARNING] delta_mode is only supported by the Selenium engine; the async engine does full scrapes.")
+        settings['delta_mode'] = "off"
+    return settings
+
+def run_async_scraper(version, workers=None, config=None):
+    """Executes a versioned run with the asyncio/BiDi engine. Returns True/False/None like run_scraper."""
+    prepared = prepare_run(version, config=config)
+    if prepared is None: return None
+    if prepared == NOTHING_TO_DO: return True
+    config, settings, chats_to_process = prepared
+    tabs = workers or config.get("tabs", DEFAULT_TABS)
+    apply_async_overrides(settings)
+    print(f"\n[INFO] Preparing to scrape {len(chats_to_process)} chats in {tabs} concurrent tab(s) (async engine), "
+          f"at most one chat start every {settings['delay_seconds']} second(s).")
+
+    from browser_pool import launch_firefox
+    metrics_server, driver, saved_all = None, None, False
+    started = time.monotonic()
+    try:
+        metrics_server = open_run_outputs(settings)
+        with settings['metrics'].phase('launch'):
+            driver = launch_firefox(
+                scraper_engine.FIREFOX_PROFILE_PATH, headless=settings.get('headless', False),
+                trimmed=settings.get('trimmed_profile', False), bidi=True
+            )
+        if not driver.caps.get('webSocketUrl'):
+            print("[FATAL ERROR] This Firefox/geckodriver did not open a WebDriver BiDi socket. Use the default engine."); return False
+        results = asyncio.run(_run_chats(driver, chats_to_process, settings, tabs))
+        elapsed = time.monotonic() - started
+        succeeded = sum(1 for ok in results if ok)
+        saved_all = succeeded == len(results)
+        print(f"\n[INFO] Async engine: {succeeded} ok, {len(results) - succeeded} failed in {elapsed:.1f}s "
+              f"({succeeded * 60 / elapsed if elapsed else 0:.1f} chats/min).")
+        settings['pacer'].write_report(settings['output_dir'])
+        settings['metrics'].write_report(settings['output_dir'])
+
+    except Exception as e:
+        print(f"\n[FATAL ERROR] An unexpected error occurred: {e}")
+
+    finally:
+        if driver: quit_driver(driver)
+        close_run_outputs(settings, metrics_server)
+    return saved_all
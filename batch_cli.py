@@ -0,0 +1,204 @@
+#
+# FILENAME: batch_cli.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.1 (Non-Interactive Run Command)
+#
+# DESCRIPTION:
+# Starts a scraping run without any prompts, for scheduled jobs. The
+# config is merged from input_vNN/config.json, --config, the flags and
+# --set, and validated before anything starts. --dry-run prints the
+# plan and an estimated runtime. Exits 0 when every chat was saved,
+# 1 when some were not, and 2 for usage, config or input errors
+# (including a chat selection that matches nothing).
+#
+# USAGE:
+#   python scraper_master.py run [VERSION] --chats "1-50, 75" --workers 4 --delay 3 --headless
+#   python scraper_master.py run --config fleet.json --engine async --format txt,jsonl --dry-run
+#   python scraper_master.py run 39 --set delta_mode=append --set max_attempts=5
+#
+
+import os
+import json
+import argparse
+from datetime import datetime
+
+from config_schema import CONFIG_SCHEMA, validate_config, parse_config_value
+from setup_wizard import get_latest_version_in_dir, create_run_files
+from run_metrics import METRICS_JSON_FILE, RUN_KEY
+from run_manifest import OUTPUT_DIR_PATTERN
+
+## ------------------- CONFIGURATION ------------------- ##
+DEFAULT_SECONDS_PER_CHAT = 60 # runtime estimate when no earlier run has metrics
+PLAN_CHATS_SHOWN = 15
+## ----------------------------------------------------- ##
+
+EXIT_OK, EXIT_INCOMPLETE, EXIT_USAGE = 0, 1, 2
+
+# flag -> config key, for the options that map one-to-one onto config.json
+FLAG_KEYS = {
+    'chats': "chat_ids_to_scrape", 'delay': "delay_seconds", 'format': "output_formats",
+    'extraction': "extraction_mode", 'delta': "delta_mode", 'backoff_base': "backoff_base_seconds",
+    'backoff_max': "backoff_max_seconds", 'max_attempts': "max_attempts", 'headless': "headless",
+}
+
+def load_json_config(path):
+    """Reads a config file. Returns the dict, or None after printing why it could not be read."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[FATAL ERROR] Could not read config '{path}': {e}")
+        return None
+
+def resolve_config(version, args):
+    """Merges input_vNN/config.json, --config and the flags. Returns (config, overridden) or (None, None)."""
+    existing = os.path.join(f"input_v{version}", "config.json")
+    config = {}
+    if os.path.exists(existing):
+        config = load_json_config(existing)
+        if config is None: return None, None
+    overrides = {}
+    if args.config:
+        overrides = load_json_config(args.config)
+        if overrides is None: return None, None
+        if not isinstance(overrides, dict):
+            print(f"[FATAL ERROR] '{args.config}' must contain a JSON object."); return None, None
+    for flag, key in FLAG_KEYS.items():
+        value = getattr(args, flag)
+        if value is not None and value is not False:
+            overrides[key] = parse_config_value(key, value) if isinstance(value, str) else value
+    if args.workers is not None:
+        overrides['tabs' if args.engine == "async" else 'workers'] = args.workers
+    for assignment in args.set or []:
+        key, separator, text = assignment.partition('=')
+        if not separator:
+            print(f"[FATAL ERROR] --set expects KEY=VALUE, not '{assignment}'."); return None, None
+        if key not in CONFIG_SCHEMA:
+            print(f"[FATAL ERROR] Unknown config key '{key}' (known keys: {', '.join(CONFIG_SCHEMA)})."); return None, None
+        overrides[key] = parse_config_value(key, text)
+    config.update(overrides)
+    return config, bool(overrides)
+
+def previous_run_timing():
+    """Mean seconds per saved chat and launch seconds from the newest run_metrics.json, or None."""
+    versions = sorted((int(match.group(1)), name) for name in os.listdir('.') if (match := OUTPUT_DIR_PATTERN.match(name)))
+    for _, name in reversed(versions):
+        path = os.path.join(name, METRICS_JSON_FILE)
+        if not os.path.exists(path): continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        chats = [record for record in report.get('chats', []) if record['chat_id'] != RUN_KEY and record['status'] == 'ok']
+        if not chats: continue
+        launch = sum(record['phases'].get('launch', 0.0) for record in report['chats'] if record['chat_id'] == RUN_KEY)
+        return sum(record['total_seconds'] for record in chats) / len(chats), launch, path
+    return None
+
+def estimate_runtime(chat_count, parallel, delay_seconds):
+    """Rough wall time for a run: the slower of the work spread over the workers and the start rate limit."""
+    timing = previous_run_timing()
+    per_chat, launch, source = timing if timing else (DEFAULT_SECONDS_PER_CHAT, 0.0, None)
+    rounds = -(-chat_count // max(1, parallel))
+    seconds = max(rounds * per_chat, (chat_count - 1) * delay_seconds + per_chat) + launch
+    basis = f"{per_chat:.1f}s per chat from '{source}'" if source else f"no earlier metrics; assuming {per_chat}s per chat"
+    return seconds, basis
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+def print_plan(version, config, engine, is_new):
+    """Prints what the run would do, without launching a browser. Returns False if the run could not start."""
+    from scraper_engine import prepare_run, NOTHING_TO_DO
+    print(f"\n--- Run plan for v{version} (dry run, nothing is launched) ---")
+    prepared = prepare_run(version, config=config)
+    if prepared is None: return False
+    if prepared == NOTHING_TO_DO: return True
+    _, settings, chats = prepared
+    settings['catalog'].close()
+    if engine == "async":
+        from async_engine import apply_async_overrides
+        apply_async_overrides(settings)
+        parallel, attempts = config.get("tabs", CONFIG_SCHEMA['tabs']['default']), "1 attempt per chat (the async engine does not retry)"
+    else:
+        parallel, attempts = settings['workers'], f"up to {config.get('max_attempts', CONFIG_SCHEMA['max_attempts']['default'])} attempts per chat"
+    seconds, basis = estimate_runtime(len(chats), parallel, settings['delay_seconds'])
+    shown = ", ".join(f"#{chat['id']}" for chat in chats[:PLAN_CHATS_SHOWN])
+    if len(chats) > PLAN_CHATS_SHOWN: shown += f", ... ({len(chats) - PLAN_CHATS_SHOWN} more)"
+    print(f"Version:     v{version} ({'new; input_v' + str(version) + '/config.json will be created' if is_new else 'existing'})")
+    print(f"Engine:      {engine}, {parallel} {'tab(s)' if engine == 'async' else 'worker(s)'}, "
+          f"{'headless' if settings.get('headless') else 'with browser windows'}")
+    print(f"Chats:       {len(chats)} to scrape: {shown}")
+    print(f"Rate limit:  one chat start every {settings['delay_seconds']}s; back-off "
+          f"{settings['pacer'].base_seconds}-{settings['pacer'].max_seconds}s; "
+          f"{attempts}")
+    extraction = f"'{settings['extraction_mode']}'"
+    if engine == "async":
+        extraction += f" ({settings['window_size']} per script call)"
+    elif settings['extraction_mode'] == "windowed":
+        extraction += f" ({settings['window_size']} per batch{', detached after reading' if settings['detach_processed'] else ''})"
+    print(f"Output:      {settings['output_dir']} ({', '.join(settings['output_formats'])}); "
+          f"extraction {extraction}, delta_mode '{settings['delta_mode']}'")
+    note = " (an upper bound: unchanged chats are skipped)" if settings['skip_unchanged'] or settings['delta_mode'] != "off" else ""
+    print(f"Estimate:    ~{format_duration(seconds)}{note}; {basis}")
+    print("Config:      " + json.dumps(config, ensure_ascii=False))
+    return True
+
+def run_command(argv):
+    """Handles 'scraper_master.py run [VERSION] [options]'. Returns the process exit status."""
+    parser = argparse.ArgumentParser(prog="scraper_master.py run", description="Run the scraper without any prompts.")
+    parser.add_argument("version", nargs="?", help="Run version (default: the next free version number).")
+    parser.add_argument("--config", help="JSON config file; its keys override input_vNN/config.json.")
+    parser.add_argument("--chats", help="Chats to scrape: IDs and ranges ('1-5, 8'), 'all' or 'unscraped'.")
+    parser.add_argument("--workers", type=int, help="Browser workers (or tabs with --engine async).")
+    parser.add_argument("--engine", choices=["selenium", "async"], default="selenium")
+    parser.add_argument("--format", help="Output formats, comma-separated (txt, jsonl, parquet).")
+    parser.add_argument("--delay", help="At most one chat start per this many seconds.")
+    parser.add_argument("--backoff-base", help="First back-off delay after a failed load, in seconds.")
+    parser.add_argument("--backoff-max", help="Longest back-off delay, in seconds.")
+    parser.add_argument("--max-attempts", help="Attempts per chat before it is reported as failed.")
+    parser.add_argument("--extraction", help="Extraction mode: script, elements, snapshot or windowed.")
+    parser.add_argument("--delta", help="Delta mode: off, append or check.")
+    parser.add_argument("--headless", action="store_true", help="Run the browsers without windows.")
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE", help="Set any config key (repeatable).")
+    parser.add_argument("--title", help="Changelog note for a new version.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the resolved plan and estimated runtime, then stop.")
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return EXIT_OK if e.code == 0 else EXIT_USAGE
+
+    if args.version is not None and not args.version.isdigit():
+        print(f"[FATAL ERROR] Version '{args.version}' is not a number."); return EXIT_USAGE
+    if args.workers is not None and args.workers < 1:
+        print("[FATAL ERROR] --workers needs a positive whole number."); return EXIT_USAGE
+    version = args.version or str(get_latest_version_in_dir() + 1)
+    is_new = not os.path.exists(os.path.join(f"input_v{version}", "config.json"))
+
+    config, overridden = resolve_config(version, args)
+    if config is None: return EXIT_USAGE
+    # Warnings (e.g. unknown keys) are printed once the engine loads the config.
+    errors, _ = validate_config(config)
+    for error in errors:
+        print(f"[ERROR] run config: {error}")
+    if errors: return EXIT_USAGE
+
+    if args.dry_run:
+        return EXIT_OK if print_plan(version, config, args.engine, is_new) else EXIT_USAGE
+    if is_new:
+        create_run_files(version, config, args.title or f"Scheduled run on {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    elif overridden:
+        print(f"[INFO] Command-line settings override 'input_v{version}/config.json' for this run only.")
+
+    if args.engine == "async":
+        from async_engine import run_async_scraper
+        saved_all = run_async_scraper(version, config=config)
+    else:
+        from scraper_engine import run_scraper
+        saved_all = run_scraper(version, config=config)
+    # None: input files, config or chat selection stopped the run before it began.
+    if saved_all is None: return EXIT_USAGE
+    return EXIT_OK if saved_all else EXIT_INCOMPLETE
@@ -0,0 +1,150 @@
+#
+# FILENAME: benchmarks/mock_chat_site.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.0 (Mock Chat Site)
+#
+# DESCRIPTION:
+# A local HTTP server that serves synthetic Gemini-like conversations
+# for benchmarking. Pages use the same user-query / model-response /
+# .query-text-line / .model-response-text structure as the real app,
+# and only the newest messages are rendered at first: older ones are
+# prepended in batches when the .chat-container is scrolled to the top,
+# like the real infinite scroller. The saved debug_page_source.html is
+# served as a fixture.
+#
+# URLS:
+#   /app/synthetic-<turns>     a generated chat with <turns> messages
+#   /app/synthetic-<turns>?all=1   the same chat fully rendered
+#   /app/synthetic-<turns>?delay=<ms>  older batches arrive after <ms> instead
+#   /app/fixture-debug         the recorded debug_page_source.html
+#
+# USAGE:
+#   python benchmarks/mock_chat_site.py [--port 8765]
+#
+
+import os
+import re
+import sys
+import html
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+## ------------------- CONFIGURATION ------------------- ##
+DEFAULT_PORT = 8765
+INITIAL_MESSAGES = 20       # messages rendered before any scrolling
+BATCH_MESSAGES = 20         # messages prepended per scroll to the top
+BATCH_DELAY_MS = 50         # simulated network delay per batch
+FIXTURE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "debug_page_source.html")
+## ----------------------------------------------------- ##
+
+WORDS = (
+    "archive scraper browser profile selector conversation history response prompt python "
+    "firefox extension timeout version output manifest chat title network render script "
+    "dora simon project question answer example detail summary upgrade diagnostic alarm"
+).split()
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>.chat-container {{ height: 600px; overflow-y: scroll; }}</style></head>
+<body><chat-app><div class="chat-container">{older}<div class="conversation-container">{visible}</div></div></chat-app>
+<script>
+const container = document.querySelector('.chat-container');
+const conversation = container.querySelector('.conversation-container');
+let loading = false;
+function loadOlder() {{
+    const batches = container.querySelectorAll('template.older-batch');
+    if (loading || !batches.length) return;
+    loading = true;
+    setTimeout(() => {{
+        const batch = batches[batches.length - 1];
+        conversation.insertBefore(batch.content.cloneNode(true), conversation.firstChild);
+        batch.remove();
+        container.scrollTop = 1;
+        loading = false;
+    }}, {delay});
+}}
+container.addEventListener('scroll', () => {{ if (container.scrollTop < 50) loadOlder(); }});
+container.addEventListener('wheel', (e) => {{ if (e.deltaY < 0 && container.scrollTop < 50) loadOlder(); }});
+container.scrollTop = container.scrollHeight;
+</script></body></html>"""
+
+def _sentence(rng, min_words=4, max_words=18):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+def render_prompt(rng):
+    """A user-query element with one to three query lines."""
+    lines = "".join(f'<p class="query-text-line">{html.escape(_sentence(rng))}</p>' for _ in range(rng.randint(1, 3)))
+    return f'<user-query><div class="query-text">{lines}</div></user-query>'
+
+def render_response(rng):
+    """A model-response element with paragraphs, and sometimes a list or code block."""
+    blocks = [f"<p>{html.escape(' '.join(_sentence(rng) for _ in range(rng.randint(1, 4))))}</p>" for _ in range(rng.randint(1, 4))]
+    if rng.random() < 0.3:
+        blocks.append("<ul>" + "".join(f"<li>{html.escape(_sentence(rng, 2, 8))}</li>" for _ in range(rng.randint(2, 5))) + "</ul>")
+    if rng.random() < 0.2:
+        blocks.append(f"<pre><code>print({rng.randint(0, 999)})\nfor i in range(3):\n    print(i)</code></pre>")
+    return ('<model-response><message-content class="model-response-text">'
+            f'<div class="markdown">{"".join(blocks)}</div></message-content></model-response>')
+
+def render_messages(turns, seed):
+    """Generates `turns` alternating prompt/response elements, deterministically."""
+    rng = random.Random(seed)
+    return [render_prompt(rng) if i % 2 == 0 else render_response(rng) for i in range(turns)]
+
+def render_synthetic_page(turns, render_all=False, delay_ms=BATCH_DELAY_MS):
+    """Builds a chat page; older messages wait in <template> batches until scrolled to."""
+    messages = render_messages(turns, seed=turns)
+    visible_count = turns if render_all else min(turns, INITIAL_MESSAGES)
+    older, visible = messages[:turns - visible_count], messages[turns - visible_count:]
+    batches = [older[max(0, end - BATCH_MESSAGES):end] for end in range(len(older), 0, -BATCH_MESSAGES)][::-1]
+    older_html = "".join(f'<template class="older-batch">{"".join(batch)}</template>' for batch in batches)
+    return PAGE_TEMPLATE.format(title=f"Synthetic chat ({turns} turns)", older=older_html, visible="".join(visible), delay=delay_ms)
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    """Serves synthetic chats and the recorded fixture."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        match = re.fullmatch(r'/app/synthetic-(\d+)', url.path)
+        if match:
+            query = parse_qs(url.query)
+            delay_ms = int(query['delay'][0]) if query.get('delay', [''])[0].isdigit() else BATCH_DELAY_MS
+            body = render_synthetic_page(int(match.group(1)), render_all='all' in query, delay_ms=delay_ms)
+        elif url.path == '/app/fixture-debug' and os.path.exists(FIXTURE_FILE):
+            with open(FIXTURE_FILE, 'r', encoding='utf-8') as f: body = f.read()
+        else:
+            self.send_error(404); return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # keep benchmark output readable
+
+def start_mock_site(port=DEFAULT_PORT):
+    """Starts the server on a background thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic chats for benchmarking.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    server, base_url = start_mock_site(args.port)
+    print(f"[INFO] Mock chat site running at {base_url}/app/synthetic-200 (Ctrl+C to stop).")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
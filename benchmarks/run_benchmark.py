@@ -0,0 +1,229 @@
+#
+# FILENAME: benchmarks/run_benchmark.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.3 (Benchmark Harness)
+#
+# DESCRIPTION:
+# Drives scraper_engine.run_scraper end to end against the local mock
+# chat site, for conversations from 2 to 2,000 turns plus the recorded
+# debug_page_source.html fixture. Each size runs as its own versioned
+# run in a throw-away workspace with a blank headless profile. Reports
+# chats/min, WebDriver calls per turn, peak RSS and time per phase, so
+# regressions in the extraction loop show up before a production run.
+# Phase times and WebDriver command counts are read from the run's own
+# run_metrics.json, so the benchmark measures exactly what the engine
+# reports in production. --engine async benchmarks async_engine.py on
+# the same cases. --mode windowed benchmarks batched extraction, whose
+# per-batch latencies are in the same run_metrics.json.
+#
+# USAGE:
+#   python benchmarks/run_benchmark.py [--sizes 2,20,200,2000] [--repeat 3]
+#                                      [--mode script|elements|windowed] [--workers 1]
+#                                      [--engine selenium|async] [--json results.json]
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scraper_engine
+import transcript_writer
+from run_metrics import METRICS_JSON_FILE, PHASES
+from snapshot_parser import iter_snapshot_turns
+from mock_chat_site import start_mock_site, FIXTURE_FILE
+
+## ------------------- CONFIGURATION ------------------- ##
+DEFAULT_SIZES = [2, 20, 200, 2000]
+DEFAULT_REPEAT = 3
+RSS_SAMPLE_SECONDS = 0.2
+# Older batches slower than the history loader's quiet window, like a slow
+# real fetch: catches a loader that gives up before the history is complete.
+SLOW_BATCH_TURNS = 200
+SLOW_BATCH_DELAY_MS = 800
+## ----------------------------------------------------- ##
+
+class RssSampler:
+    """Samples the peak RSS of this process and its children (browser, driver)."""
+
+    def __init__(self):
+        self.peak_python = 0
+        self.peak_browser = 0
+        self.running = False
+
+    def _sample(self):
+        import psutil
+        me = psutil.Process()
+        while self.running:
+            try:
+                self.peak_python = max(self.peak_python, me.memory_info().rss)
+                children = 0
+                for child in me.children(recursive=True):
+                    try: children += child.memory_info().rss
+                    except psutil.Error: pass
+                self.peak_browser = max(self.peak_browser, children)
+            except psutil.Error:
+                pass
+            time.sleep(RSS_SAMPLE_SECONDS)
+
+    def __enter__(self):
+        try:
+            import psutil # optional: needed for live browser memory sampling
+        except ImportError:
+            self.thread = None
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        else:
+            try:
+                import resource # POSIX fallback: Python process only (KB on Linux)
+                self.peak_python = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            except ImportError:
+                pass
+        return False
+
+def write_workspace(workspace, version, base_url, label, urls, mode, workers):
+    """Creates chats.json and input_vNN/config.json for one benchmark run."""
+    chats = [{'id': i, 'title': f"{label} #{i}", 'url': url} for i, url in enumerate(urls, start=1)]
+    with open(os.path.join(workspace, "chats.json"), 'w', encoding='utf-8') as f:
+        json.dump(chats, f, indent=2)
+    for stale in ("chats.db", "scrape_manifest.json"):
+        if os.path.exists(os.path.join(workspace, stale)): os.remove(os.path.join(workspace, stale))
+    input_dir = os.path.join(workspace, f"input_v{version}")
+    os.makedirs(input_dir, exist_ok=True)
+    config = {
+        "chat_ids_to_scrape": f"1-{len(chats)}", "delay_seconds": 0, "workers": workers,
+        "extraction_mode": mode, "headless": True, "use_browser_pool": False,
+        "skip_unchanged": False, "output_formats": ["txt"], "history_timeout_seconds": 600
+    }
+    with open(os.path.join(input_dir, "config.json"), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+def run_case(workspace, version, base_url, label, path, turns, repeat, mode, workers, engine="selenium"):
+    """Runs one size through run_scraper and returns its measurements."""
+    urls = [f"{base_url}{path}{'&' if '?' in path else '?'}r={n}" for n in range(repeat)]
+    write_workspace(workspace, version, base_url, label, urls, mode, workers)
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        if engine == "async":
+            from async_engine import run_async_scraper
+            run_async_scraper(str(version), workers)
+        else:
+            scraper_engine.run_scraper(str(version))
+        elapsed = time.perf_counter() - started
+    output_dir = os.path.join(workspace, f"output_v{version}")
+    saved = [name for name in os.listdir(output_dir) if name.endswith(".txt")] if os.path.isdir(output_dir) else []
+    total_turns = turns * len(saved)
+    metrics_path = os.path.join(output_dir, METRICS_JSON_FILE)
+    totals = {}
+    if os.path.exists(metrics_path):
+        with open(metrics_path, 'r', encoding='utf-8') as f: totals = json.load(f)['totals']
+    commands = totals.get('webdriver_commands', 0)
+    return {
+        'case': label, 'turns': turns, 'chats': len(saved), 'elapsed_seconds': round(elapsed, 2),
+        'chats_per_minute': round(len(saved) * 60 / elapsed, 2) if elapsed else 0.0,
+        'webdriver_calls': commands,
+        'calls_per_turn': round(commands / total_turns, 3) if total_turns else None,
+        'peak_python_rss_mb': round(rss.peak_python / 2**20, 1),
+        'peak_browser_rss_mb': round(rss.peak_browser / 2**20, 1),
+        'webdriver_seconds': round(totals.get('webdriver_seconds', 0.0), 3),
+        'bytes_written': totals.get('bytes_written', 0),
+        'phase_seconds': {phase: round(totals.get('phase_seconds', {}).get(phase, 0.0), 3) for phase in PHASES},
+        'output_dir': output_dir
+    }
+
+def check_fixture(result):
+    """Compares the live-scraped fixture with the offline parse of the same file."""
+    expected = [(turn['role'], transcript_writer.clean_text(turn['text'])) for turn in iter_snapshot_turns(FIXTURE_FILE)]
+    for name in sorted(os.listdir(result['output_dir'])):
+        if not name.endswith(".txt"): continue
+        actual = [(role, text) for role, text in transcript_writer.iter_transcript_turns(os.path.join(result['output_dir'], name))]
+        if actual != expected:
+            return False
+    return True
+
+def check_complete(result):
+    """True if every transcript of the case has all of the chat's turns."""
+    names = [name for name in os.listdir(result['output_dir']) if name.endswith(".txt")]
+    return bool(names) and all(
+        sum(1 for _ in transcript_writer.iter_transcript_turns(os.path.join(result['output_dir'], name))) == result['turns']
+        for name in names
+    )
+
+def print_report(results):
+    print("\n" + "=" * 110)
+    print(f"{'CASE':<16}{'TURNS':>7}{'CHATS':>7}{'CHATS/MIN':>11}{'CALLS/TURN':>12}{'PY RSS MB':>11}{'BROWSER MB':>12}  PHASES (s)")
+    for r in results:
+        phases = " ".join(f"{phase}={seconds:.2f}" for phase, seconds in r['phase_seconds'].items() if seconds)
+        calls = f"{r['calls_per_turn']:.3f}" if r['calls_per_turn'] is not None else "-"
+        print(f"{r['case']:<16}{r['turns']:>7}{r['chats']:>7}{r['chats_per_minute']:>11.2f}{calls:>12}{r['peak_python_rss_mb']:>11.1f}{r['peak_browser_rss_mb']:>12.1f}  {phases}")
+    print("=" * 110)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local mock chat site.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated conversation sizes (turns).")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Chats per size.")
+    parser.add_argument("--mode", default=scraper_engine.DEFAULT_EXTRACTION_MODE, help="Extraction mode to benchmark.")
+    parser.add_argument("--workers", type=int, default=1, help="Browsers (selenium) or concurrent tabs (async).")
+    parser.add_argument("--engine", choices=["selenium", "async"], default="selenium")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary workspace.")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_site(port=0)
+    workspace = tempfile.mkdtemp(prefix="scraper_bench_")
+    profile = os.path.join(workspace, "profile")
+    os.makedirs(profile)
+    scraper_engine.FIREFOX_PROFILE_PATH = profile
+    original_cwd = os.getcwd()
+    os.chdir(workspace)
+    print(f"[INFO] Benchmark workspace: {workspace}")
+
+    results = []
+    try:
+        cases = [(f"synthetic-{size}", f"/app/synthetic-{size}", size) for size in (int(s) for s in args.sizes.split(',') if s.strip())]
+        cases.append(("slow-batches", f"/app/synthetic-{SLOW_BATCH_TURNS}?delay={SLOW_BATCH_DELAY_MS}", SLOW_BATCH_TURNS))
+        cases.append(("fixture-debug", "/app/fixture-debug", sum(1 for _ in iter_snapshot_turns(FIXTURE_FILE))))
+        for version, (label, path, turns) in enumerate(cases, start=1):
+            print(f"\n[INFO] Benchmarking {label} ({turns} turns x {args.repeat})...")
+            result = run_case(workspace, version, base_url, label, path, turns, args.repeat, args.mode, args.workers, args.engine)
+            if label == "fixture-debug":
+                result['fixture_matches_offline_parse'] = check_fixture(result)
+            elif label == "slow-batches":
+                result['history_complete'] = check_complete(result)
+            results.append(result)
+    finally:
+        os.chdir(original_cwd)
+        server.shutdown()
+        if not args.keep:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    print_report(results)
+    for r in results:
+        if 'fixture_matches_offline_parse' in r:
+            print(f"[{'SUCCESS' if r['fixture_matches_offline_parse'] else 'ERROR'}] Fixture transcript {'matches' if r['fixture_matches_offline_parse'] else 'DOES NOT match'} the offline parse.")
+        if 'history_complete' in r:
+            print(f"[{'SUCCESS' if r['history_complete'] else 'ERROR'}] Slow-batch transcripts {'have' if r['history_complete'] else 'are MISSING'} "
+                  f"{'all ' if r['history_complete'] else 'some of the '}{r['turns']} turns ({SLOW_BATCH_DELAY_MS} ms per older batch).")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Results written to '{args.json}'.")
+
+if __name__ == "__main__":
+    main()
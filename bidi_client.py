@@ -0,0 +1,208 @@
+#
+# FILENAME: bidi_client.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.0 (WebDriver BiDi Client)
+#
+# DESCRIPTION:
+# A small asyncio client for the WebDriver BiDi protocol, used by
+# async_engine.py. It speaks WebSocket directly over asyncio streams
+# (standard library only), so one event loop can keep many commands in
+# flight at once: every command gets an id and its own future, and a
+# single reader task resolves them as the browser answers. BiDiTab
+# wraps one browsing context (tab) and runs the engine's existing
+# classic WebDriver scripts in it, unchanged.
+#
+
+import os
+import json
+import time
+import base64
+import struct
+import asyncio
+import hashlib
+from urllib.parse import urlparse
+
+## ------------------- CONFIGURATION ------------------- ##
+DEFAULT_COMMAND_TIMEOUT_SECONDS = 60
+## ----------------------------------------------------- ##
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+class BiDiError(Exception):
+    """Raised when the browser answers a command with an error or the connection drops."""
+
+def _mask(payload, key):
+    # XOR the whole payload with the repeated 4-byte key in one big-int operation.
+    if not payload: return payload
+    repeated = (key * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(len(payload), 'big')
+
+class BiDiConnection:
+    """One WebSocket connection to a BiDi session, with many concurrent commands."""
+
+    def __init__(self, reader, writer, on_command=None):
+        self.reader = reader
+        self.writer = writer
+        self.on_command = on_command # callback(method, seconds), e.g. RunMetrics.count_command
+        self.next_id = 0
+        self.pending = {}
+        self.closed = False
+        self.reader_task = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, ws_url, on_command=None):
+        """Opens the WebSocket at `ws_url` (from the session's webSocketUrl capability)."""
+        url = urlparse(ws_url)
+        reader, writer = await asyncio.open_connection(url.hostname, url.port or 80, limit=2**20)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            f"GET {url.path or '/'} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+            f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        await writer.drain()
+        response = (await reader.readuntil(b"\r\n\r\n")).decode('latin-1')
+        expected = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        if " 101 " not in response.split("\r\n", 1)[0] or expected not in response:
+            writer.close()
+            raise BiDiError(f"WebSocket handshake failed: {response.splitlines()[0] if response else 'no response'}")
+        return cls(reader, writer, on_command)
+
+    # --- frames ---
+    def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126: header += bytes([0x80 | length])
+        elif length < 2**16: header += bytes([0x80 | 126]) + struct.pack("!H", length)
+        else: header += bytes([0x80 | 127]) + struct.pack("!Q", length)
+        key = os.urandom(4)
+        self.writer.write(header + key + _mask(payload, key))
+
+    async def _read_frame(self):
+        first, second = await self.reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126: length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+        elif length == 127: length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+        key = await self.reader.readexactly(4) if second & 0x80 else None
+        payload = await self.reader.readexactly(length)
+        return bool(first & 0x80), first & 0x0F, _mask(payload, key) if key else payload
+
+    async def _read_loop(self):
+        message, error = [], None
+        try:
+            while True:
+                fin, opcode, payload = await self._read_frame()
+                if opcode == OP_PING:
+                    self._send_frame(OP_PONG, payload); continue
+                if opcode == OP_CLOSE:
+                    break
+                if opcode in (OP_TEXT, OP_BINARY, OP_CONTINUATION):
+                    message.append(payload)
+                    if fin:
+                        self._dispatch(json.loads(b"".join(message)))
+                        message = []
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            error = e
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done(): future.set_exception(BiDiError(f"connection closed ({error or 'by the browser'})"))
+            self.pending.clear()
+
+    def _dispatch(self, message):
+        future = self.pending.pop(message.get('id'), None)
+        if future is None or future.done(): return # an event, or a command that already timed out
+        if message.get('type') == 'error':
+            future.set_exception(BiDiError(f"{message.get('error')}: {message.get('message')}"))
+        else:
+            future.set_result(message.get('result', {}))
+
+    # --- commands ---
+    async def send(self, method, params, timeout_seconds=DEFAULT_COMMAND_TIMEOUT_SECONDS):
+        """Sends one command and waits for its result; other commands can run meanwhile."""
+        if self.closed: raise BiDiError("connection is closed")
+        self.next_id += 1
+        command_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[command_id] = future
+        started = time.perf_counter()
+        self._send_frame(OP_TEXT, json.dumps({'id': command_id, 'method': method, 'params': params}).encode())
+        try:
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout_seconds)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{method} got no answer within {timeout_seconds}s.")
+        finally:
+            self.pending.pop(command_id, None)
+            if self.on_command: self.on_command(method, time.perf_counter() - started)
+
+    async def new_tab(self):
+        """Opens a new tab (browsing context) and returns it as a BiDiTab."""
+        result = await self.send("browsingContext.create", {'type': 'tab'})
+        return BiDiTab(self, result['context'])
+
+    async def close(self):
+        if not self.closed:
+            try:
+                self._send_frame(OP_CLOSE, struct.pack("!H", 1000))
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+        self.reader_task.cancel()
+        self.writer.close()
+
+def _local_value(value):
+    """Serialises a Python argument as a BiDi LocalValue (the scripts only take primitives)."""
+    if value is None: return {'type': 'null'}
+    if isinstance(value, bool): return {'type': 'boolean', 'value': value}
+    if isinstance(value, (int, float)): return {'type': 'number', 'value': value}
+    if isinstance(value, str): return {'type': 'string', 'value': value}
+    raise TypeError(f"Unsupported script argument: {value!r}")
+
+def wrap_classic_script(script, is_async=False):
+    """Turns a classic execute_script body (using `arguments`) into a BiDi function.
+
+    Async scripts get a `done` callback as their last argument, as with
+    execute_async_script. The result is returned as JSON text so nested
+    lists and objects come back in one piece.
+    """
+    if is_async:
+        call = f"await new Promise((done) => (function() {{ {script} }}).apply(null, [...args, done]))"
+    else:
+        call = f"(function() {{ {script} }}).apply(null, args)"
+    return f"async function(...args) {{ const result = {call}; return JSON.stringify(result === undefined ? null : result); }}"
+
+class BiDiTab:
+    """One browser tab, driven through a shared BiDiConnection."""
+
+    def __init__(self, connection, context):
+        self.connection = connection
+        self.context = context
+
+    async def navigate(self, url, timeout_seconds=DEFAULT_COMMAND_TIMEOUT_SECONDS):
+        """Loads `url` and returns once the document has finished loading."""
+        return await self.connection.send(
+            "browsingContext.navigate", {'context': self.context, 'url': url, 'wait': 'complete'}, timeout_seconds
+        )
+
+    async def run(self, script, *args, is_async=False, timeout_seconds=DEFAULT_COMMAND_TIMEOUT_SECONDS):
+        """Runs a classic WebDriver script in this tab and returns its (JSON) result."""
+        result = await self.connection.send("script.callFunction", {
+            'functionDeclaration': wrap_classic_script(script, is_async),
+            'arguments': [_local_value(arg) for arg in args],
+            'target': {'context': self.context},
+            'awaitPromise': True,
+            'resultOwnership': 'none',
+        }, timeout_seconds)
+        if result.get('type') == 'exception':
+            details = result.get('exceptionDetails', {})
+            raise BiDiError(f"script error: {details.get('text', 'unknown error')}")
+        value = result.get('result', {})
+        return json.loads(value['value']) if value.get('type') == 'string' else None
+
+    async def close(self):
+        try:
+            await self.connection.send("browsingContext.close", {'context': self.context})
+        except (BiDiError, TimeoutError) as e:
+            print(f"[WARNING] Could not close tab {self.context}: {e}")
@@ -0,0 +1,350 @@
+#
+# FILENAME: browser_pool.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.1 (Browser Session Pool)
+#
+# DESCRIPTION:
+# Launches Firefox quickly and keeps it warm between runs. A small
+# daemon holds N browser sessions open and records them in
+# browser_pool.json; scraper runs attach to a free session instead of
+# starting Firefox every time. Supports headless mode and a trimmed,
+# extension-free profile.
+#
+# USAGE:
+#   python browser_pool.py start [--size N] [--headless] [--full-profile]
+#   python browser_pool.py status
+#   python browser_pool.py stop
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+from datetime import datetime
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+
+## ------------------- CONFIGURATION ------------------- ##
+POOL_STATE_FILE = "browser_pool.json"
+POOL_STOP_FILE = "browser_pool.stop"
+POOL_LEASE_DIR = ".browser_pool_leases"
+TRIMMED_PROFILE_DIR = ".browser_profiles"
+POOL_START_TIMEOUT_SECONDS = 180
+LEASE_STALE_SECONDS = 6 * 60 * 60
+
+# The only profile files needed to stay logged in.
+TRIMMED_PROFILE_FILES = [
+    "cookies.sqlite", "cert9.db", "key4.db", "logins.json", "permissions.sqlite",
+    "prefs.js", "content-prefs.sqlite", "storage.sqlite"
+]
+# Preferences that keep a trimmed profile quiet and fast on start-up.
+TRIMMED_PROFILE_PREFS = {
+    "extensions.enabledScopes": 0,
+    "extensions.autoDisableScopes": 15,
+    "browser.shell.checkDefaultBrowser": False,
+    "browser.startup.homepage_override.mstone": "ignore",
+    "startup.homepage_welcome_url": "",
+    "browser.sessionstore.resume_from_crash": False,
+    "datareporting.policy.dataSubmissionEnabled": False,
+    "toolkit.telemetry.reportingpolicy.firstRun": False,
+    "app.update.auto": False,
+}
+## ----------------------------------------------------- ##
+
+def close_extra_tabs(driver):
+    """Closes all browser tabs except the first one."""
+    if len(driver.window_handles) > 1:
+        print(f"[INFO] Found {len(driver.window_handles)} open tabs. Closing extras...")
+        # Switch to the first tab
+        original_tab = driver.window_handles[0]
+        # Close all other tabs
+        for handle in driver.window_handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        # Switch back to the original tab
+        driver.switch_to.window(original_tab)
+        print("[INFO] Extra tabs closed.")
+    return
+
+def wait_for_tabs_to_settle(driver, quiet_seconds=0.5, timeout_seconds=5, poll_seconds=0.1, expect_extra=False):
+    """Returns as soon as the set of open tabs has stopped changing for `quiet_seconds`.
+
+    Extension and first-run tabs open a second or more after launch, so
+    with `expect_extra` a lone tab never counts as settled: the wait lasts
+    until an extra tab has appeared (and settled) or the timeout.
+    """
+    started = time.monotonic()
+    handles, stable_since = len(driver.window_handles), time.monotonic()
+    while time.monotonic() - started < timeout_seconds:
+        time.sleep(poll_seconds)
+        current = len(driver.window_handles)
+        if current != handles:
+            handles, stable_since = current, time.monotonic()
+        elif time.monotonic() - stable_since >= quiet_seconds and (handles > 1 or not expect_extra):
+            break
+    return handles
+
+def close_late_tabs(driver):
+    """Closes tabs that opened after launch; call before a driver's first page load."""
+    if getattr(driver, 'late_tabs_closed', True): return
+    close_extra_tabs(driver)
+    driver.late_tabs_closed = True
+
+def build_trimmed_profile(source_profile, destination):
+    """Copies just the login-related files of a profile and disables extensions.
+
+    The copy is refreshed only when the source cookies are newer than it.
+    """
+    marker = os.path.join(destination, "cookies.sqlite")
+    source_cookies = os.path.join(source_profile, "cookies.sqlite")
+    if os.path.exists(marker) and os.path.exists(source_cookies) and os.path.getmtime(marker) >= os.path.getmtime(source_cookies):
+        return destination
+    os.makedirs(destination, exist_ok=True)
+    for name in TRIMMED_PROFILE_FILES:
+        source = os.path.join(source_profile, name)
+        if os.path.exists(source):
+            shutil.copy2(source, os.path.join(destination, name))
+    with open(os.path.join(destination, "user.js"), 'w', encoding='utf-8') as f:
+        for key, value in TRIMMED_PROFILE_PREFS.items():
+            f.write(f'user_pref("{key}", {json.dumps(value)});\n')
+    print(f"[INFO] Built trimmed profile in '{destination}'.")
+    return destination
+
+def launch_firefox(profile_path, headless=False, trimmed=False, slot=None, bidi=False):
+    """Launches Firefox and closes extension tabs, reporting the start-up time.
+
+    With a `slot` the trimmed profile is used in place (one copy per slot),
+    which avoids the profile being zipped and copied on every launch.
+    With `bidi` the session also opens a WebDriver BiDi WebSocket, whose
+    URL is in driver.caps['webSocketUrl'] (used by async_engine.py).
+    """
+    started = time.monotonic()
+    options = Options()
+    if headless:
+        options.add_argument("-headless")
+    if bidi:
+        options.web_socket_url = True
+    if trimmed:
+        profile_dir = build_trimmed_profile(profile_path, os.path.join(TRIMMED_PROFILE_DIR, f"trimmed-{slot or 0}"))
+        if slot is not None:
+            options.add_argument("-profile"); options.add_argument(os.path.abspath(profile_dir))
+        else:
+            options.profile = profile_dir
+    else:
+        options.profile = profile_path
+    print(f"[INFO] Launching Firefox ({'headless, ' if headless else ''}{'trimmed' if trimmed else 'full'} profile)...")
+    driver = webdriver.Firefox(options=options)
+    launched = time.monotonic()
+
+    # --- Handle extra tabs opened by extensions, as soon as they have appeared ---
+    wait_for_tabs_to_settle(driver, timeout_seconds=0.5 if trimmed else 5, expect_extra=not trimmed)
+    close_extra_tabs(driver)
+    ready = time.monotonic()
+    print(f"[SUCCESS] Firefox ready in {ready - started:.1f}s (launch {launched - started:.1f}s, tab cleanup {ready - launched:.1f}s).")
+    driver.startup_seconds = ready - started
+    return driver
+
+class PooledFirefox(webdriver.Remote):
+    """A driver attached to an existing pooled session instead of creating one."""
+
+    def __init__(self, executor_url, session_id, lease_path):
+        self._pooled_session_id = session_id
+        self.lease_path = lease_path
+        super().__init__(command_executor=executor_url, options=Options())
+
+    def start_session(self, capabilities):
+        self.session_id = self._pooled_session_id
+        self.caps = {}
+
+    def quit(self):
+        """Releases the session back to the pool; the browser stays running."""
+        release_lease(self.lease_path)
+
+def read_pool_state():
+    """Returns the running pool's state, or None if no pool is running."""
+    if not os.path.exists(POOL_STATE_FILE): return None
+    try:
+        with open(POOL_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+def _lease_path(session_id):
+    return os.path.join(POOL_LEASE_DIR, f"{session_id}.lease")
+
+def _pid_alive(pid):
+    if os.name == 'nt': return True # no safe liveness check; rely on the lease age
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def try_lease(session_id):
+    """Claims a pooled session for this process. Returns the lease path or None."""
+    os.makedirs(POOL_LEASE_DIR, exist_ok=True)
+    path = _lease_path(session_id)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f: owner = int(f.read().strip() or 0)
+        except (ValueError, OSError):
+            owner = 0
+        stale = time.time() - os.path.getmtime(path) > LEASE_STALE_SECONDS or not _pid_alive(owner)
+        if not stale: return None
+        release_lease(path)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(fd, 'w') as f: f.write(str(os.getpid()))
+    return path
+
+def release_lease(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def pool_mismatch(state, profile_path, headless, trimmed):
+    """Describes how the pool's browsers differ from the requested ones, or returns None if they match."""
+    differences = []
+    if os.path.abspath(state.get('profile_path') or "") != os.path.abspath(profile_path):
+        differences.append(f"profile '{state.get('profile_path')}'")
+    if bool(state.get('headless')) != bool(headless):
+        differences.append("headless" if state.get('headless') else "windowed")
+    if bool(state.get('trimmed')) != bool(trimmed):
+        differences.append(f"{'trimmed' if state.get('trimmed') else 'full'} profile")
+    return ", ".join(differences) or None
+
+def attach_pooled_driver(profile_path, headless=False, trimmed=False):
+    """Attaches to a free session of the running pool. Returns None if there is none.
+
+    Sessions are only used when the pool was started with the same profile,
+    headless and trimmed settings as requested.
+    """
+    state = read_pool_state()
+    if not state: return None
+    mismatch = pool_mismatch(state, profile_path, headless, trimmed)
+    if mismatch:
+        print(f"[WARNING] The browser pool does not match this run (pool: {mismatch}); launching a private browser instead.")
+        return None
+    for session in state.get('sessions', []):
+        lease = try_lease(session['session_id'])
+        if not lease: continue
+        started = time.monotonic()
+        try:
+            driver = PooledFirefox(session['executor_url'], session['session_id'], lease)
+            driver.window_handles # cheap liveness check
+        except Exception as e:
+            print(f"[WARNING] Pooled session {session['slot']} is not responding ({e}).")
+            release_lease(lease)
+            continue
+        driver.startup_seconds = time.monotonic() - started
+        print(f"[SUCCESS] Attached to pooled browser #{session['slot']} in {driver.startup_seconds:.2f}s.")
+        return driver
+    print("[INFO] No free pooled browser available.")
+    return None
+
+def acquire_driver(profile_path, headless=False, trimmed=False, use_pool=True):
+    """Returns a pooled driver when one is free, otherwise launches a fresh Firefox."""
+    driver = attach_pooled_driver(profile_path, headless, trimmed) if use_pool else None
+    if not driver:
+        driver = launch_firefox(profile_path, headless=headless, trimmed=trimmed)
+    driver.late_tabs_closed = False # a tab may still open after the settle wait
+    return driver
+
+def serve_pool(profile_path, size, headless, trimmed):
+    """Daemon body: launches the sessions, publishes them and waits to be stopped."""
+    drivers = []
+    try:
+        sessions = []
+        for slot in range(1, size + 1):
+            driver = launch_firefox(profile_path, headless=headless, trimmed=trimmed, slot=slot)
+            drivers.append(driver)
+            sessions.append({
+                'slot': slot, 'executor_url': driver.service.service_url,
+                'session_id': driver.session_id, 'startup_seconds': round(driver.startup_seconds, 2)
+            })
+        state = {
+            'pid': os.getpid(), 'started': datetime.now().isoformat(timespec='seconds'),
+            'profile_path': profile_path, 'headless': headless, 'trimmed': trimmed, 'sessions': sessions
+        }
+        with open(POOL_STATE_FILE, 'w', encoding='utf-8') as f: json.dump(state, f, indent=2)
+        while not os.path.exists(POOL_STOP_FILE):
+            time.sleep(1)
+    finally:
+        for driver in drivers:
+            try: driver.quit()
+            except Exception: pass
+        for path in (POOL_STATE_FILE, POOL_STOP_FILE):
+            if os.path.exists(path): os.remove(path)
+        shutil.rmtree(POOL_LEASE_DIR, ignore_errors=True)
+
+def start_pool(size, headless, trimmed):
+    """Starts the pool daemon in the background and waits until it is ready."""
+    if read_pool_state():
+        print("[INFO] A browser pool is already running."); print_pool_status(); return
+    if os.path.exists(POOL_STOP_FILE): os.remove(POOL_STOP_FILE)
+    args = [sys.executable, os.path.abspath(__file__), "serve", "--size", str(size)]
+    if headless: args.append("--headless")
+    if not trimmed: args.append("--full-profile")
+    kwargs = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == 'nt' else {'start_new_session': True}
+    started = time.monotonic()
+    process = subprocess.Popen(args, cwd=os.getcwd(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+    print(f"[INFO] Starting browser pool of {size} (pid {process.pid})...")
+    while time.monotonic() - started < POOL_START_TIMEOUT_SECONDS:
+        if read_pool_state():
+            print(f"[SUCCESS] Browser pool ready in {time.monotonic() - started:.1f}s.")
+            print_pool_status(); return
+        if process.poll() is not None:
+            print("[FATAL ERROR] The pool daemon exited during start-up."); return
+        time.sleep(0.5)
+    print("[FATAL ERROR] Timed out waiting for the browser pool to start.")
+
+def stop_pool():
+    """Asks the pool daemon to close its browsers and exit."""
+    if not read_pool_state():
+        print("[INFO] No browser pool is running."); return
+    open(POOL_STOP_FILE, 'w').close()
+    for _ in range(60):
+        if not read_pool_state():
+            print("[SUCCESS] Browser pool stopped."); return
+        time.sleep(0.5)
+    print("[WARNING] The pool daemon has not exited yet.")
+
+def print_pool_status():
+    """Prints the pool's sessions and which of them are in use."""
+    state = read_pool_state()
+    if not state:
+        print("[INFO] No browser pool is running."); return
+    print(f"[INFO] Pool pid {state['pid']}, started {state['started']} ({'headless' if state['headless'] else 'windowed'}, {'trimmed' if state['trimmed'] else 'full'} profile)")
+    for session in state['sessions']:
+        busy = "in use" if os.path.exists(_lease_path(session['session_id'])) else "free"
+        print(f"  #{session['slot']}: {session['executor_url']}  start-up {session['startup_seconds']}s  [{busy}]")
+
+def pool_command(argv):
+    """Handles the start/stop/status/serve sub-commands."""
+    parser = argparse.ArgumentParser(prog="browser_pool", description="Manage the warm browser pool.")
+    parser.add_argument("command", choices=["start", "stop", "status", "serve"])
+    parser.add_argument("--size", type=int, default=1, help="Number of browser sessions to keep warm.")
+    parser.add_argument("--headless", action="store_true", help="Run the pooled browsers without a window.")
+    parser.add_argument("--full-profile", action="store_true", help="Use the full profile (with extensions) instead of a trimmed copy.")
+    args = parser.parse_args(argv)
+
+    if args.command == "start":
+        start_pool(args.size, args.headless, not args.full_profile)
+    elif args.command == "stop":
+        stop_pool()
+    elif args.command == "status":
+        print_pool_status()
+    else:
+        from scraper_engine import FIREFOX_PROFILE_PATH
+        serve_pool(FIREFOX_PROFILE_PATH, args.size, args.headless, not args.full_profile)
+
+if __name__ == "__main__":
+    pool_command(sys.argv[1:])
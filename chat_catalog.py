@@ -0,0 +1,252 @@
+#
+# FILENAME: chat_catalog.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.2 (Indexed Chat Catalog)
+#
+# DESCRIPTION:
+# An indexed SQLite catalog of every known chat (id, URL, title),
+# built from chats.json and kept in sync with it. Lookups by ID or
+# URL use the table's indexes instead of scanning the whole list,
+# titles have a full-text index, and each chat records when it was
+# last scraped. New chats are added by upsert without renumbering
+# existing ones. chat_discovery.py merges the app sidebar into it.
+# A run's chat selection can be IDs and ranges, 'all' or 'unscraped'.
+#
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+## ------------------- CONFIGURATION ------------------- ##
+CATALOG_FILE = "chats.db"
+MASTER_CHAT_LIST_FILE = "chats.json"
+## ----------------------------------------------------- ##
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL DEFAULT '',
+    discovered_at TEXT,
+    updated_at TEXT,
+    last_scraped TEXT
+);
+CREATE INDEX IF NOT EXISTS chats_last_scraped ON chats(last_scraped);
+CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_titles USING fts5(title, content='chats', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS chats_ai AFTER INSERT ON chats BEGIN
+    INSERT INTO chat_titles(rowid, title) VALUES (new.id, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS chats_ad AFTER DELETE ON chats BEGIN
+    INSERT INTO chat_titles(chat_titles, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS chats_au AFTER UPDATE OF title ON chats BEGIN
+    INSERT INTO chat_titles(chat_titles, rowid, title) VALUES ('delete', old.id, old.title);
+    INSERT INTO chat_titles(rowid, title) VALUES (new.id, new.title);
+END;
+"""
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+def parse_id_string(id_string, valid_ids=None):
+    """Parses a string like '1, 5, 10-15' into a sorted list of integers.
+
+    Only IDs contained in `valid_ids` (any container, e.g. the catalog's
+    real ID set) are kept; with no `valid_ids` every positive ID is kept.
+    """
+    ids = set()
+    keep = (lambda i: i >= 1) if valid_ids is None else (lambda i: i in valid_ids)
+    for part in id_string.split(','):
+        part = part.strip()
+        if not part: continue
+        if '-' in part:
+            try:
+                start, end = map(int, part.split('-'))
+                if start > end: start, end = end, start
+                if valid_ids is not None and valid_ids:
+                    start, end = max(start, min(valid_ids)), min(end, max(valid_ids))
+                ids.update(i for i in range(start, end + 1) if keep(i))
+            except ValueError: print(f"[WARNING] Invalid range '{part}' ignored.")
+        else:
+            try:
+                num = int(part)
+                if keep(num): ids.add(num)
+                else: print(f"[WARNING] Chat ID {num} is not in the catalog and was ignored.")
+            except ValueError: print(f"[WARNING] Invalid number '{part}' ignored.")
+    return sorted(ids)
+
+class ChatCatalog:
+    """Thread-safe wrapper around the SQLite chat catalog."""
+
+    def __init__(self, path=CATALOG_FILE, source_json=MASTER_CHAT_LIST_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.executescript(SCHEMA)
+            try:
+                self.db.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError:
+                self.has_fts = False # SQLite built without FTS5: fall back to LIKE
+        if source_json:
+            self.sync_from_json(source_json)
+
+    def close(self):
+        self.db.close()
+
+    def _meta(self, key):
+        row = self.db.execute("SELECT value FROM catalog_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO catalog_meta(key, value) VALUES (?, ?)", (key, str(value)))
+
+    def get_meta(self, key):
+        with self.lock:
+            return self._meta(key)
+
+    def set_meta(self, key, value):
+        with self.lock, self.db:
+            self._set_meta(key, value)
+
+    # --- loading ---
+    def sync_from_json(self, json_path):
+        """Imports chats.json if it changed since the last import."""
+        if not os.path.exists(json_path): return 0
+        mtime = str(os.path.getmtime(json_path))
+        with self.lock:
+            if self._meta('source_mtime') == mtime: return 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            chats = json.load(f)
+        added, updated = self.upsert_chats(chats)
+        with self.lock, self.db:
+            self._set_meta('source_mtime', mtime)
+        print(f"[INFO] Catalog synced from '{json_path}': {added} new, {updated} renamed.")
+        return added + updated
+
+    def upsert_chats(self, chats):
+        """Adds or updates chats by URL. Existing chats keep their IDs.
+
+        A new chat keeps the ID it was given if that ID is free; otherwise
+        it gets the next ID after the current maximum. Returns (added, updated).
+        """
+        added = updated = 0
+        now = _now()
+        with self.lock, self.db:
+            next_id = (self.db.execute("SELECT MAX(id) FROM chats").fetchone()[0] or 0) + 1
+            for chat in chats:
+                url, title = chat.get('url'), chat.get('title', '')
+                if not url: continue
+                row = self.db.execute("SELECT id, title FROM chats WHERE url = ?", (url,)).fetchone()
+                if row:
+                    if row['title'] != title:
+                        self.db.execute("UPDATE chats SET title = ?, updated_at = ? WHERE id = ?", (title, now, row['id']))
+                        updated += 1
+                    continue
+                chat_id = chat.get('id')
+                if not isinstance(chat_id, int) or self.db.execute("SELECT 1 FROM chats WHERE id = ?", (chat_id,)).fetchone():
+                    chat_id = next_id
+                self.db.execute(
+                    "INSERT INTO chats(id, url, title, discovered_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (chat_id, url, title, now, now)
+                )
+                next_id = max(next_id, chat_id + 1)
+                added += 1
+        return added, updated
+
+    # --- queries ---
+    def count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+
+    def id_set(self):
+        """All known chat IDs (a set of small integers)."""
+        with self.lock:
+            return {row[0] for row in self.db.execute("SELECT id FROM chats")}
+
+    def select_ids(self, selector):
+        """Resolves a chat selection: 'all', 'unscraped', or IDs and ranges ('1-5, 8')."""
+        keyword = selector.strip().lower()
+        if keyword == "all":
+            return sorted(self.id_set())
+        if keyword == "unscraped":
+            with self.lock:
+                return [row[0] for row in self.db.execute("SELECT id FROM chats WHERE last_scraped IS NULL ORDER BY id")]
+        return parse_id_string(selector, self.id_set())
+
+    def get_chats_by_ids(self, ids):
+        """Returns the chats with the given IDs, in ID order, as dicts."""
+        ids = list(ids)
+        rows = []
+        with self.lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows += self.db.execute(f"SELECT id, url, title, last_scraped FROM chats WHERE id IN ({placeholders})", chunk).fetchall()
+        return sorted((dict(row) for row in rows), key=lambda chat: chat['id'])
+
+    def get_chat_by_url(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT id, url, title, last_scraped FROM chats WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def titles_by_url(self):
+        """Maps every catalogued URL to its title (for discovery's change check)."""
+        with self.lock:
+            return {row[0]: row[1] for row in self.db.execute("SELECT url, title FROM chats")}
+
+    def iter_chats(self, unscraped_only=False, batch_size=200):
+        """Yields every chat (or only never-scraped ones) in ID order, a page at a time."""
+        sql = "SELECT id, url, title, last_scraped FROM chats WHERE id > ?"
+        if unscraped_only: sql += " AND last_scraped IS NULL"
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.db.execute(sql + " ORDER BY id LIMIT ?", (last_id, batch_size)).fetchall()
+            if not rows: return
+            for row in rows:
+                yield dict(row)
+            last_id = rows[-1]['id']
+
+    def search_titles(self, query, unscraped_only=False, limit=50):
+        """Full-text title search, best matches first."""
+        extra = " AND c.last_scraped IS NULL" if unscraped_only else ""
+        with self.lock:
+            if self.has_fts:
+                terms = " ".join('"' + word.replace('"', '""') + '"*' for word in query.split())
+                rows = self.db.execute(
+                    "SELECT c.id, c.url, c.title, c.last_scraped FROM chat_titles JOIN chats c ON c.id = chat_titles.rowid "
+                    f"WHERE chat_titles MATCH ?{extra} ORDER BY bm25(chat_titles) LIMIT ?", (terms, limit)
+                ).fetchall()
+            else:
+                rows = self.db.execute(
+                    f"SELECT c.id, c.url, c.title, c.last_scraped FROM chats c WHERE c.title LIKE ?{extra} ORDER BY c.id LIMIT ?",
+                    (f"%{query}%", limit)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    # --- updates ---
+    def mark_scraped(self, chat_id, when=None):
+        with self.lock, self.db:
+            self.db.execute("UPDATE chats SET last_scraped = ? WHERE id = ?", (when or _now(), chat_id))
+
+    def export_json(self, json_path=MASTER_CHAT_LIST_FILE):
+        """Writes the catalog back out in the chats.json format."""
+        with self.lock:
+            chats = [dict(row) for row in self.db.execute("SELECT id, title, url FROM chats ORDER BY id")]
+        tmp_path = f"{json_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(chats, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, json_path)
+        with self.lock, self.db:
+            self._set_meta('source_mtime', os.path.getmtime(json_path))
+        return len(chats)
@@ -0,0 +1,160 @@
+#
+# FILENAME: chat_discovery.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.0 (Sidebar Discovery Crawler)
+#
+# DESCRIPTION:
+# Builds and refreshes the chat list automatically, replacing the
+# hand-run JavaScript snippet that created chats.json. Opens the app,
+# pages through the sidebar's conversation list (which loads lazily as
+# it is scrolled) and reads the title and URL of every new entry with
+# a single script call per page. Results are merged into the chat
+# catalog by URL: new chats get the next free IDs (oldest first), known
+# chats keep theirs, and renamed chats are updated. chats.json is then
+# rewritten from the catalog.
+#
+# The sidebar lists the most recently active chats first, so an
+# incremental discovery stops once it has seen a run of chats that are
+# already known under the same title. Use --full to walk the whole list.
+#
+# USAGE:
+#   python scraper_master.py discover [--full] [--headless]
+#
+
+import time
+import argparse
+
+from chat_catalog import ChatCatalog, MASTER_CHAT_LIST_FILE
+
+## ------------------- CONFIGURATION ------------------- ##
+APP_URL = "https://gemini.google.com/app"
+SIDEBAR_ITEM_SELECTOR = "[data-test-id='conversation']"
+SIDEBAR_TITLE_SELECTOR = ".conversation-title"
+PAGE_TIMEOUT_SECONDS = 10        # how long to wait for the next page of the list
+STOP_AFTER_KNOWN = 40            # consecutive unchanged chats that end an incremental pass
+MAX_PAGES = 1000
+## ----------------------------------------------------- ##
+
+# Reads the sidebar entries from `startIndex` on, scrolls the list to load
+# the next page and waits (MutationObserver) until more entries appear or
+# the timeout passes. One call per page: returns {chats, total, more}.
+COLLECT_SIDEBAR_PAGE_SCRIPT = """
+const [itemSelector, titleSelector, startIndex, timeoutMs, done] = arguments;
+const urlOf = (item) => {
+    const link = item.matches('a[href]') ? item : (item.querySelector('a[href]') || item.closest('a[href]'));
+    if (link) { const url = new URL(link.getAttribute('href'), location.href); return url.origin + url.pathname; }
+    const match = (item.getAttribute('jslog') || '').match(/c_([0-9a-f]{8,})/);
+    return match ? location.origin + '/app/' + match[1] : null;
+};
+const items = document.querySelectorAll(itemSelector);
+const chats = [];
+for (let i = startIndex; i < items.length; i++) {
+    const titleEl = items[i].querySelector(titleSelector) || items[i];
+    chats.push({url: urlOf(items[i]), title: (titleEl.textContent || '').trim()});
+}
+const total = items.length;
+if (!total) { done({chats: chats, total: 0, more: false}); return; }
+const last = items[total - 1];
+let scroller = last.parentElement;
+while (scroller && !(scroller.scrollHeight > scroller.clientHeight && /auto|scroll/.test(getComputedStyle(scroller).overflowY))) {
+    scroller = scroller.parentElement;
+}
+const observer = new MutationObserver(() => {
+    if (document.querySelectorAll(itemSelector).length > total) finish(true);
+});
+const finish = (more) => { observer.disconnect(); clearTimeout(timer); done({chats: chats, total: total, more: more}); };
+const timer = setTimeout(() => finish(false), timeoutMs);
+observer.observe(scroller || document.body, {childList: true, subtree: true});
+last.scrollIntoView({block: 'end'});
+if (scroller) { scroller.scrollTop = scroller.scrollHeight; scroller.dispatchEvent(new Event('scroll')); }
+"""
+
+def collect_sidebar_page(driver, start_index, timeout_seconds=PAGE_TIMEOUT_SECONDS):
+    """Returns the sidebar entries after `start_index` and whether more were loaded."""
+    # The script timeout has to outlive the in-page timer.
+    driver.set_script_timeout(timeout_seconds + 5)
+    result = driver.execute_async_script(
+        COLLECT_SIDEBAR_PAGE_SCRIPT, SIDEBAR_ITEM_SELECTOR, SIDEBAR_TITLE_SELECTOR, start_index, int(timeout_seconds * 1000)
+    ) or {}
+    return result.get('chats', []), result.get('total', 0), bool(result.get('more'))
+
+def crawl_sidebar(driver, known_titles, full=False, stop_after_known=STOP_AFTER_KNOWN):
+    """Pages through the sidebar, newest first. Returns (new, renamed, seen_urls).
+
+    `known_titles` maps every catalogued URL to its title. Unless `full`
+    is set, crawling stops after `stop_after_known` consecutive entries
+    that are already known with the same title.
+    """
+    new, renamed, seen_urls = [], [], set()
+    unchanged_run, start_index = 0, 0
+    for page in range(1, MAX_PAGES + 1):
+        started = time.monotonic()
+        chats, total, more = collect_sidebar_page(driver, start_index)
+        start_index = total
+        for chat in chats:
+            url, title = chat.get('url'), chat.get('title', '')
+            if not url or url in seen_urls: continue
+            seen_urls.add(url)
+            if url not in known_titles:
+                new.append({'url': url, 'title': title}); unchanged_run = 0
+            elif title and known_titles[url] != title:
+                renamed.append({'url': url, 'title': title}); unchanged_run = 0
+            else:
+                unchanged_run += 1
+        print(f"[INFO] Sidebar page {page}: {len(chats)} entries ({total} loaded, {len(new)} new, "
+              f"{len(renamed)} renamed) in {time.monotonic() - started:.1f}s.")
+        if not more:
+            break
+        if not full and unchanged_run >= stop_after_known:
+            print(f"[INFO] The last {unchanged_run} chats are already catalogued; stopping early (use --full to walk the whole list).")
+            break
+    return new, renamed, seen_urls
+
+def run_discovery(full=False, headless=False):
+    """Crawls the sidebar and merges what it finds into the catalog and chats.json."""
+    from selenium.common.exceptions import WebDriverException
+    from scraper_engine import FIREFOX_PROFILE_PATH, quit_driver
+    from browser_pool import acquire_driver, close_late_tabs
+    from pacing import wait_for_page, detect_throttling, ThrottledError
+
+    catalog = ChatCatalog(source_json=MASTER_CHAT_LIST_FILE)
+    driver = None
+    try:
+        known_titles = catalog.titles_by_url()
+        print(f"[INFO] Discovering chats ({'full' if full else 'incremental'}); {len(known_titles)} already catalogued.")
+        driver = acquire_driver(FIREFOX_PROFILE_PATH, headless=headless)
+        close_late_tabs(driver)
+        driver.get(APP_URL)
+        reason = detect_throttling(driver)
+        if reason:
+            print(f"[FATAL ERROR] The app page looks throttled ({reason}). Try again later."); return
+        try:
+            wait_for_page(driver, SIDEBAR_ITEM_SELECTOR, PAGE_TIMEOUT_SECONDS * 2)
+        except ThrottledError as e:
+            print(f"[FATAL ERROR] The app {e}. Try again later."); return
+        except TimeoutError:
+            print("[FATAL ERROR] No conversations found in the sidebar. Make sure you are logged in and the sidebar is open."); return
+
+        new, renamed, seen = crawl_sidebar(driver, known_titles, full=full)
+        # The sidebar is newest first; the oldest new chat gets the lowest new ID.
+        added, updated = catalog.upsert_chats(list(reversed(new)) + renamed)
+        catalog.set_meta('last_discovery', time.strftime('%Y-%m-%dT%H:%M:%S'))
+        total = catalog.export_json(MASTER_CHAT_LIST_FILE)
+        print(f"[SUCCESS] Discovery saw {len(seen)} chats: {added} new, {updated} renamed. "
+              f"'{MASTER_CHAT_LIST_FILE}' now lists {total} chats.")
+        if full:
+            missing = len(known_titles) - len(seen & set(known_titles))
+            if missing: print(f"[INFO] {missing} catalogued chats no longer appear in the sidebar (kept in the catalog).")
+    except WebDriverException as e:
+        print(f"[FATAL ERROR] Discovery failed: {e}")
+    finally:
+        if driver: quit_driver(driver)
+        catalog.close()
+
+def discover_command(argv):
+    """Handles 'scraper_master.py discover [--full] [--headless]'."""
+    parser = argparse.ArgumentParser(prog="scraper_master.py discover", description="Refresh chats.json from the app sidebar.")
+    parser.add_argument("--full", action="store_true", help="Walk the whole list instead of stopping at known chats.")
+    parser.add_argument("--headless", action="store_true", help="Run the browser without a window.")
+    args = parser.parse_args(argv)
+    run_discovery(full=args.full, headless=args.headless)
@@ -0,0 +1,123 @@
+#
+# FILENAME: config_schema.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.1 (Run Config Schema)
+#
+# DESCRIPTION:
+# The one list of keys a run's config.json may contain, with each key's
+# type, allowed values and default, so a typo or a bad value is reported
+# before any browser starts, not part-way through an unattended run.
+# Both the engine (input_vNN/config.json) and the non-interactive
+# 'run' command (--config and flags) validate through it.
+# window_size and detach_processed tune the "windowed" extraction mode.
+#
+
+import json
+
+from pacing import DEFAULT_SELECTOR_TIMEOUT_SECONDS, BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS
+from history_loader import DEFAULT_TIMEOUT_SECONDS, DEFAULT_STALL_ROUNDS, DEFAULT_POLL_SECONDS
+from structured_output import DEFAULT_OUTPUT_FORMATS, SUPPORTED_OUTPUT_FORMATS
+from delta_scrape import DELTA_MODES
+from job_queue import DEFAULT_MAX_ATTEMPTS, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS
+
+## ------------------- CONFIGURATION ------------------- ##
+EXTRACTION_MODES = ("script", "elements", "snapshot", "windowed")
+HISTORY_LOAD_MODES = ("auto", "manual")
+## ----------------------------------------------------- ##
+
+NUMBER = (int, float)
+
+# key -> type, default and constraints. 'choices' limits a value (or each
+# item of a list); 'min' is an inclusive lower bound; 'nullable' allows null.
+CONFIG_SCHEMA = {
+    'chat_ids_to_scrape':       {'type': str, 'required': True, 'help': "IDs and ranges ('1-5, 8'), 'all' or 'unscraped'"},
+    'delay_seconds':            {'type': NUMBER, 'default': 5, 'min': 0, 'help': "at most one chat start per this many seconds"},
+    'workers':                  {'type': int, 'default': 1, 'min': 1, 'help': "browser workers (Selenium engine)"},
+    'tabs':                     {'type': int, 'default': 4, 'min': 1, 'help': "concurrent tabs (async engine)"},
+    'extraction_mode':          {'type': str, 'default': "script", 'choices': EXTRACTION_MODES},
+    'window_size':              {'type': int, 'default': 200, 'min': 1, 'help': "message containers per windowed extraction batch"},
+    'detach_processed':         {'type': bool, 'default': False, 'help': "remove each windowed batch from the page once it is read"},
+    'save_snapshots':           {'type': bool, 'default': False},
+    'output_formats':           {'type': list, 'default': DEFAULT_OUTPUT_FORMATS, 'choices': sorted(SUPPORTED_OUTPUT_FORMATS)},
+    'skip_unchanged':           {'type': bool, 'default': True},
+    'delta_mode':               {'type': str, 'default': "off", 'choices': DELTA_MODES},
+    'selector_timeout_seconds': {'type': NUMBER, 'default': DEFAULT_SELECTOR_TIMEOUT_SECONDS, 'min': 1},
+    'backoff_base_seconds':     {'type': NUMBER, 'default': BACKOFF_BASE_SECONDS, 'min': 0},
+    'backoff_max_seconds':      {'type': NUMBER, 'default': BACKOFF_MAX_SECONDS, 'min': 0},
+    'history_load':             {'type': str, 'default': "auto", 'choices': HISTORY_LOAD_MODES},
+    'history_timeout_seconds':  {'type': NUMBER, 'default': DEFAULT_TIMEOUT_SECONDS, 'min': 1},
+    'history_stall_rounds':     {'type': int, 'default': DEFAULT_STALL_ROUNDS, 'min': 1},
+    'history_poll_seconds':     {'type': NUMBER, 'default': DEFAULT_POLL_SECONDS, 'min': 0.05},
+    'headless':                 {'type': bool, 'default': False},
+    'trimmed_profile':          {'type': bool, 'default': False},
+    'use_browser_pool':         {'type': bool, 'default': True},
+    'metrics_port':             {'type': int, 'default': None, 'min': 1, 'nullable': True},
+    'archive_after_run':        {'type': bool, 'default': False},
+    'update_search_index':      {'type': bool, 'default': True},
+    'max_attempts':             {'type': int, 'default': DEFAULT_MAX_ATTEMPTS, 'min': 1},
+    'retry_base_seconds':       {'type': NUMBER, 'default': RETRY_BASE_SECONDS, 'min': 0},
+    'retry_max_seconds':        {'type': NUMBER, 'default': RETRY_MAX_SECONDS, 'min': 0},
+}
+
+def _type_name(expected):
+    if expected is NUMBER: return "a number"
+    return {str: "a string", int: "a whole number", bool: "true or false", list: "a list"}[expected]
+
+def _check_value(key, value, rule):
+    """Returns an error message for one value, or None."""
+    expected = rule['type']
+    if value is None:
+        return None if rule.get('nullable') else f"'{key}' must not be null."
+    # bool is a subclass of int, so true/false must not pass as a number (and vice versa).
+    if isinstance(value, bool) != (expected is bool) or not isinstance(value, expected):
+        return f"'{key}' must be {_type_name(expected)}, not {json.dumps(value)}."
+    choices = rule.get('choices')
+    if choices:
+        values = value if isinstance(value, list) else [value]
+        bad = [item for item in values if item not in choices]
+        if bad: return f"'{key}' has unsupported value(s) {', '.join(map(str, bad))} (choose from: {', '.join(choices)})."
+    if 'min' in rule and value < rule['min']:
+        return f"'{key}' must be at least {rule['min']}, not {value}."
+    return None
+
+def validate_config(config):
+    """Checks a config dict against CONFIG_SCHEMA. Returns (errors, warnings) as lists of messages."""
+    errors, warnings = [], []
+    if not isinstance(config, dict):
+        return ["The config must be a JSON object."], warnings
+    for key, rule in CONFIG_SCHEMA.items():
+        if key not in config:
+            if rule.get('required'): errors.append(f"'{key}' is required ({rule.get('help', '')}).")
+            continue
+        error = _check_value(key, config[key], rule)
+        if error: errors.append(error)
+    for key in sorted(set(config) - set(CONFIG_SCHEMA)):
+        warnings.append(f"Unknown config key '{key}' is ignored.")
+    if not errors and config.get('backoff_base_seconds', 0) > config.get('backoff_max_seconds', BACKOFF_MAX_SECONDS):
+        warnings.append("'backoff_base_seconds' is larger than 'backoff_max_seconds'; every back-off will be the maximum.")
+    return errors, warnings
+
+def check_config(config, source):
+    """Validates a config and prints its problems. Returns True if it can be used."""
+    errors, warnings = validate_config(config)
+    for warning in warnings:
+        print(f"[WARNING] {source}: {warning}")
+    for error in errors:
+        print(f"[ERROR] {source}: {error}")
+    return not errors
+
+def parse_config_value(key, text):
+    """Parses a command-line value for `key`: JSON if it parses, otherwise the plain string.
+
+    Lists may also be written comma-separated ('txt,jsonl').
+    """
+    rule = CONFIG_SCHEMA.get(key, {})
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        value = text
+    if rule.get('type') is list and isinstance(value, str):
+        value = [item.strip() for item in value.split(',') if item.strip()]
+    if rule.get('type') is str and not isinstance(value, str):
+        value = text # e.g. chat_ids_to_scrape=5 stays the string '5'
+    return value
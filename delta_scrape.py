@@ -0,0 +1,129 @@
+#
+# FILENAME: delta_scrape.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.1 (Delta Scraping)
+#
+# DESCRIPTION:
+# Fetches only the new turns of chats that are already archived. The
+# hashes of the archive's last turns are searched for in the live chat,
+# newest first, and only the turns after the match are extracted and
+# appended; if no match is found the engine does a full scrape.
+# delta_mode "check" only reports which archives are stale.
+#
+
+import os
+import csv
+
+from transcript_writer import TranscriptWriter, turn_hash, read_tail_hashes
+from run_manifest import finalize_transcript, link_or_copy
+
+## ------------------- CONFIGURATION ------------------- ##
+DELTA_MODES = ("off", "append", "check")
+DELTA_WINDOW = 20 # message containers read in the first backward window
+DELTA_REPORT_FILE = "delta_check.csv"
+## ----------------------------------------------------- ##
+
+def extract_turn_range(driver, start, end):
+    """Extracts the turns of message containers [start, end) with one script call."""
+    from scraper_engine import EXTRACT_CONVERSATION_SCRIPT, MESSAGE_CONTAINER_SELECTOR, PROMPT_SELECTOR, RESPONSE_SELECTOR
+    raw_turns = driver.execute_script(EXTRACT_CONVERSATION_SCRIPT, MESSAGE_CONTAINER_SELECTOR, PROMPT_SELECTOR, RESPONSE_SELECTOR, start, end)
+    if not isinstance(raw_turns, list):
+        raise ValueError("Extraction script did not return a list of turns.")
+    return [turn for turn in raw_turns if turn.get('text') is not None]
+
+def locate_archive_tail(driver, tail_hashes, window=DELTA_WINDOW):
+    """Finds the archive's last turns in the live chat, searching backwards.
+
+    Returns (new_turns, last_index, total, calls): the turns after the
+    match, the container index of the last archived turn, the number of
+    rendered containers and the script calls used. new_turns is None if
+    the archive's tail is not among the rendered messages.
+    """
+    from scraper_engine import count_messages
+    total, calls = count_messages(driver), 1
+    size = len(tail_hashes)
+    collected, hashes = [], []
+    end = total
+    while end > 0 and size:
+        start = max(0, end - window)
+        turns = extract_turn_range(driver, start, end)
+        calls += 1
+        collected = turns + collected
+        hashes = [turn_hash(turn['role'], turn['text']) for turn in turns] + hashes
+        for i in range(len(collected) - 1, -1, -1):
+            if hashes[i] != tail_hashes[-1] or i + 1 < size: continue
+            if hashes[i + 1 - size:i + 1] == list(tail_hashes):
+                return collected[i + 1:], collected[i]['index'], total, calls
+        end, window = start, window * 2
+    return None, None, total, calls
+
+def delta_scrape_chat(driver, chat, filename, settings):
+    """Appends only the chat's new turns to its archived transcript.
+
+    Returns True if the chat was handled (appended, linked as unchanged,
+    or checked), or False if the engine should do a full scrape instead.
+    """
+    from scraper_engine import index_transcript
+    chat_id, chat_url = chat.get('id', 'N/A'), chat.get('url', 'URL_MISSING')
+    manifest, corpus, metrics = settings['manifest'], settings['corpus'], settings['metrics']
+    check_only = settings['delta_mode'] == "check"
+    entry = manifest.get(chat_url) or {}
+    previous_path, _ = manifest.previous_file(chat_url)
+    if not previous_path:
+        if check_only: _report(settings, chat, "not archived")
+        return check_only
+    tail, turn_count = entry.get('tail_hashes'), entry.get('turn_count')
+    if not tail or turn_count is None:
+        tail, turn_count = read_tail_hashes(previous_path) # older manifest entry: read the transcript once
+
+    with metrics.phase('extraction'):
+        new_turns, last_index, total, calls = locate_archive_tail(driver, tail)
+    if new_turns is None:
+        print(f"[INFO] The archive's last turn is not among the {total} rendered messages (edited, or many new turns).")
+        if check_only: _report(settings, chat, "changed")
+        return check_only
+    message_count = entry['message_count'] + total - last_index - 1 if entry.get('message_count') is not None else None
+    print(f"[INFO] Delta: {len(new_turns)} new turns after the archived {turn_count} ({calls} script calls).")
+    if check_only:
+        _report(settings, chat, "stale" if new_turns else "current", len(new_turns))
+        return True
+
+    if not new_turns:
+        if os.path.abspath(previous_path) != os.path.abspath(filename):
+            with metrics.phase('write'):
+                link_or_copy(previous_path, filename)
+        manifest.record(chat_url, version=str(settings['version']), file=filename)
+        print(f"[INFO] No new turns since the last scrape. Reused '{previous_path}'.")
+    else:
+        with metrics.phase('write'):
+            with TranscriptWriter(filename) as writer:
+                writer.write_header(chat_id, chat_url, chat.get('title', 'Untitled'))
+                writer.copy_turns_from(previous_path, turn_count, tail)
+                for turn in new_turns:
+                    writer.write_turn(turn['role'], turn['text'])
+            outcome = finalize_transcript(manifest, chat, settings['version'], writer, message_count)
+        metrics.add_bytes(writer.bytes_written)
+        print(f"[SUCCESS] Appended {len(new_turns)} turns to '{filename}' ({writer.turn_count} in total, {outcome}).")
+    if corpus:
+        with metrics.phase('write'):
+            corpus.write_transcript(chat, filename); corpus.flush()
+    index_transcript(filename, settings)
+    settings['catalog'].mark_scraped(chat_id)
+    return True
+
+def _report(settings, chat, status, new_turns=None):
+    settings['delta_report'].append({
+        'chat_id': chat.get('id'), 'title': chat.get('title'), 'status': status,
+        'new_turns': '' if new_turns is None else new_turns
+    })
+
+def write_delta_report(output_dir, rows):
+    """Writes the delta check results to output_dir/delta_check.csv."""
+    path = os.path.join(output_dir, DELTA_REPORT_FILE)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['chat_id', 'title', 'status', 'new_turns'])
+        writer.writeheader()
+        writer.writerows(sorted(rows, key=lambda row: row['chat_id']))
+    stale = sum(1 for row in rows if row['status'] != "current")
+    print(f"[INFO] Delta check: {stale} of {len(rows)} chats need scraping. Details saved to '{path}'.")
+    return path
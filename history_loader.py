@@ -0,0 +1,94 @@
+#
+# FILENAME: history_loader.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.1 (Automatic History Loader)
+#
+# DESCRIPTION:
+# Loads the full history of a conversation without the manual
+# "scroll to the top and press Enter" step. It keeps bringing the
+# first message into view (and scrolls the chat container to the top)
+# until the message count stops growing, then reports how long the
+# load took and how many messages it found. While messages keep arriving
+# it only waits for rendering to settle; a stall is only counted after
+# a full poll interval without new messages.
+#
+
+import time
+from pacing import wait_for_dom_quiet
+
+## ------------------- CONFIGURATION ------------------- ##
+DEFAULT_TIMEOUT_SECONDS = 120
+DEFAULT_STALL_ROUNDS = 3
+DEFAULT_POLL_SECONDS = 1.0 # how long a round must see no new messages to count as a stall
+DEFAULT_QUIET_MS = 300
+## ----------------------------------------------------- ##
+
+# Scrolls towards the oldest message in every way the page may listen for,
+# then returns the current message count (one round-trip per attempt).
+SCROLL_TO_TOP_SCRIPT = """
+const [containerSel, scrollableSel] = arguments;
+const first = document.querySelector(containerSel);
+if (first) first.scrollIntoView({block: 'start'});
+for (const el of document.querySelectorAll(scrollableSel)) {
+    el.scrollTop = 0;
+    el.dispatchEvent(new WheelEvent('wheel', {deltaY: -1000, bubbles: true}));
+    el.dispatchEvent(new Event('scroll', {bubbles: true}));
+}
+return document.querySelectorAll(containerSel).length;
+"""
+
+def load_full_history(driver, container_selector, scrollable_selector,
+                      timeout_seconds=DEFAULT_TIMEOUT_SECONDS,
+                      stall_rounds=DEFAULT_STALL_ROUNDS,
+                      poll_seconds=DEFAULT_POLL_SECONDS):
+    """Scrolls to the top until the message count is stable for `stall_rounds` attempts.
+
+    Returns (complete, message_count, elapsed_seconds). `complete` is False
+    if the timeout ran out while older messages were still arriving.
+    """
+    started = time.monotonic()
+    message_count = driver.execute_script(SCROLL_TO_TOP_SCRIPT, container_selector, scrollable_selector)
+    stalls = 0
+    while time.monotonic() - started < timeout_seconds:
+        round_started = time.monotonic()
+        wait_for_dom_quiet(driver, quiet_ms=DEFAULT_QUIET_MS, timeout_seconds=poll_seconds)
+        current = driver.execute_script(SCROLL_TO_TOP_SCRIPT, container_selector, scrollable_selector)
+        if current <= message_count:
+            # A quiet page may still be fetching an older batch: a round only
+            # counts as a stall once a full poll window has passed without growth.
+            time.sleep(max(0.0, poll_seconds - (time.monotonic() - round_started)))
+            current = driver.execute_script(SCROLL_TO_TOP_SCRIPT, container_selector, scrollable_selector)
+        if current > message_count:
+            message_count, stalls = current, 0
+        else:
+            stalls += 1
+            if stalls >= stall_rounds:
+                return True, message_count, time.monotonic() - started
+    return False, message_count, time.monotonic() - started
+
+def load_history_or_prompt(driver, container_selector, scrollable_selector, settings, manual_prompt):
+    """Runs the automatic loader, falling back to `manual_prompt()` if it fails.
+
+    `settings` may contain history_load ("auto" or "manual"),
+    history_timeout_seconds, history_stall_rounds and history_poll_seconds.
+    Returns the seconds spent loading (including any manual fallback).
+    """
+    started = time.monotonic()
+    if settings.get('history_load', 'auto') == 'manual':
+        manual_prompt(); return time.monotonic() - started
+    try:
+        complete, message_count, elapsed = load_full_history(
+            driver, container_selector, scrollable_selector,
+            timeout_seconds=settings.get('history_timeout_seconds', DEFAULT_TIMEOUT_SECONDS),
+            stall_rounds=settings.get('history_stall_rounds', DEFAULT_STALL_ROUNDS),
+            poll_seconds=settings.get('history_poll_seconds', DEFAULT_POLL_SECONDS)
+        )
+    except Exception as e:
+        print(f"[WARNING] Automatic history loading failed ({e}). Falling back to manual scrolling.")
+        manual_prompt(); return time.monotonic() - started
+    if complete:
+        print(f"[INFO] History loaded automatically: {message_count} messages in {elapsed:.1f}s.")
+    else:
+        print(f"[WARNING] History still loading after {elapsed:.1f}s ({message_count} messages so far). Falling back to manual scrolling.")
+        manual_prompt()
+    return time.monotonic() - started
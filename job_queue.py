@@ -0,0 +1,196 @@
+#
+# FILENAME: job_queue.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.0 (Persistent Job Queue)
+#
+# DESCRIPTION:
+# An on-disk (SQLite) queue of the chats a run still has to scrape,
+# so failures are retried instead of dropped. Every chat of a version
+# is a job that moves through pending -> running -> done, or back to
+# pending with a capped exponential delay when an attempt fails. After
+# `max_attempts` the job is marked failed. The queue is updated as each
+# job changes state, so a run that dies part-way leaves an accurate
+# record. The next run of the same version puts its running jobs back
+# in the queue. At the end of a run, the failed (and any unprocessed)
+# chats are listed in failed_chats.csv together with the ID string
+# that re-selects them in config.json.
+#
+
+import os
+import csv
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+## ------------------- CONFIGURATION ------------------- ##
+JOB_QUEUE_FILE = "job_queue.db"
+FAILURE_REPORT_FILE = "failed_chats.csv"
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 600
+IDLE_POLL_SECONDS = 1.0  # how often an idle worker checks for re-queued jobs
+ERROR_TEXT_LIMIT = 500
+## ----------------------------------------------------- ##
+
+JOB_STATES = ("pending", "running", "done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    version TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    url TEXT,
+    title TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    worker TEXT,
+    last_error TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (version, chat_id)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(version, state, next_attempt_at);
+"""
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+def format_id_string(ids):
+    """The inverse of parse_id_string: [1, 2, 3, 7] -> '1-3, 7'."""
+    parts, ids = [], sorted(ids)
+    start = previous = None
+    for chat_id in ids + [None]:
+        if previous is not None and chat_id == previous + 1:
+            previous = chat_id; continue
+        if start is not None:
+            parts.append(str(start) if start == previous else f"{start}-{previous}")
+        start = previous = chat_id
+    return ", ".join(parts)
+
+class JobQueue:
+    """Thread-safe, persistent queue of one version's chat jobs."""
+
+    def __init__(self, version, path=JOB_QUEUE_FILE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 retry_base_seconds=RETRY_BASE_SECONDS, retry_max_seconds=RETRY_MAX_SECONDS):
+        self.version = str(version)
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def enqueue(self, chats):
+        """Makes every chat a fresh pending job. Returns how many were left over from an interrupted run."""
+        now = _now()
+        with self.lock, self.db:
+            interrupted = self.db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE version = ? AND state IN ('pending', 'running')", (self.version,)
+            ).fetchone()[0]
+            # Only the chats selected now are queued; done jobs stay as history.
+            self.db.execute("DELETE FROM jobs WHERE version = ? AND state != 'done'", (self.version,))
+            for chat in chats:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO jobs(version, chat_id, url, title, state, attempts, next_attempt_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'pending', 0, 0, ?)",
+                    (self.version, chat.get('id'), chat.get('url'), chat.get('title'), now)
+                )
+        if interrupted:
+            print(f"[INFO] Job queue: {interrupted} chats were still queued or running when the last v{self.version} run stopped; they are re-queued.")
+        return interrupted
+
+    def claim(self, worker):
+        """Takes the next due job. Returns (chat, wait_seconds).
+
+        chat is None when no job is due: wait_seconds is then how long to
+        wait before asking again, or None once every job is done or failed.
+        """
+        now = time.time()
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT chat_id, url, title, next_attempt_at FROM jobs WHERE version = ? AND state = 'pending' "
+                "ORDER BY next_attempt_at, chat_id LIMIT 1", (self.version,)
+            ).fetchone()
+            if row and row['next_attempt_at'] <= now:
+                self.db.execute(
+                    "UPDATE jobs SET state = 'running', worker = ?, updated_at = ? WHERE version = ? AND chat_id = ?",
+                    (worker, _now(), self.version, row['chat_id'])
+                )
+                return {'id': row['chat_id'], 'url': row['url'], 'title': row['title']}, 0
+            running = self.db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE version = ? AND state = 'running'", (self.version,)
+            ).fetchone()[0]
+        if row: return None, row['next_attempt_at'] - now
+        # A running job may still fail and come back, so keep polling until none is left.
+        return None, IDLE_POLL_SECONDS if running else None
+
+    def _update(self, chat, **fields):
+        fields['updated_at'] = _now()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self.lock, self.db:
+            self.db.execute(f"UPDATE jobs SET {assignments} WHERE version = ? AND chat_id = ?",
+                            list(fields.values()) + [self.version, chat.get('id')])
+
+    def complete(self, chat):
+        self._update(chat, state='done', last_error=None)
+
+    def release(self, chat):
+        """Puts a claimed job back without counting an attempt (e.g. no browser could be started)."""
+        self._update(chat, state='pending', worker=None)
+
+    def fail(self, chat, error):
+        """Records a failed attempt. Returns the retry delay in seconds, or None if the job has failed for good."""
+        with self.lock:
+            attempts = self.db.execute(
+                "SELECT attempts FROM jobs WHERE version = ? AND chat_id = ?", (self.version, chat.get('id'))
+            ).fetchone()[0] + 1
+        error = str(error)[:ERROR_TEXT_LIMIT]
+        if attempts >= self.max_attempts:
+            self._update(chat, state='failed', attempts=attempts, worker=None, last_error=error)
+            return None
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+        self._update(chat, state='pending', attempts=attempts, worker=None, last_error=error, next_attempt_at=time.time() + delay)
+        return delay
+
+    # --- reporting ---
+    def counts(self):
+        """Number of this version's jobs in each state."""
+        with self.lock:
+            rows = self.db.execute("SELECT state, COUNT(*) FROM jobs WHERE version = ? GROUP BY state", (self.version,)).fetchall()
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def unfinished(self):
+        """The jobs that are not done (failed, or never completed), in ID order."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT chat_id, title, url, state, attempts, last_error FROM jobs WHERE version = ? AND state != 'done' ORDER BY chat_id",
+                (self.version,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def write_failure_report(self, output_dir):
+        """Writes the unfinished jobs to output_dir/failed_chats.csv and prints how to retry them."""
+        rows = self.unfinished()
+        path = os.path.join(output_dir, FAILURE_REPORT_FILE)
+        if not rows:
+            if os.path.exists(path): os.remove(path) # a stale report from an earlier attempt at this version
+            return None
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['chat_id', 'title', 'url', 'state', 'attempts', 'last_error'])
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n[WARNING] {len(rows)} chats were not saved. Details saved to '{path}'.")
+        for row in rows[:20]:
+            print(f"  #{row['chat_id']:03d} {row['title']} ({row['state']}, {row['attempts']} attempts): {row['last_error'] or '-'}")
+        if len(rows) > 20: print(f"  ... and {len(rows) - 20} more.")
+        print(f"[INFO] Run v{self.version} again to retry them (saved chats are skipped), "
+              f"or select them with \"chat_ids_to_scrape\": \"{format_id_string(row['chat_id'] for row in rows)}\".")
+        return path
@@ -1,43 +1,71 @@
 #
 # FILENAME: list_chats.py
 # AUTHOR:   Simon & Dora
-# VERSION:  1.0
+# VERSION:  2.0 (Catalog Queries)
 #
 # DESCRIPTION:
-# A simple utility to read the chats.json file and print a
-# numbered list of all chat titles.
+# A simple utility to print a numbered list of chat titles. Reads
+# from the indexed chat catalog (synced from chats.json), so it can
+# also search titles and show chats that have not been scraped yet.
+#
+# USAGE:
+#   python list_chats.py                      (every chat)
+#   python list_chats.py --search Dora        (titles matching 'Dora')
+#   python list_chats.py --unscraped          (not yet scraped)
+#   python list_chats.py --ids "1-5, 28"      (specific IDs)
 #
 
 import json
+import sqlite3
+import argparse
+from chat_catalog import ChatCatalog, parse_id_string
 
 ## ------------------- CONFIGURATION ------------------- ##
 JSON_SOURCE_FILE = "chats.json"
 ## ----------------------------------------------------- ##
 
 def main():
-    """Reads the JSON file and prints the list of chats."""
-    print(f"[INFO] Reading chats from '{JSON_SOURCE_FILE}'...")
+    """Queries the catalog and prints the matching chats."""
+    parser = argparse.ArgumentParser(description="List chats from the catalog.")
+    parser.add_argument("--search", help="Full-text search on chat titles.")
+    parser.add_argument("--unscraped", action="store_true", help="Only chats that have never been scraped.")
+    parser.add_argument("--ids", help="An ID selection such as '1-5, 28'.")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum number of search results.")
+    args = parser.parse_args()
+
+    print(f"[INFO] Reading chats from the catalog (source: '{JSON_SOURCE_FILE}')...")
+    try:
+        catalog = ChatCatalog(source_json=JSON_SOURCE_FILE)
+    except json.JSONDecodeError:
+        print(f"[FATAL ERROR] The file '{JSON_SOURCE_FILE}' is not a valid JSON file."); return
+    except sqlite3.Error as e:
+        print(f"[FATAL ERROR] Could not open the chat catalog: {e}"); return
+
     try:
-        with open(JSON_SOURCE_FILE, 'r', encoding='utf-8') as f:
-            chats = json.load(f)
-        
-        if not chats:
-            print("[ERROR] No chats found in the file.")
+        if not catalog.count():
+            print("[ERROR] No chats found in the catalog.")
             return
-            
+
+        if args.search:
+            chats = catalog.search_titles(args.search, unscraped_only=args.unscraped, limit=args.limit)
+        elif args.ids:
+            chats = catalog.get_chats_by_ids(parse_id_string(args.ids, catalog.id_set()))
+            if args.unscraped:
+                chats = [chat for chat in chats if not chat['last_scraped']]
+        else:
+            chats = catalog.iter_chats(unscraped_only=args.unscraped)
+
         print("-" * 50)
-        # Loop through all chats and print their ID and title
+        # Loop through the matching chats and print their ID and title
+        listed = 0
         for chat in chats:
-            chat_id = chat.get('id', 'N/A')
-            chat_title = chat.get('title', 'Untitled')
-            print(f"{chat_id}: {chat_title}")
+            scraped = f"  (scraped {chat['last_scraped']})" if chat.get('last_scraped') else ""
+            print(f"{chat['id']}: {chat['title']}{scraped}")
+            listed += 1
         print("-" * 50)
-        print(f"[SUCCESS] Listed {len(chats)} total chats.")
-
-    except FileNotFoundError:
-        print(f"[FATAL ERROR] The source file was not found: '{JSON_SOURCE_FILE}'")
-    except json.JSONDecodeError:
-        print(f"[FATAL ERROR] The file '{JSON_SOURCE_FILE}' is not a valid JSON file.")
+        print(f"[SUCCESS] Listed {listed} of {catalog.count()} total chats.")
+    finally:
+        catalog.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,194 @@
+#
+# FILENAME: pacing.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.1 (Adaptive Waits and Rate Control)
+#
+# DESCRIPTION:
+# Replaces the engine's fixed sleeps with waits that end as soon as
+# the page is ready: a MutationObserver inside the page signals when
+# the selector has appeared and when rendering has gone quiet. A
+# shared Pacer only slows the run down (exponential back-off with
+# jitter) after it sees throttling or failed loads, and it records how
+# long every chat spent idle so the run's wait time can be exported.
+# The current chat is tracked per worker thread or asyncio task.
+#
+
+import os
+import csv
+import time
+import random
+import threading
+import contextvars
+
+## ------------------- CONFIGURATION ------------------- ##
+DEFAULT_SELECTOR_TIMEOUT_SECONDS = 20
+DEFAULT_QUIET_MS = 500
+DEFAULT_QUIET_TIMEOUT_SECONDS = 10
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 300
+BACKOFF_JITTER = 0.5
+WAIT_REPORT_FILE = "wait_times.csv"
+## ----------------------------------------------------- ##
+
+# Resolves once `selector` matches (immediately if it already does).
+WAIT_FOR_SELECTOR_SCRIPT = """
+const [selector, timeoutMs, done] = arguments;
+const started = performance.now();
+if (document.querySelector(selector)) { done({found: true, waitedMs: 0}); return; }
+const observer = new MutationObserver(() => {
+    if (document.querySelector(selector)) {
+        observer.disconnect(); clearTimeout(timer);
+        done({found: true, waitedMs: performance.now() - started});
+    }
+});
+const timer = setTimeout(() => { observer.disconnect(); done({found: false, waitedMs: performance.now() - started}); }, timeoutMs);
+observer.observe(document, {childList: true, subtree: true});
+"""
+
+# Resolves once the DOM has had no mutations for `quietMs`, or at the timeout.
+WAIT_FOR_QUIET_SCRIPT = """
+const [quietMs, timeoutMs, done] = arguments;
+const started = performance.now();
+let mutations = 0, quietTimer = null;
+const finish = (quiet) => {
+    observer.disconnect(); clearTimeout(quietTimer); clearTimeout(hardTimer);
+    done({quiet: quiet, waitedMs: performance.now() - started, mutations: mutations});
+};
+const observer = new MutationObserver((records) => {
+    mutations += records.length;
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(() => finish(true), quietMs);
+});
+observer.observe(document, {childList: true, subtree: true, characterData: true});
+quietTimer = setTimeout(() => finish(true), quietMs);
+const hardTimer = setTimeout(() => finish(false), timeoutMs);
+"""
+
+# Returns a short reason if the page looks throttled or failed to load. The
+# page text is only searched when `checkText` is set (after the expected
+# content failed to appear): a loaded page's text includes the conversation
+# and the sidebar titles, which may well mention "rate limit" themselves.
+DETECT_THROTTLING_SCRIPT = """
+const [checkText] = arguments;
+if (location.href.includes('/sorry/')) return 'redirected to the rate-limit page';
+if (!checkText || !document.body) return null;
+const match = document.body.innerText.slice(0, 3000).match(/unusual traffic|too many requests|rate limit|try again later|something went wrong/i);
+return match ? match[0] : null;
+"""
+
+def _run_async(driver, script, timeout_seconds, *args):
+    # The script timeout has to outlive the in-page timer.
+    driver.set_script_timeout(timeout_seconds + 5)
+    return driver.execute_async_script(script, *args)
+
+def wait_for_selector(driver, selector, timeout_seconds=DEFAULT_SELECTOR_TIMEOUT_SECONDS):
+    """Waits for `selector` to appear. Returns the seconds waited; raises TimeoutError."""
+    result = _run_async(driver, WAIT_FOR_SELECTOR_SCRIPT, timeout_seconds, selector, int(timeout_seconds * 1000))
+    if not result or not result.get('found'):
+        raise TimeoutError(f"'{selector}' did not appear within {timeout_seconds}s.")
+    return result['waitedMs'] / 1000
+
+def wait_for_dom_quiet(driver, quiet_ms=DEFAULT_QUIET_MS, timeout_seconds=DEFAULT_QUIET_TIMEOUT_SECONDS):
+    """Waits until rendering has stopped. Returns (quiet, seconds waited)."""
+    result = _run_async(driver, WAIT_FOR_QUIET_SCRIPT, timeout_seconds, quiet_ms, int(timeout_seconds * 1000)) or {}
+    return bool(result.get('quiet')), result.get('waitedMs', 0) / 1000
+
+def detect_throttling(driver, check_text=False):
+    """Returns a reason string if the current page looks throttled, else None."""
+    return driver.execute_script(DETECT_THROTTLING_SCRIPT, check_text)
+
+def wait_for_page(driver, selector, timeout_seconds=DEFAULT_SELECTOR_TIMEOUT_SECONDS):
+    """wait_for_selector that raises ThrottledError instead of TimeoutError when the page shows an error."""
+    try:
+        return wait_for_selector(driver, selector, timeout_seconds)
+    except TimeoutError:
+        reason = detect_throttling(driver, check_text=True)
+        if reason: raise ThrottledError(f"page looks throttled ({reason})")
+        raise
+
+class ThrottledError(Exception):
+    """Raised when a chat page shows signs of rate limiting."""
+
+class Pacer:
+    """Shared back-off state plus per-chat idle-time accounting (thread-safe)."""
+
+    def __init__(self, base_seconds=BACKOFF_BASE_SECONDS, max_seconds=BACKOFF_MAX_SECONDS, jitter=BACKOFF_JITTER):
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self.jitter = jitter
+        self.failures = 0
+        self.lock = threading.Lock()
+        self.records = {}
+        self.current = contextvars.ContextVar('pacer_chat', default=None) # (chat_id, started), per thread or asyncio task
+
+    # --- back-off ---
+    def backoff_seconds(self):
+        """Current back-off delay: 0 until something fails, then doubling with jitter."""
+        with self.lock:
+            if not self.failures: return 0.0
+            delay = min(self.max_seconds, self.base_seconds * 2 ** (self.failures - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def wait_backoff(self):
+        """Sleeps for the current back-off (if any) and records it against the chat."""
+        delay = self.backoff_seconds()
+        if delay:
+            print(f"[INFO] Backing off for {delay:.1f}s after {self.failures} failed load(s)...")
+            time.sleep(delay)
+            self.add_wait('backoff', delay)
+        return delay
+
+    def on_failure(self, reason):
+        with self.lock:
+            self.failures += 1
+        print(f"[WARNING] Slowing down: {reason}.")
+
+    def on_success(self):
+        with self.lock:
+            self.failures = max(0, self.failures - 1)
+
+    # --- accounting ---
+    def _record(self, chat_id):
+        with self.lock:
+            return self.records.setdefault(chat_id, {'chat_id': chat_id, 'total_seconds': 0.0, 'waits': {}})
+
+    def start_chat(self, chat_id):
+        """Makes `chat_id` the current chat for this thread's (or task's) add_wait() calls."""
+        self.current.set((chat_id, time.monotonic()))
+        self._record(chat_id)
+
+    def add_wait(self, kind, seconds, chat_id=None):
+        """Adds idle time of a given kind (rate_limit, selector, render, history, backoff...)."""
+        current = self.current.get()
+        chat_id = chat_id if chat_id is not None else (current[0] if current else None)
+        if chat_id is None: return
+        record = self._record(chat_id)
+        with self.lock:
+            record['waits'][kind] = record['waits'].get(kind, 0.0) + seconds
+
+    def finish_chat(self):
+        """Closes the current chat's record with its total wall time."""
+        current = self.current.get()
+        if current is None: return
+        chat_id, started = current
+        record = self._record(chat_id)
+        with self.lock:
+            record['total_seconds'] += time.monotonic() - started
+        self.current.set(None)
+
+    def write_report(self, output_dir):
+        """Writes per-chat wait times to output_dir/wait_times.csv and prints the idle share."""
+        kinds = sorted({kind for record in self.records.values() for kind in record['waits']})
+        path = os.path.join(output_dir, WAIT_REPORT_FILE)
+        total_idle = total_time = 0.0
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['chat_id', 'total_seconds', 'idle_seconds'] + [f"{kind}_seconds" for kind in kinds])
+            for record in self.records.values():
+                idle = sum(record['waits'].values())
+                total_idle += idle
+                total_time += record['total_seconds'] + record['waits'].get('rate_limit', 0.0)
+                writer.writerow([record['chat_id'], f"{record['total_seconds']:.2f}", f"{idle:.2f}"] + [f"{record['waits'].get(kind, 0.0):.2f}" for kind in kinds])
+        share = total_idle * 100 / total_time if total_time else 0.0
+        print(f"[INFO] Idle time: {total_idle:.1f}s of {total_time:.1f}s ({share:.0f}%). Per-chat waits saved to '{path}'.")
+        return path
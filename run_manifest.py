@@ -0,0 +1,156 @@
+#
+# FILENAME: run_manifest.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.2 (Content-Addressed Manifest)
+#
+# DESCRIPTION:
+# A persistent manifest, keyed by chat URL, recording the content
+# hash, turn count and last-scraped time of every saved transcript.
+# The engine uses it to resume interrupted runs, to skip chats whose
+# turn count has not changed, and to hard-link identical transcripts
+# between output_vNN folders instead of keeping new copies. Each entry
+# also keeps the hashes of the transcript's last turns for delta scrapes.
+#
+# USAGE:
+#   python run_manifest.py dedupe    (hard-link duplicates across output_v*)
+#
+
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+
+## ------------------- CONFIGURATION ------------------- ##
+MANIFEST_FILE = "scrape_manifest.json"
+OUTPUT_DIR_PATTERN = re.compile(r'^output_v(\d+)$')
+## ----------------------------------------------------- ##
+
+def content_hash(data):
+    """Returns the SHA-256 hex digest of a bytes value."""
+    return hashlib.sha256(data).hexdigest()
+
+def file_hash(path):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_json_atomic(path, data):
+    """Writes JSON through a temporary file so a crash never leaves it half-written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def link_or_copy(source, destination):
+    """Hard-links `source` to `destination`, falling back to a copy. Returns True if linked."""
+    if os.path.abspath(source) == os.path.abspath(destination):
+        return True
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+        return True
+    except OSError:
+        shutil.copy2(source, destination)
+        return False
+
+class RunManifest:
+    """Thread-safe, on-disk record of every chat's last saved transcript."""
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.chats = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.chats = json.load(f).get('chats', {})
+            except (json.JSONDecodeError, AttributeError) as e:
+                print(f"[WARNING] Ignoring unreadable manifest '{path}': {e}")
+
+    def get(self, chat_url):
+        """Returns a copy of the manifest entry for a chat, or None."""
+        with self.lock:
+            entry = self.chats.get(chat_url)
+            return dict(entry) if entry else None
+
+    def record(self, chat_url, **fields):
+        """Updates a chat's entry and saves the manifest immediately."""
+        with self.lock:
+            entry = self.chats.setdefault(chat_url, {})
+            entry.update(fields)
+            entry['last_scraped'] = datetime.now().isoformat(timespec='seconds')
+            write_json_atomic(self.path, {'chats': self.chats})
+
+    def completed_in_version(self, chat_url, version):
+        """True if the chat was already saved by this run version and the file is intact."""
+        entry = self.get(chat_url)
+        if not entry or str(entry.get('version')) != str(version): return False
+        path = entry.get('file')
+        return bool(path) and os.path.exists(path) and file_hash(path) == entry.get('content_hash')
+
+    def previous_file(self, chat_url):
+        """Returns (path, hash) of the chat's last saved transcript if it still exists."""
+        entry = self.get(chat_url)
+        if not entry: return None, None
+        path = entry.get('file')
+        if path and os.path.exists(path):
+            return path, entry.get('content_hash')
+        return None, None
+
+def finalize_transcript(manifest, chat, version, writer, message_count):
+    """Commits a streamed transcript, hard-linking an identical earlier one instead.
+
+    Returns 'linked' or 'written'.
+    """
+    chat_url = chat.get('url', 'URL_MISSING')
+    new_hash = writer.content_hash()
+    previous_path, previous_hash = manifest.previous_file(chat_url)
+    outcome = 'written'
+    if previous_path and previous_hash == new_hash and os.path.abspath(previous_path) != os.path.abspath(writer.filename):
+        writer.discard()
+        if link_or_copy(previous_path, writer.filename): outcome = 'linked'
+    else:
+        # A rename replaces the directory entry, so a hard link shared with an
+        # older run is never overwritten in place.
+        writer.commit()
+    manifest.record(
+        chat_url, id=chat.get('id'), title=chat.get('title'), version=str(version), file=writer.filename,
+        content_hash=new_hash, turn_count=writer.turn_count, message_count=message_count,
+        tail_hashes=list(writer.tail_hashes)
+    )
+    return outcome
+
+def dedupe_output_dirs(root='.'):
+    """Hard-links byte-identical transcripts across every output_vNN folder."""
+    seen, linked, saved = {}, 0, 0
+    dirs = sorted((d for d in os.listdir(root) if OUTPUT_DIR_PATTERN.match(d)), key=lambda d: int(OUTPUT_DIR_PATTERN.match(d).group(1)))
+    for directory in dirs:
+        for name in sorted(os.listdir(os.path.join(root, directory))):
+            path = os.path.join(root, directory, name)
+            if not os.path.isfile(path) or not name.endswith('.txt'): continue
+            digest = file_hash(path)
+            original = seen.setdefault(digest, path)
+            if original == path or os.path.samefile(original, path): continue
+            size = os.path.getsize(path)
+            if link_or_copy(original, path):
+                linked += 1; saved += size
+    print(f"[SUCCESS] Hard-linked {linked} duplicate transcripts across {len(dirs)} output folders ({saved / 1024:.1f} KB saved).")
+    return linked
+
+def main():
+    """Command-line entry point for manifest maintenance."""
+    if len(sys.argv) > 1 and sys.argv[1] == "dedupe":
+        dedupe_output_dirs()
+    else:
+        print("Usage: python run_manifest.py dedupe")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#
+# FILENAME: run_metrics.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.2 (Per-Phase Run Metrics)
+#
+# DESCRIPTION:
+# Times every phase of every chat, counts the WebDriver commands and
+# bytes written per chat, and saves the totals to run_metrics.json and
+# run_metrics.csv. The live totals can also be served in the Prometheus
+# text format. The current chat is kept in a context variable, so it is
+# tracked separately per worker thread and per asyncio task.
+#
+
+import os
+import csv
+import json
+import time
+import threading
+import contextvars
+from datetime import datetime
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+## ------------------- CONFIGURATION ------------------- ##
+METRICS_JSON_FILE = "run_metrics.json"
+METRICS_CSV_FILE = "run_metrics.csv"
+PHASES = ["launch", "navigate", "wait_selector", "history", "extraction", "write"]
+## ----------------------------------------------------- ##
+
+RUN_KEY = "run" # record for time that belongs to no chat (e.g. browser launch)
+
+def _new_record(chat_id):
+    return {
+        'chat_id': chat_id, 'status': 'running', 'total_seconds': 0.0,
+        'phases': {}, 'commands': {}, 'command_seconds': 0.0, 'bytes_written': 0,
+        'batch_seconds': []
+    }
+
+class RunMetrics:
+    """Thread-safe per-chat phase timers and counters for one run."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.lock = threading.Lock()
+        self.records = {RUN_KEY: dict(_new_record(RUN_KEY), status='')}
+        self.current = contextvars.ContextVar('run_metrics_chat', default=None) # (chat_id, started)
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.started = time.monotonic()
+
+    def _current(self):
+        current = self.current.get()
+        key = RUN_KEY if current is None else current[0]
+        with self.lock:
+            return self.records.setdefault(key, _new_record(key))
+
+    # --- chat lifecycle ---
+    def start_chat(self, chat_id):
+        """Makes `chat_id` the current chat for this thread (or asyncio task)."""
+        self.current.set((chat_id, time.monotonic()))
+        record = self._current()
+        with self.lock:
+            record['status'] = 'running'
+
+    def fail_chat(self):
+        record = self._current()
+        with self.lock:
+            record['status'] = 'failed'
+
+    def finish_chat(self):
+        """Closes the current chat's record with its wall time."""
+        current = self.current.get()
+        if current is None: return
+        record = self._current()
+        with self.lock:
+            record['total_seconds'] += time.monotonic() - current[1]
+            if record['status'] == 'running': record['status'] = 'ok'
+        self.current.set(None)
+
+    # --- measurements ---
+    def add_phase(self, phase, seconds):
+        record = self._current()
+        with self.lock:
+            record['phases'][phase] = record['phases'].get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """Times the enclosed block as phase `name` of the current chat."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+
+    def timed_iter(self, iterable, name):
+        """Yields from `iterable`, booking only the time spent producing items to `name`."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_phase(name, time.perf_counter() - started)
+                return
+            self.add_phase(name, time.perf_counter() - started)
+            yield item
+
+    def add_bytes(self, count):
+        record = self._current()
+        with self.lock:
+            record['bytes_written'] += count
+
+    def add_batch(self, seconds):
+        """Records the latency of one windowed extraction batch."""
+        record = self._current()
+        with self.lock:
+            record['batch_seconds'].append(seconds)
+
+    def count_command(self, command, seconds):
+        record = self._current()
+        with self.lock:
+            record['commands'][command] = record['commands'].get(command, 0) + 1
+            record['command_seconds'] += seconds
+
+    def instrument_driver(self, driver):
+        """Counts and times every WebDriver command this driver sends."""
+        execute = driver.execute
+        def counted_execute(driver_command, params=None):
+            started = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.count_command(driver_command, time.perf_counter() - started)
+        driver.execute = counted_execute
+        return driver
+
+    # --- reporting ---
+    def totals(self):
+        """Run-wide sums over every record."""
+        with self.lock:
+            records = [dict(record, phases=dict(record['phases']), commands=dict(record['commands']),
+                            batch_seconds=list(record['batch_seconds'])) for record in self.records.values()]
+        phases, commands = {}, {}
+        for record in records:
+            for phase, seconds in record['phases'].items(): phases[phase] = phases.get(phase, 0.0) + seconds
+            for command, count in record['commands'].items(): commands[command] = commands.get(command, 0) + count
+        chats = [record for record in records if record['chat_id'] != RUN_KEY]
+        return {
+            'wall_seconds': time.monotonic() - self.started,
+            'chats_ok': sum(1 for record in chats if record['status'] == 'ok'),
+            'chats_failed': sum(1 for record in chats if record['status'] == 'failed'),
+            'phase_seconds': phases,
+            'webdriver_commands': sum(commands.values()),
+            'webdriver_command_counts': commands,
+            'webdriver_seconds': sum(record['command_seconds'] for record in records),
+            'bytes_written': sum(record['bytes_written'] for record in records),
+            'extraction_batches': sum(len(record['batch_seconds']) for record in records),
+        }, records
+
+    def write_report(self, output_dir):
+        """Writes run_metrics.json and run_metrics.csv and prints where the time went."""
+        totals, records = self.totals()
+        json_path = os.path.join(output_dir, METRICS_JSON_FILE)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.version, 'started_at': self.started_at,
+                'finished_at': datetime.now().isoformat(timespec='seconds'),
+                'totals': totals, 'chats': records
+            }, f, indent=2)
+
+        csv_path = os.path.join(output_dir, METRICS_CSV_FILE)
+        phases = PHASES + sorted({phase for record in records for phase in record['phases']} - set(PHASES))
+        with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['chat_id', 'status', 'total_seconds'] + [f"{phase}_seconds" for phase in phases]
+                            + ['webdriver_commands', 'webdriver_seconds', 'bytes_written', 'batches', 'batch_mean_ms', 'batch_max_ms'])
+            for record in records:
+                batches = record['batch_seconds']
+                writer.writerow([record['chat_id'], record['status'], f"{record['total_seconds']:.3f}"]
+                                + [f"{record['phases'].get(phase, 0.0):.3f}" for phase in phases]
+                                + [sum(record['commands'].values()), f"{record['command_seconds']:.3f}", record['bytes_written']]
+                                + [len(batches), f"{sum(batches) * 1000 / len(batches):.1f}" if batches else "",
+                                   f"{max(batches) * 1000:.1f}" if batches else ""])
+
+        busy = sum(totals['phase_seconds'].values())
+        print(f"[INFO] Run metrics: {totals['chats_ok']} ok, {totals['chats_failed']} failed, "
+              f"{totals['webdriver_commands']} WebDriver commands ({totals['webdriver_seconds']:.1f}s), "
+              f"{totals['bytes_written'] / 2**20:.1f} MB written.")
+        for phase in phases:
+            seconds = totals['phase_seconds'].get(phase, 0.0)
+            if seconds: print(f"    {phase:<14}{seconds:>10.1f}s  ({seconds * 100 / busy:.0f}%)")
+        print(f"[INFO] Run metrics saved to '{json_path}' and '{csv_path}'.")
+        return json_path
+
+    def prometheus_text(self):
+        """The live totals in the Prometheus text exposition format."""
+        totals, _ = self.totals()
+        lines = [
+            "# TYPE scraper_chats_total counter",
+            f'scraper_chats_total{{status="ok"}} {totals["chats_ok"]}',
+            f'scraper_chats_total{{status="failed"}} {totals["chats_failed"]}',
+            "# TYPE scraper_phase_seconds_total counter",
+        ]
+        lines += [f'scraper_phase_seconds_total{{phase="{phase}"}} {seconds:.3f}' for phase, seconds in sorted(totals['phase_seconds'].items())]
+        lines.append("# TYPE scraper_webdriver_commands_total counter")
+        lines += [f'scraper_webdriver_commands_total{{command="{command}"}} {count}' for command, count in sorted(totals['webdriver_command_counts'].items())]
+        lines += [
+            "# TYPE scraper_webdriver_seconds_total counter",
+            f"scraper_webdriver_seconds_total {totals['webdriver_seconds']:.3f}",
+            "# TYPE scraper_bytes_written_total counter",
+            f"scraper_bytes_written_total {totals['bytes_written']}",
+            "# TYPE scraper_extraction_batches_total counter",
+            f"scraper_extraction_batches_total {totals['extraction_batches']}",
+            "# TYPE scraper_run_seconds gauge",
+            f"scraper_run_seconds {totals['wall_seconds']:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+def start_metrics_server(metrics, port):
+    """Serves metrics.prometheus_text() at /metrics on a daemon thread. Returns the server."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404); return
+            data = metrics.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass # scrapes every few seconds would flood the run's output
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[INFO] Serving live metrics at http://127.0.0.1:{server.server_address[1]}/metrics")
+    return server
@@ -1,23 +1,34 @@
 #
 # FILENAME: scraper_engine.py
 # AUTHOR:   Simon & Dora
-# VERSION:  6.0 (Module - Handles Extra Tabs)
+# VERSION:  9.4 (Module)
 #
 # DESCRIPTION:
-# The definitive core scraping engine. Now includes a step to
-# automatically close extra tabs opened by extensions on startup.
+# The core scraping engine. Opens each chat, loads its full history,
+# extracts the turns with in-page scripts and streams them to the
+# run's output folder. Chats are taken from a persistent job queue and
+# spread over one or more browser workers; the run's config is checked
+# against config_schema.py before anything starts.
 #
 
-import time
 import os
 import re
 import json
-import sys
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import time
+import sqlite3
+import threading
+from scraper_scheduler import ChatScheduler
+from job_queue import JobQueue, DEFAULT_MAX_ATTEMPTS, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS
+from run_manifest import RunManifest, finalize_transcript, link_or_copy
+from transcript_writer import TranscriptWriter
+from chat_catalog import ChatCatalog
+from config_schema import check_config
+from structured_output import JsonlCorpusWriter, export_parquet, CORPUS_FILE, PARQUET_FILE, DEFAULT_OUTPUT_FORMATS
+from history_loader import load_history_or_prompt
+from run_metrics import RunMetrics, start_metrics_server
+from search_index import SearchIndex
+from delta_scrape import delta_scrape_chat, write_delta_report
+from pacing import Pacer, ThrottledError, wait_for_page, wait_for_dom_quiet, detect_throttling, DEFAULT_SELECTOR_TIMEOUT_SECONDS
 
 ## ------------------- STATIC CONFIGURATION ------------------- ##
 #
@@ -25,66 +36,332 @@ FIREFOX_PROFILE_PATH = r"C:\Users\SimonC\AppData\Roaming\Mozilla\Firefox\Profile
 MASTER_CHAT_LIST_FILE = "chats.json"
 
 # Selectors confirmed for Firefox
+SCROLLABLE_ELEMENT_SELECTOR = ".chat-container"
 MESSAGE_CONTAINER_SELECTOR = "user-query, model-response"
 PROMPT_SELECTOR = ".query-text-line"
 RESPONSE_SELECTOR = ".model-response-text"
+
+# Default extraction mode: "script" (one execute_script call),
+# "elements" (the original per-element find_elements loop) or
+# "snapshot" (dump the page source and parse the saved file) or
+# "windowed" (script calls over WINDOW_SIZE containers at a time).
+DEFAULT_EXTRACTION_MODE = "script"
+DEFAULT_WINDOW_SIZE = 200
+SNAPSHOT_DIR_NAME = "snapshots"
+SNAPSHOT_META_PREFIX = "SCRAPER-META "
 ## ----------------------------------------------------------- ##
 
+# Runs inside the page and returns every turn in one round-trip. The text
+# normalisation mirrors WebDriver's element-text rules (zero-width spaces
+# dropped, each line trimmed, non-breaking spaces turned into spaces) so the
+# saved transcript is identical to the one built from `element.text`.
+# Optional start/end arguments limit it to a range of message containers;
+# every turn carries its container index. With `detach` set, the containers
+# that were read are removed from the page afterwards.
+EXTRACT_CONVERSATION_SCRIPT = """
+const [containerSel, promptSel, responseSel, start, end, detach] = arguments;
+function visibleText(el) {
+    const raw = (el.innerText || el.textContent || '').replace(/\\u200b/g, '');
+    const lines = raw.split('\\n').map(l => l.replace(/^[^\\S\\xa0]+|[^\\S\\xa0]+$/g, ''));
+    return lines.join('\\n').replace(/^[^\\S\\xa0]+|[^\\S\\xa0]+$/g, '').replace(/\\xa0/g, ' ');
+}
+const containers = document.querySelectorAll(containerSel);
+const first = start == null ? 0 : Math.max(0, start);
+const last = end == null ? containers.length : Math.min(end, containers.length);
+const turns = [];
+for (let index = first; index < last; index++) {
+    const container = containers[index];
+    const tag = container.tagName.toLowerCase();
+    if (tag === 'user-query') {
+        const lines = Array.from(container.querySelectorAll(promptSel)).map(visibleText);
+        turns.push({role: 'prompt', text: lines.filter(t => t.trim()).join('\\n'), lines: lines.length, index: index});
+    } else if (tag === 'model-response') {
+        const response = container.querySelector(responseSel);
+        turns.push({role: 'response', text: response ? visibleText(response) : null, index: index});
+    }
+}
+if (detach) {
+    for (let index = first; index < last; index++) containers[index].remove();
+}
+return turns;
+"""
+
+COUNT_MESSAGES_SCRIPT = "return document.querySelectorAll(arguments[0]).length;"
+
+# Serialises the manual scroll prompt when several workers share the terminal.
+PROMPT_LOCK = threading.Lock()
+# Returned by prepare_run when every selected chat is already saved, so
+# callers can tell "nothing left to do" apart from "could not start" (None).
+NOTHING_TO_DO = "nothing to do"
+
 def sanitize_filename(name):
     """Removes characters that are invalid for Windows filenames."""
     return re.sub(r'[\\/*?:"<>|]', "", name).strip()
 
-def clean_text(text):
-    """Strips leading/trailing whitespace and collapses multiple newlines."""
-    if not text: return ""
-    stripped_text = text.strip()
-    return re.sub(r'\n{3,}', '\n\n', stripped_text)
-
-def parse_id_string(id_string, max_id):
-    """Parses a string like '1, 5, 10-15' into a list of integers."""
-    ids = set()
-    parts = id_string.split(',')
-    for part in parts:
-        part = part.strip();
-        if not part: continue
-        if '-' in part:
+def extract_turns_with_elements(driver):
+    """Original extraction loop: several WebDriver round-trips per message. Yields turns."""
+    from selenium.webdriver.common.by import By
+    message_containers = driver.find_elements(By.CSS_SELECTOR, MESSAGE_CONTAINER_SELECTOR)
+    for container in message_containers:
+        if container.tag_name == 'user-query':
+            prompt_lines = container.find_elements(By.CSS_SELECTOR, PROMPT_SELECTOR)
+            prompt_text = "\n".join([line.text for line in prompt_lines if line.text.strip()])
+            yield {'role': 'prompt', 'text': prompt_text}
+        elif container.tag_name == 'model-response':
             try:
-                start, end = map(int, part.split('-'))
-                if start > end: start, end = end, start
-                for i in range(start, end + 1):
-                    if 1 <= i <= max_id: ids.add(i)
-            except ValueError: print(f"[WARNING] Invalid range '{part}' ignored.")
+                response = container.find_element(By.CSS_SELECTOR, RESPONSE_SELECTOR)
+                response_text = response.text
+            except: continue
+            yield {'role': 'response', 'text': response_text}
+
+def estimate_element_round_trips(raw_turns):
+    """Estimates how many WebDriver calls the element loop would have made."""
+    calls = 1 # find_elements for the containers
+    for turn in raw_turns:
+        calls += 2 # tag_name + find_elements/find_element
+        if turn['role'] == 'prompt':
+            calls += 2 * turn.get('lines', 0) # .text is read twice per prompt line
+        elif turn.get('text') is not None:
+            calls += 1 # .text of the response element
+    return calls
+
+def extract_turns_with_script(driver):
+    """Extracts the whole conversation with a single execute_script call."""
+    raw_turns = driver.execute_script(EXTRACT_CONVERSATION_SCRIPT, MESSAGE_CONTAINER_SELECTOR, PROMPT_SELECTOR, RESPONSE_SELECTOR)
+    if not isinstance(raw_turns, list):
+        raise ValueError("Extraction script did not return a list of turns.")
+    saved = estimate_element_round_trips(raw_turns) - 1
+    print(f"[INFO] Extracted {len(raw_turns)} messages in 1 script call (~{saved} WebDriver round-trips saved).")
+    return [{'role': t['role'], 'text': t['text']} for t in raw_turns if t.get('text') is not None]
+
+def extract_turns_windowed(driver, window_size=DEFAULT_WINDOW_SIZE, detach=False, on_batch=None):
+    """Extracts the conversation `window_size` containers per script call and yields each batch's turns as it arrives.
+
+    With `detach`, every batch is removed from the DOM once it is read, so
+    the next batch always starts at container 0 and the page shrinks as the
+    transcript grows. `on_batch(seconds)` is called with each batch's latency.
+    """
+    start = batches = messages = 0
+    latencies = []
+    while True:
+        started = time.perf_counter()
+        raw_turns = driver.execute_script(EXTRACT_CONVERSATION_SCRIPT, MESSAGE_CONTAINER_SELECTOR, PROMPT_SELECTOR,
+                                          RESPONSE_SELECTOR, start, start + window_size, detach)
+        seconds = time.perf_counter() - started
+        if not isinstance(raw_turns, list):
+            raise ValueError("Extraction script did not return a list of turns.")
+        if not raw_turns: break
+        batches += 1; messages += len(raw_turns); latencies.append(seconds)
+        if on_batch: on_batch(seconds)
+        for turn in raw_turns:
+            if turn.get('text') is not None: yield {'role': turn['role'], 'text': turn['text']}
+        if len(raw_turns) < window_size: break
+        if not detach: start += window_size
+    if batches:
+        print(f"[INFO] Extracted {messages} messages in {batches} batches of up to {window_size} "
+              f"(mean {sum(latencies) * 1000 / batches:.0f} ms, slowest {max(latencies) * 1000:.0f} ms per batch).")
+
+def extract_turns(driver, mode=DEFAULT_EXTRACTION_MODE, window_size=DEFAULT_WINDOW_SIZE, detach=False, on_batch=None):
+    """Yields the conversation as {role, text} turns."""
+    if mode == "windowed":
+        yield from extract_turns_windowed(driver, window_size, detach, on_batch)
+        return
+    if mode == "script":
+        try:
+            turns = extract_turns_with_script(driver)
+        except Exception as e:
+            print(f"[WARNING] Script extraction failed ({e}). Falling back to element extraction.")
         else:
-            try:
-                num = int(part)
-                if 1 <= num <= max_id: ids.add(num)
-            except ValueError: print(f"[WARNING] Invalid number '{part}' ignored.")
-    return sorted(list(ids))
-
-def visual_countdown(seconds):
-    """Displays a simple countdown timer in the terminal."""
-    for i in range(seconds, 0, -1):
-        print(f"[INFO] Waiting for {i} second(s)...", end='\r'); sys.stdout.flush()
-        time.sleep(1)
-    print(" " * 40, end='\r')
-
-def close_extra_tabs(driver):
-    """Closes all browser tabs except the first one."""
-    if len(driver.window_handles) > 1:
-        print(f"[INFO] Found {len(driver.window_handles)} open tabs. Closing extras...")
-        # Switch to the first tab
-        original_tab = driver.window_handles[0]
-        # Close all other tabs
-        for handle in driver.window_handles[1:]:
-            driver.switch_to.window(handle)
-            driver.close()
-        # Switch back to the original tab
-        driver.switch_to.window(original_tab)
-        print("[INFO] Extra tabs closed.")
-    return
-
-def run_scraper(version):
-    """Executes the scraping process for a given version."""
+            yield from turns
+            return
+    yield from extract_turns_with_elements(driver)
+
+def count_messages(driver):
+    """Counts the message containers currently in the DOM with one script call."""
+    return driver.execute_script(COUNT_MESSAGES_SCRIPT, MESSAGE_CONTAINER_SELECTOR)
+
+def save_page_snapshot(driver, path, chat_id, chat_url, chat_title):
+    """Dumps the live page source, tagged with the chat's metadata, for offline parsing."""
+    meta = json.dumps({'id': chat_id, 'url': chat_url, 'title': chat_title}, ensure_ascii=False)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"<!-- {SNAPSHOT_META_PREFIX}{meta.replace('--', '- -')} -->\n")
+        f.write(driver.page_source)
+    return path
+
+def launch_browser(settings):
+    """Attaches to a warm pooled browser if one is free, otherwise launches Firefox."""
+    from browser_pool import acquire_driver
+    metrics = settings['metrics']
+    with metrics.phase('launch'):
+        driver = acquire_driver(
+            FIREFOX_PROFILE_PATH,
+            headless=settings.get('headless', False),
+            trimmed=settings.get('trimmed_profile', False),
+            use_pool=settings.get('use_browser_pool', True)
+        )
+    return metrics.instrument_driver(driver)
+
+def driver_alive(driver):
+    """True if the browser still answers (a failed chat), False if it has crashed or hung up."""
+    try:
+        driver.current_window_handle
+        return True
+    except Exception:
+        return False
+
+def quit_driver(driver):
+    """Shuts a browser down, ignoring errors from an already-dead session."""
+    try:
+        driver.quit()
+    except Exception as e:
+        print(f"[WARNING] Could not quit the browser cleanly: {e}")
+
+def prompt_manual_scroll(driver, chat_id, chat_title):
+    """Fallback: asks the user to scroll to the top of the conversation by hand."""
+    # Only one worker at a time can own the terminal prompt.
+    with PROMPT_LOCK:
+        print(f"\n[ACTION REQUIRED] Manually scroll to the TOP of chat #{chat_id} ('{chat_title}').")
+        input(">>> Once at the top, press Enter here to continue scraping...")
+    wait_for_dom_quiet(driver)
+
+def transcript_path(chat, settings):
+    """The chat's transcript path in the run's output folder (same in every engine)."""
+    sanitized_title = sanitize_filename(chat.get('title', 'Untitled'))[:150]
+    return os.path.join(settings['output_dir'], f"{chat.get('id', 'N/A'):03d}_{sanitized_title}.txt")
+
+def index_transcript(filename, settings):
+    """Adds a saved transcript to the search index; unchanged transcripts are not re-read."""
+    if not settings.get('search_index'): return
+    with settings['metrics'].phase('index'):
+        try: settings['search_index'].index_file(filename, settings['version'])
+        except (OSError, sqlite3.Error) as e: print(f"[WARNING] Could not add '{filename}' to the search index: {e}")
+
+def save_transcript(chat, filename, get_turns, message_count, settings):
+    """Saves a chat's turns, or links the previous transcript if the chat is unchanged.
+
+    `get_turns()` is only called when the chat has to be written; it
+    returns an iterable of {role, text} turns that is streamed to the
+    transcript (and the corpus) one turn at a time.
+    """
+    chat_id, chat_url = chat.get('id', 'N/A'), chat.get('url', 'URL_MISSING')
+    manifest, corpus, metrics = settings['manifest'], settings['corpus'], settings['metrics']
+    previous = manifest.get(chat_url)
+    previous_path, _ = manifest.previous_file(chat_url)
+    if settings['skip_unchanged'] and previous_path and previous.get('message_count') == message_count:
+        with metrics.phase('write'):
+            linked = link_or_copy(previous_path, filename)
+            manifest.record(chat_url, version=str(settings['version']), file=filename)
+        print(f"[INFO] Unchanged since last scrape ({message_count} messages). {'Hard-linked' if linked else 'Copied'} '{previous_path}'.")
+        if corpus:
+            with metrics.phase('write'):
+                corpus.write_transcript(chat, filename); corpus.flush()
+        index_transcript(filename, settings)
+        settings['catalog'].mark_scraped(chat_id)
+        return 'linked'
+
+    # The corpus rows only reach corpus.jsonl once the transcript is committed,
+    # so a failed (and retried) attempt leaves no orphan or duplicate rows.
+    buffer = corpus.chat_buffer(chat) if corpus else None
+    try:
+        with TranscriptWriter(filename) as writer:
+            writer.write_header(chat_id, chat_url, chat.get('title', 'Untitled'))
+            for turn_index, turn in enumerate(metrics.timed_iter(get_turns(), 'extraction')):
+                with metrics.phase('write'):
+                    writer.write_turn(turn['role'], turn['text'])
+                    if buffer: buffer.write_turn(turn_index, turn['role'], turn['text'])
+        with metrics.phase('write'):
+            outcome = finalize_transcript(manifest, chat, settings['version'], writer, message_count)
+            if buffer: buffer.commit()
+    except BaseException:
+        if buffer: buffer.discard()
+        raise
+    metrics.add_bytes(writer.bytes_written)
+    print(f"[SUCCESS] Saved {writer.turn_count} turns to '{filename}' ({outcome}).")
+    index_transcript(filename, settings)
+    settings['catalog'].mark_scraped(chat_id)
+    return outcome
+
+def scrape_chat(driver, chat, settings):
+    """Scrapes one chat into settings['output_dir']. Raises on failure so the chat can be retried."""
+    from selenium.common.exceptions import WebDriverException
+    from browser_pool import close_late_tabs
+    chat_id, chat_title, chat_url = chat.get('id', 'N/A'), chat.get('title', 'Untitled'), chat.get('url', 'URL_MISSING')
+    extraction_mode = settings['extraction_mode']
+    pacer = settings['pacer']
+    metrics = settings['metrics']
+
+    print(f"\n{'='*20} Processing Chat #{chat_id} ({threading.current_thread().name}) {'='*20}")
+    print(f"TITLE: {chat_title}")
+
+    pacer.start_chat(chat_id)
+    metrics.start_chat(chat_id)
+    try:
+        pacer.wait_backoff()
+        with metrics.phase('navigate'):
+            close_late_tabs(driver)
+            driver.get(chat_url)
+        reason = detect_throttling(driver)
+        if reason:
+            raise ThrottledError(f"page looks throttled ({reason})")
+        with metrics.phase('wait_selector'):
+            pacer.add_wait('selector', wait_for_page(driver, MESSAGE_CONTAINER_SELECTOR, settings['selector_timeout_seconds']))
+        filename = transcript_path(chat, settings)
+
+        # The newest messages are rendered without scrolling, so a delta needs no history load.
+        if settings['delta_mode'] != "off" and delta_scrape_chat(driver, chat, filename, settings):
+            pacer.on_success()
+            return True
+
+        with metrics.phase('history'):
+            pacer.add_wait('history', load_history_or_prompt(
+                driver, MESSAGE_CONTAINER_SELECTOR, SCROLLABLE_ELEMENT_SELECTOR, settings,
+                manual_prompt=lambda: prompt_manual_scroll(driver, chat_id, chat_title)
+            ))
+
+        print("[INFO] Beginning scrape...")
+
+        if settings['save_snapshots']:
+            snapshot = os.path.join(settings['snapshot_dir'], os.path.basename(filename)[:-len(".txt")] + ".html")
+            with metrics.phase('write'):
+                save_page_snapshot(driver, snapshot, chat_id, chat_url, chat_title)
+            metrics.add_bytes(os.path.getsize(snapshot))
+            print(f"[SUCCESS] Saved page snapshot to '{snapshot}'")
+
+        with metrics.phase('extraction'):
+            message_count = count_messages(driver)
+        if extraction_mode == "snapshot":
+            # Parsed from the saved page, then committed like any other transcript
+            # (manifest, corpus, search index and catalog).
+            from snapshot_parser import iter_snapshot_turns
+            get_turns = lambda: iter_snapshot_turns(snapshot)
+        else:
+            # The generator is consumed lazily, so each turn is written as soon as it is extracted.
+            get_turns = lambda: extract_turns(
+                driver, extraction_mode, settings['window_size'], settings['detach_processed'], metrics.add_batch
+            )
+        save_transcript(chat, filename, get_turns, message_count, settings)
+        pacer.on_success()
+        return True
+
+    except (ThrottledError, TimeoutError, WebDriverException):
+        pacer.on_failure(f"chat #{chat_id} failed to load")
+        metrics.fail_chat()
+        raise
+    except Exception:
+        metrics.fail_chat()
+        raise
+    finally:
+        pacer.finish_chat()
+        metrics.finish_chat()
+
+def prepare_run(version, workers=None, config=None):
+    """Loads input_vNN/config.json (unless a `config` dict is given) and selects the chats still to scrape.
+
+    Returns (config, settings, chats), NOTHING_TO_DO if every selected chat
+    is already saved, or None if the run cannot start (unreadable input
+    files, config errors or an empty selection).
+    Shared by every engine so they read the same config the same way.
+    """
     INPUT_DIR = f"input_v{version}"
     OUTPUT_DIR = f"output_v{version}"
     CONFIG_FILE = os.path.join(INPUT_DIR, "config.json")
@@ -92,79 +369,141 @@ def run_scraper(version):
     print(f"[INFO] Scraper v{version} starting...")
 
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f: config = json.load(f)
-        all_chats = json.load(open(MASTER_CHAT_LIST_FILE, 'r', encoding='utf-8'))
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"[FATAL ERROR] Could not load input files. Error: {e}"); return
+        if config is None:
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f: config = json.load(f)
+        else:
+            CONFIG_FILE = "run config"
+        catalog = ChatCatalog(source_json=MASTER_CHAT_LIST_FILE)
+    except (FileNotFoundError, json.JSONDecodeError, sqlite3.Error) as e:
+        print(f"[FATAL ERROR] Could not load input files. Error: {e}"); return None
+    if not check_config(config, CONFIG_FILE):
+        print("[FATAL ERROR] Fix the config errors above and run again."); return None
         
-    target_ids = parse_id_string(config.get("chat_ids_to_scrape", ""), len(all_chats))
-    delay_seconds = config.get("delay_seconds", 5)
-    
+    target_ids = catalog.select_ids(config.get("chat_ids_to_scrape", ""))
+    extraction_mode = config.get("extraction_mode", DEFAULT_EXTRACTION_MODE)
+    output_formats = config.get("output_formats", DEFAULT_OUTPUT_FORMATS)
+    settings = {
+        'output_dir': OUTPUT_DIR,
+        'catalog': catalog,
+        'corpus': None,
+        'output_formats': output_formats,
+        'workers': workers or config.get("workers", 1),
+        'delay_seconds': config.get("delay_seconds", 5),
+        'extraction_mode': extraction_mode,
+        'window_size': config.get("window_size", DEFAULT_WINDOW_SIZE),
+        'detach_processed': config.get("detach_processed", False),
+        'save_snapshots': config.get("save_snapshots", False) or extraction_mode == "snapshot",
+        'snapshot_dir': os.path.join(OUTPUT_DIR, SNAPSHOT_DIR_NAME),
+        'version': version,
+        'manifest': RunManifest(),
+        'skip_unchanged': config.get("skip_unchanged", True),
+        'delta_mode': config.get("delta_mode", "off"),
+        'delta_report': [],
+        'update_search_index': config.get("update_search_index", True),
+        'search_index': None,
+        'selector_timeout_seconds': config.get("selector_timeout_seconds", DEFAULT_SELECTOR_TIMEOUT_SECONDS),
+        'pacer': Pacer(
+            base_seconds=config.get("backoff_base_seconds", 5),
+            max_seconds=config.get("backoff_max_seconds", 300)
+        ),
+        'metrics': RunMetrics(version),
+    }
+    for key in ("history_load", "history_timeout_seconds", "history_stall_rounds", "history_poll_seconds",
+                "headless", "trimmed_profile", "use_browser_pool", "metrics_port", "archive_after_run"):
+        if key in config: settings[key] = config[key]
+
     if not target_ids:
-        print("[ERROR] No valid chat IDs specified in config.json. Exiting."); return
+        print("[ERROR] No valid chat IDs selected by 'chat_ids_to_scrape'. Exiting."); return None
+
+    chats_to_process = catalog.get_chats_by_ids(target_ids)
+    # Resume: chats this version already saved (e.g. before a crash) are not redone.
+    remaining = [chat for chat in chats_to_process if not settings['manifest'].completed_in_version(chat.get('url'), version)]
+    if len(remaining) < len(chats_to_process):
+        print(f"[INFO] Resuming v{version}: {len(chats_to_process) - len(remaining)} chats already saved, {len(remaining)} to go.")
+    if not remaining:
+        print("[SUCCESS] Every selected chat is already saved for this version."); return NOTHING_TO_DO
+    return config, settings, remaining
+
+def open_run_outputs(settings):
+    """Creates the output folders, corpus writer and search index. Returns the live metrics server, if any."""
+    os.makedirs(settings['output_dir'], exist_ok=True)
+    if settings['save_snapshots']: os.makedirs(settings['snapshot_dir'], exist_ok=True)
+    output_formats = settings['output_formats']
+    if "jsonl" in output_formats or "parquet" in output_formats:
+        settings['corpus'] = JsonlCorpusWriter(os.path.join(settings['output_dir'], CORPUS_FILE))
+    if settings['update_search_index']:
+        try: settings['search_index'] = SearchIndex()
+        except sqlite3.Error as e: print(f"[WARNING] Search index disabled (SQLite needs FTS5): {e}")
+    if settings.get('metrics_port'):
+        try: return start_metrics_server(settings['metrics'], settings['metrics_port'])
+        except OSError as e: print(f"[WARNING] Live metrics endpoint disabled: {e}")
+    return None
+
+def close_run_outputs(settings, metrics_server=None):
+    """Closes the corpus and search index, runs the optional exports and stops the metrics server."""
+    OUTPUT_DIR = settings['output_dir']
+    if settings['corpus']:
+        settings['corpus'].close()
+        print(f"[INFO] Appended {settings['corpus'].records_written} turn records to '{settings['corpus'].path}'.")
+        if "parquet" in settings['output_formats']:
+            export_parquet(settings['corpus'].path, os.path.join(OUTPUT_DIR, PARQUET_FILE))
+    if settings['delta_report']:
+        write_delta_report(OUTPUT_DIR, settings['delta_report'])
+    if settings['search_index']:
+        # Picks up transcripts written outside save_transcript (e.g. by the snapshot_parser command).
+        if os.path.isdir(OUTPUT_DIR): settings['search_index'].update_directory(OUTPUT_DIR, settings['version'])
+        settings['search_index'].close()
+    if settings.get('archive_after_run') and os.path.isdir(OUTPUT_DIR):
+        from archive_store import ArchiveStore
+        ArchiveStore().add_version(settings['version'], OUTPUT_DIR)
+    if metrics_server: metrics_server.shutdown()
+    print("\n--- Scraping complete. ---")
+
+def run_scraper(version, workers=None, config=None):
+    """Executes the scraping process for a given version.
 
-    chats_to_process = [chat for chat in all_chats if chat.get('id') in target_ids]
-    print(f"\n[INFO] Preparing to scrape {len(chats_to_process)} chats with a {delay_seconds}-second delay.")
+    Returns True if every selected chat is saved (including when they all
+    were already), False if some were not, or None if the run could not start.
+    """
+    prepared = prepare_run(version, workers, config)
+    if prepared is None: return None
+    if prepared == NOTHING_TO_DO: return True
+    config, settings, chats_to_process = prepared
+    workers, delay_seconds = settings['workers'], settings['delay_seconds']
+    print(f"\n[INFO] Preparing to scrape {len(chats_to_process)} chats with {workers} worker(s), at most one chat start every {delay_seconds} second(s).")
 
-    driver = None
+    metrics_server, jobs, saved_all = None, None, False
     try:
-        print("[INFO] Launching Firefox with your profile...")
-        options = Options()
-        options.profile = FIREFOX_PROFILE_PATH
-        driver = webdriver.Firefox(options=options)
-        print("[SUCCESS] Firefox launched successfully.")
-        
-        # --- NEW: Handle extra tabs opened by extensions ---
-        time.sleep(5) # Give extensions a moment to open their tabs
-        close_extra_tabs(driver)
-        # ---
-        
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        metrics_server = open_run_outputs(settings)
+        jobs = JobQueue(
+            version,
+            max_attempts=config.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+            retry_base_seconds=config.get("retry_base_seconds", RETRY_BASE_SECONDS),
+            retry_max_seconds=config.get("retry_max_seconds", RETRY_MAX_SECONDS)
+        )
+        jobs.enqueue(chats_to_process)
 
-        for chat in chats_to_process:
-            chat_id, chat_title, chat_url = chat.get('id', 'N/A'), chat.get('title', 'Untitled'), chat.get('url', 'URL_MISSING')
-            
-            print(f"\n{'='*20} Processing Chat #{chat_id} {'='*20}")
-            print(f"TITLE: {chat_title}")
-            
-            try:
-                driver.get(chat_url)
-                WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CSS_SELECTOR, MESSAGE_CONTAINER_SELECTOR)))
-                
-                print("\n[ACTION REQUIRED] Manually scroll to the TOP of the conversation.")
-                input(">>> Once at the top, press Enter here to continue scraping...")
-                time.sleep(2)
-                
-                print("[INFO] Beginning scrape...")
-                sanitized_title = sanitize_filename(chat_title)[:150]
-                filename = os.path.join(OUTPUT_DIR, f"{chat_id:03d}_{sanitized_title}.txt")
-                
-                full_conversation = f"ID: {chat_id}\nURL: {chat_url}\nTITLE: {chat_title}\n\n---\n\n"
-                
-                message_containers = driver.find_elements(By.CSS_SELECTOR, MESSAGE_CONTAINER_SELECTOR)
-                for container in message_containers:
-                    if container.tag_name == 'user-query':
-                        prompt_lines = container.find_elements(By.CSS_SELECTOR, PROMPT_SELECTOR)
-                        prompt_text = "\n".join([line.text for line in prompt_lines if line.text.strip()])
-                        full_conversation += f"## PROMPT ##\n\n{clean_text(prompt_text)}\n\n---\n\n"
-                    elif container.tag_name == 'model-response':
-                        try:
-                            response = container.find_element(By.CSS_SELECTOR, RESPONSE_SELECTOR)
-                            full_conversation += f"## RESPONSE ##\n\n{clean_text(response.text)}\n\n---\n\n"
-                        except: pass
-
-                with open(filename, 'w', encoding='utf-8') as f: f.write(full_conversation)
-                print(f"[SUCCESS] Saved conversation to '{filename}'")
-
-            except Exception as e:
-                print(f"\n[ERROR] Failed to scrape chat #{chat_id}. Error: {e}")
-            
-            visual_countdown(delay_seconds)
+        scheduler = ChatScheduler(
+            jobs,
+            scrape_chat=lambda driver, chat: scrape_chat(driver, chat, settings),
+            launch_driver=lambda: launch_browser(settings),
+            quit_driver=quit_driver,
+            driver_alive=driver_alive,
+            workers=workers,
+            delay_seconds=delay_seconds,
+            on_wait=lambda chat, seconds: settings['pacer'].add_wait('rate_limit', seconds, chat.get('id'))
+        )
+        scheduler.run()
+        settings['pacer'].write_report(settings['output_dir'])
+        settings['metrics'].write_report(settings['output_dir'])
             
     except Exception as e:
         print(f"\n[FATAL ERROR] An unexpected error occurred: {e}")
     
     finally:
-        if driver:
-            driver.quit()
-        print("\n--- Scraping complete. ---")
\ No newline at end of file
+        if jobs:
+            saved_all = not jobs.unfinished()
+            jobs.write_failure_report(settings['output_dir'])
+            jobs.close()
+        close_run_outputs(settings, metrics_server)
+    return saved_all
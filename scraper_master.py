@@ -1,27 +1,84 @@
 #
 # FILENAME: scraper_master.py
 # AUTHOR:   Simon & Dora
-# VERSION:  2.0 (Master)
+# VERSION:  2.7 (Master)
 #
 # DESCRIPTION:
 # The main entry point for the scraper application. It determines
 # whether to run the setup wizard or the scraper engine based on
-# command-line arguments.
+# command-line arguments, and routes the sub-commands to their modules.
+#
+# USAGE:
+#   python scraper_master.py                   (setup wizard)
+#   python scraper_master.py 38                (run v38)
+#   python scraper_master.py 38 --workers 4    (run v38 with 4 browsers)
+#   python scraper_master.py 38 --engine async (run v38 in concurrent tabs over WebDriver BiDi)
+#   python scraper_master.py run [39] --chats "1-50" --workers 4 --headless [--dry-run]
+#   python scraper_master.py pool start --size 4 --headless
+#   python scraper_master.py pool status|stop
+#   python scraper_master.py discover [--full] (refresh chats.json from the sidebar)
+#   python scraper_master.py archive add|materialize|verify|gc|status [38]
+#   python scraper_master.py search "query words" [--role response] [--version 38]
 #
 
 import sys
-from setup_wizard import run_setup_wizard
-from scraper_engine import run_scraper
+
+def parse_workers(args):
+    """Reads an optional '--workers N' from the remaining arguments."""
+    if "--workers" not in args:
+        return None
+    index = args.index("--workers")
+    if index + 1 < len(args) and args[index + 1].isdigit() and int(args[index + 1]) > 0:
+        return int(args[index + 1])
+    raise ValueError("--workers needs a positive whole number.")
+
+def parse_engine(args):
+    """Reads an optional '--engine selenium|async' from the remaining arguments."""
+    if "--engine" not in args:
+        return "selenium"
+    index = args.index("--engine")
+    if index + 1 < len(args) and args[index + 1] in ("selenium", "async"):
+        return args[index + 1]
+    raise ValueError("--engine must be 'selenium' or 'async'.")
 
 def main():
     """Main entry point."""
     if len(sys.argv) > 1:
         version_arg = sys.argv[1]
-        if version_arg.isdigit():
-            run_scraper(version_arg)
+        if version_arg == "pool":
+            from browser_pool import pool_command
+            pool_command(sys.argv[2:])
+        elif version_arg == "archive":
+            from archive_store import archive_command
+            archive_command(sys.argv[2:])
+        elif version_arg == "search":
+            from search_index import search_command
+            search_command(sys.argv[2:])
+        elif version_arg == "run":
+            from batch_cli import run_command
+            sys.exit(run_command(sys.argv[2:]))
+        elif version_arg == "discover":
+            from chat_discovery import discover_command
+            discover_command(sys.argv[2:])
+        elif version_arg.isdigit():
+            try:
+                workers = parse_workers(sys.argv[2:])
+                engine = parse_engine(sys.argv[2:])
+            except ValueError as e:
+                print(f"[FATAL ERROR] {e}"); return
+            if engine == "async":
+                from async_engine import run_async_scraper
+                run_async_scraper(version_arg, workers)
+            else:
+                from scraper_engine import run_scraper
+                run_scraper(version_arg, workers)
         else:
             print(f"[FATAL ERROR] Argument '{version_arg}' is not a valid version number.")
+    elif not sys.stdin.isatty():
+        print("[FATAL ERROR] The setup wizard needs a terminal. For scheduled runs use: python scraper_master.py run --help")
+        sys.exit(2)
     else:
+        from setup_wizard import run_setup_wizard
         run_setup_wizard()
 
 if __name__ == "__main__":
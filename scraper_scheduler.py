@@ -0,0 +1,169 @@
+#
+# FILENAME: scraper_scheduler.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.2 (Concurrent Scheduler)
+#
+# DESCRIPTION:
+# Spreads the chats of a run over N worker threads, each driving its
+# own browser instance. The run's delay_seconds is enforced as one
+# global rate limit on chat starts (shared by all workers) instead of
+# a sleep after every chat, and a per-worker throughput summary is
+# printed at the end. Chats are taken from the persistent job queue
+# (job_queue.py): a failed chat goes back into the queue to be retried
+# later. If its browser has died, the worker starts a new one before
+# continuing.
+#
+
+import time
+import threading
+
+## ------------------- CONFIGURATION ------------------- ##
+LAUNCH_ATTEMPTS = 3          # browser (re)starts tried before a worker gives up
+LAUNCH_RETRY_SECONDS = 10
+## ----------------------------------------------------- ##
+
+class RateLimiter:
+    """Allows at most one chat start per `interval_seconds`, across all threads."""
+
+    def __init__(self, interval_seconds):
+        self.interval = max(0, interval_seconds)
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until the caller's slot comes up. Returns the seconds waited."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class WorkerStats:
+    """Throughput counters for one worker."""
+
+    def __init__(self, name):
+        self.name = name
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.relaunches = 0
+        self.busy_seconds = 0.0
+        self.waited_seconds = 0.0
+        self.started = time.monotonic()
+        self.finished = None
+
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def chats_per_minute(self):
+        elapsed = self.elapsed()
+        return (self.succeeded + self.failed) * 60 / elapsed if elapsed else 0.0
+
+class ChatScheduler:
+    """Runs `scrape_chat(driver, chat)` for every job in a JobQueue over a pool of browser workers.
+
+    `scrape_chat` returns normally on success and raises on failure.
+    `launch_driver()` creates a worker's browser, `quit_driver(driver)`
+    shuts it down, and `driver_alive(driver)` tells a failed chat from a
+    crashed browser. The optional `on_wait(chat, seconds)` is told how
+    long each chat waited for its rate-limit slot.
+    """
+
+    def __init__(self, jobs, scrape_chat, launch_driver, quit_driver, driver_alive=None, workers=1, delay_seconds=5, on_wait=None):
+        self.jobs = jobs
+        self.total = jobs.counts()['pending']
+        self.scrape_chat = scrape_chat
+        self.launch_driver = launch_driver
+        self.quit_driver = quit_driver
+        self.driver_alive = driver_alive or (lambda driver: True)
+        self.workers = max(1, min(workers, self.total or 1))
+        self.limiter = RateLimiter(delay_seconds)
+        self.on_wait = on_wait
+        self.stats = []
+
+    def _launch(self, stats):
+        """Starts a browser, retrying a few times. Raises the last error if none starts."""
+        for attempt in range(1, LAUNCH_ATTEMPTS + 1):
+            try:
+                return self.launch_driver()
+            except Exception as e:
+                if attempt == LAUNCH_ATTEMPTS: raise
+                print(f"[WARNING] {stats.name} could not start a browser ({e}). Retrying in {LAUNCH_RETRY_SECONDS}s...")
+                time.sleep(LAUNCH_RETRY_SECONDS)
+
+    def _worker(self, stats):
+        driver = None
+        try:
+            while True:
+                chat, wait = self.jobs.claim(stats.name)
+                if chat is None:
+                    if wait is None: break
+                    time.sleep(wait); continue
+                if driver is None:
+                    try:
+                        driver = self._launch(stats)
+                    except Exception:
+                        self.jobs.release(chat); raise
+                waited = self.limiter.acquire()
+                stats.waited_seconds += waited
+                if self.on_wait: self.on_wait(chat, waited)
+                started = time.monotonic()
+                try:
+                    self.scrape_chat(driver, chat)
+                    self.jobs.complete(chat)
+                    stats.succeeded += 1
+                except Exception as e:
+                    crashed = not self.driver_alive(driver)
+                    retry_in = self.jobs.fail(chat, f"browser crashed: {e}" if crashed else e)
+                    print(f"\n[ERROR] Failed to scrape chat #{chat.get('id', 'N/A')} ({stats.name}). Error: {e}")
+                    if retry_in is None:
+                        stats.failed += 1
+                        print(f"[ERROR] Chat #{chat.get('id', 'N/A')} failed {self.jobs.max_attempts} times; giving up on it.")
+                    else:
+                        stats.retried += 1
+                        print(f"[INFO] Chat #{chat.get('id', 'N/A')} re-queued; retrying in {retry_in:.0f}s.")
+                    if crashed:
+                        print(f"[WARNING] {stats.name}'s browser is not responding. Starting a new one.")
+                        self.quit_driver(driver)
+                        driver = None
+                        stats.relaunches += 1
+                stats.busy_seconds += time.monotonic() - started
+        except Exception as e:
+            print(f"\n[FATAL ERROR] {stats.name} stopped: {e}")
+        finally:
+            if driver:
+                self.quit_driver(driver)
+            stats.finished = time.monotonic()
+
+    def run(self):
+        """Processes every queued job and returns the list of WorkerStats."""
+        threads = []
+        for n in range(1, self.workers + 1):
+            stats = WorkerStats(f"worker-{n}")
+            self.stats.append(stats)
+            thread = threading.Thread(target=self._worker, args=(stats,), name=stats.name, daemon=True)
+            threads.append(thread)
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.print_summary()
+        return self.stats
+
+    def print_summary(self):
+        """Prints a per-worker throughput table."""
+        counts = self.jobs.counts()
+        print("\n" + "-" * 88)
+        print(f"{'WORKER':<10}{'DONE':>6}{'FAILED':>8}{'RETRIED':>9}{'RESTARTS':>10}{'BUSY(s)':>10}{'WAITED(s)':>11}{'ELAPSED(s)':>12}{'CHATS/MIN':>11}")
+        for s in self.stats:
+            print(f"{s.name:<10}{s.succeeded:>6}{s.failed:>8}{s.retried:>9}{s.relaunches:>10}{s.busy_seconds:>10.1f}{s.waited_seconds:>11.1f}{s.elapsed():>12.1f}{s.chats_per_minute():>11.2f}")
+        total = sum(s.succeeded for s in self.stats)
+        wall = max((s.elapsed() for s in self.stats), default=0)
+        rate = total * 60 / wall if wall else 0.0
+        print(f"[INFO] {total}/{self.total} chats saved in {wall:.1f}s ({rate:.2f} chats/min overall).")
+        unprocessed = counts['pending'] + counts['running']
+        if unprocessed:
+            print(f"[WARNING] {unprocessed} chats were not processed (all workers stopped).")
+        print("-" * 88)
@@ -1,11 +1,18 @@
 #
 # FILENAME: scraper_v34_final.py
 # AUTHOR:   Simon & Dora
-# VERSION:  34.0 (Definitive Hybrid Version with Bug Fix)
+# VERSION:  34.2 (Definitive Hybrid Version)
 #
 # DESCRIPTION:
 # The definitive scraper. This version restores a missing helper function
-# from v33 and represents the complete, working code.
+# from v33 and represents the complete, working code. History is now
+# loaded automatically, with the manual scroll prompt as a fallback.
+# The chat IDs and delay can be given as arguments instead of at the
+# prompts, so the script can run unattended.
+#
+# USAGE:
+#   python scraper_v34_final.py                          (asks for IDs and delay)
+#   python scraper_v34_final.py --chats "1-5, 8" --delay 3
 #
 
 import time
@@ -13,12 +20,16 @@ import os
 import re
 import json
 import sys
+import argparse
+import sqlite3
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from history_loader import load_history_or_prompt
+from chat_catalog import ChatCatalog
 
 ## ------------------- CONFIGURATION ------------------- ##
 #
@@ -34,6 +45,9 @@ RESPONSE_SELECTOR = ".model-response-text"
 # Versioned output directory
 OUTPUT_DIR = "output_v34"
 
+# History loading: "auto" scrolls to the top by itself, "manual" prompts.
+HISTORY_SETTINGS = {"history_load": "auto", "history_timeout_seconds": 120, "history_stall_rounds": 3}
+
 ## ----------------------------------------------------- ##
 
 def sanitize_filename(name):
@@ -46,29 +60,6 @@ def clean_text(text):
     stripped_text = text.strip()
     return re.sub(r'\n{3,}', '\n\n', stripped_text)
 
-def parse_id_string(id_string, max_id):
-    """Parses a string like '1, 5, 10-15' into a list of integers."""
-    ids = set()
-    parts = id_string.split(',')
-    for part in parts:
-        part = part.strip()
-        if not part: continue
-        if '-' in part:
-            try:
-                start, end = map(int, part.split('-'))
-                if start > end: start, end = end, start
-                for i in range(start, end + 1):
-                    if 1 <= i <= max_id:
-                        ids.add(i)
-            except ValueError: print(f"[WARNING] Invalid range '{part}' ignored.")
-        else:
-            try:
-                num = int(part)
-                if 1 <= num <= max_id:
-                    ids.add(num)
-            except ValueError: print(f"[WARNING] Invalid number '{part}' ignored.")
-    return sorted(list(ids))
-
 def visual_countdown(seconds):
     """Displays a simple countdown timer in the terminal."""
     for i in range(seconds, 0, -1):
@@ -76,40 +67,48 @@ def visual_countdown(seconds):
         time.sleep(1)
     print(" " * 40, end='\r')
     
-def parse_json_file(filename):
-    """Reads the list of chats from the specified JSON file."""
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        print(f"[INFO] Successfully loaded {len(data)} chats from '{filename}'.")
-        return data
-    except FileNotFoundError:
-        print(f"[FATAL ERROR] The source file '{filename}' was not found."); return []
-    except json.JSONDecodeError:
-        print(f"[FATAL ERROR] The file '{filename}' is not a valid JSON file."); return []
-
-def main():
-    """Main function to run the scraper."""
+def prompt_manual_scroll():
+    """Fallback: asks the user to scroll to the top of the conversation by hand."""
+    print("\n" + "="*50)
+    print("ACTION REQUIRED: Manually scroll to the TOP of the conversation")
+    print("                 in the Firefox window to load the full history.")
+    print("="*50 + "\n")
+    input(">>> Once at the top, press Enter here to continue scraping...")
+    time.sleep(2)
+
+def main(argv=None):
+    """Main function to run the scraper. Prompts for anything not given as an argument."""
+    parser = argparse.ArgumentParser(description="Scrape selected chats into output_v34.")
+    parser.add_argument("--chats", help="Chat IDs to scrape, e.g. '1-5, 8, 12', 'all' or 'unscraped'.")
+    parser.add_argument("--delay", help="Seconds to wait between chats (default 3).")
+    args = parser.parse_args(argv)
     print(f"[INFO] Final Scraper {__file__} starting...")
     
-    all_chats = parse_json_file(JSON_SOURCE_FILE)
-    if not all_chats: return
+    try:
+        catalog = ChatCatalog(source_json=JSON_SOURCE_FILE)
+    except (OSError, json.JSONDecodeError, sqlite3.Error) as e:
+        print(f"[FATAL ERROR] Could not load the chat catalog from '{JSON_SOURCE_FILE}'. Error: {e}"); return
+    chat_count = catalog.count()
+    if not chat_count:
+        print(f"[FATAL ERROR] No chats found in '{JSON_SOURCE_FILE}'."); return
+    print(f"[INFO] Successfully loaded {chat_count} chats from the catalog.")
 
     try:
-        id_str = input(f"> Which of the {len(all_chats)} chats would you like to scrape? (e.g., '1-5, 8, 12'): ")
+        id_str = args.chats if args.chats is not None else input(f"> Which of the {chat_count} chats would you like to scrape? (e.g., '1-5, 8, 12'): ")
         if not id_str:
             print("[INFO] No selection made. Exiting."); return
         
-        target_ids = parse_id_string(id_str, len(all_chats))
+        target_ids = catalog.select_ids(id_str)
         if not target_ids:
             print("[ERROR] No valid chat IDs selected. Exiting."); return
 
-        delay_str = input(f"> How many seconds to wait between chats? (e.g., 3): ")
+        delay_str = args.delay if args.delay is not None or args.chats is not None else input(f"> How many seconds to wait between chats? (e.g., 3): ")
         delay_seconds = int(delay_str) if delay_str else 3
     except ValueError:
         print("[FATAL ERROR] Invalid input. Please enter numbers only."); return
 
-    chats_to_process = [chat for chat in all_chats if chat.get('id') in target_ids]
+    chats_to_process = catalog.get_chats_by_ids(target_ids)
+    catalog.close()
     print(f"\n[INFO] Preparing to scrape {len(chats_to_process)} selected chats with a {delay_seconds}-second delay.")
 
     driver = None
@@ -134,12 +133,7 @@ def main():
                     EC.presence_of_element_located((By.CSS_SELECTOR, SCROLLABLE_ELEMENT_SELECTOR))
                 )
                 
-                print("\n" + "="*50)
-                print("ACTION REQUIRED: Manually scroll to the TOP of the conversation")
-                print("                 in the Firefox window to load the full history.")
-                print("="*50 + "\n")
-                input(">>> Once at the top, press Enter here to continue scraping...")
-                time.sleep(2)
+                load_history_or_prompt(driver, MESSAGE_CONTAINER_SELECTOR, SCROLLABLE_ELEMENT_SELECTOR, HISTORY_SETTINGS, prompt_manual_scroll)
                 
                 print("[INFO] Beginning scrape...")
                 
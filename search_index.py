@@ -0,0 +1,291 @@
+#
+# FILENAME: search_index.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.0 (Transcript Search Index)
+#
+# DESCRIPTION:
+# An SQLite FTS5 full-text index over every saved transcript, one row
+# per turn, ranked by bm25. Transcripts are indexed once per content
+# hash, so a chat unchanged between versions is not indexed twice.
+#
+# USAGE:
+#   python scraper_master.py search "query words" [--role prompt|response] [--version 38] [--limit 20]
+#   python scraper_master.py search --raw 'NEAR(selenium timeout, 5)'   (FTS5 query syntax)
+#   python scraper_master.py search --rebuild                           (re-index everything)
+#
+
+import io
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+
+from run_manifest import file_hash, OUTPUT_DIR_PATTERN
+from archive_store import ArchiveStore, ARCHIVE_DIR
+from transcript_writer import iter_transcript_turns
+
+## ------------------- CONFIGURATION ------------------- ##
+SEARCH_INDEX_FILE = "search_index.db"
+DEFAULT_LIMIT = 20
+SNIPPET_TOKENS = 16
+ARCHIVE_PATH_PREFIX = "archive:" # file key of a transcript indexed from the archive store
+## ----------------------------------------------------- ##
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    chat_id INTEGER,
+    url TEXT,
+    title TEXT,
+    first_row INTEGER,
+    turn_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    version TEXT,
+    transcript_id INTEGER NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_transcript ON files(transcript_id);
+CREATE INDEX IF NOT EXISTS files_version ON files(version);
+CREATE VIRTUAL TABLE IF NOT EXISTS turns USING fts5(
+    text, role UNINDEXED, transcript_id UNINDEXED, turn_index UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+def fts_query(query):
+    """Turns plain words into an FTS5 query: every word must match (as a prefix)."""
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in query.split())
+
+class SearchIndex:
+    """Thread-safe wrapper around the SQLite FTS5 transcript index.
+
+    Raises sqlite3.OperationalError if SQLite was built without FTS5.
+    """
+
+    def __init__(self, path=SEARCH_INDEX_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # --- indexing ---
+    def _transcript_id(self, digest, source):
+        """The transcript row for a content hash, parsing and indexing `source` (a path or text stream) if it is new."""
+        row = self.db.execute("SELECT id FROM transcripts WHERE content_hash = ?", (digest,)).fetchone()
+        if row: return row[0], False
+        header = {}
+        first_row = (self.db.execute("SELECT MAX(rowid) FROM turns").fetchone()[0] or 0) + 1
+        cursor = self.db.execute("INSERT INTO transcripts(content_hash, first_row) VALUES (?, ?)", (digest, first_row))
+        transcript_id, turn_count = cursor.lastrowid, 0
+        for turn_index, (role, text) in enumerate(iter_transcript_turns(source, header)):
+            self.db.execute(
+                "INSERT INTO turns(rowid, text, role, transcript_id, turn_index) VALUES (?, ?, ?, ?, ?)",
+                (first_row + turn_index, text, role, transcript_id, turn_index)
+            )
+            turn_count += 1
+        chat_id = header.get('ID')
+        self.db.execute(
+            "UPDATE transcripts SET chat_id = ?, url = ?, title = ?, turn_count = ? WHERE id = ?",
+            (int(chat_id) if chat_id and chat_id.isdigit() else None, header.get('URL'), header.get('TITLE'), turn_count, transcript_id)
+        )
+        return transcript_id, True
+
+    def _drop_if_orphaned(self, transcript_id):
+        if self.db.execute("SELECT 1 FROM files WHERE transcript_id = ?", (transcript_id,)).fetchone(): return
+        row = self.db.execute("SELECT first_row, turn_count FROM transcripts WHERE id = ?", (transcript_id,)).fetchone()
+        if not row: return
+        self.db.execute("DELETE FROM turns WHERE rowid BETWEEN ? AND ?", (row[0], row[0] + row[1] - 1))
+        self.db.execute("DELETE FROM transcripts WHERE id = ?", (transcript_id,))
+
+    def _set_file(self, key, version, transcript_id, size, mtime_ns):
+        old = self.db.execute("SELECT transcript_id FROM files WHERE path = ?", (key,)).fetchone()
+        self.db.execute(
+            "INSERT OR REPLACE INTO files(path, version, transcript_id, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+            (key, str(version), transcript_id, size, mtime_ns)
+        )
+        if old and old[0] != transcript_id: self._drop_if_orphaned(old[0])
+
+    def index_file(self, path, version):
+        """Indexes one saved transcript unless it is unchanged. Returns True if new text was indexed."""
+        key = os.path.normpath(path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime_ns FROM files WHERE path = ?", (key,)).fetchone()
+            if row and (row[0], row[1]) == (stat.st_size, stat.st_mtime_ns): return False
+        digest = file_hash(path)
+        with self.lock, self.db:
+            transcript_id, new = self._transcript_id(digest, path)
+            self._set_file(key, version, transcript_id, stat.st_size, stat.st_mtime_ns)
+        return new
+
+    def remove_missing(self, keys, version):
+        """Forgets the version's indexed files that are not in `keys`."""
+        with self.lock, self.db:
+            rows = self.db.execute("SELECT path, transcript_id FROM files WHERE version = ?", (str(version),)).fetchall()
+            stale = [row for row in rows if row[0] not in keys]
+            for path, transcript_id in stale:
+                self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+                self._drop_if_orphaned(transcript_id)
+        return len(stale)
+
+    def update_directory(self, output_dir, version):
+        """Brings one output_vNN folder's transcripts up to date. Returns (indexed, removed)."""
+        keys, indexed = set(), 0
+        for name in sorted(os.listdir(output_dir)):
+            path = os.path.join(output_dir, name)
+            if not name.endswith(".txt") or not os.path.isfile(path): continue
+            keys.add(os.path.normpath(path))
+            try:
+                indexed += self.index_file(path, version)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"[WARNING] Could not index '{path}': {e}")
+        return indexed, self.remove_missing(keys, version)
+
+    def update_archived_version(self, store, version):
+        """Indexes a version that only exists in the archive store, from its blobs."""
+        keys, indexed = set(), 0
+        for relative, info in store.load_version(version)['files'].items():
+            if not relative.endswith(".txt") or '/' in relative: continue
+            key = f"{ARCHIVE_PATH_PREFIX}v{version}/{relative}"
+            keys.add(key)
+            with self.lock:
+                row = self.db.execute("SELECT 1 FROM files f JOIN transcripts t ON t.id = f.transcript_id "
+                                      "WHERE f.path = ? AND t.content_hash = ?", (key, info['hash'])).fetchone()
+            if row: continue
+            try:
+                # Streamed straight from the compressed blob; no decompressed copy is left behind.
+                with self.lock, self.db, io.TextIOWrapper(store.open_blob(info['hash']), encoding='utf-8') as text:
+                    transcript_id, new = self._transcript_id(info['hash'], text)
+                    self._set_file(key, version, transcript_id, info['size'], None)
+                indexed += new
+            except (OSError, RuntimeError, UnicodeDecodeError) as e:
+                print(f"[WARNING] Could not index archived v{version} '{relative}': {e}")
+        return indexed, self.remove_missing(keys, version)
+
+    def update_all(self, root='.'):
+        """Indexes every output_vNN folder, plus versions kept only in the archive store."""
+        started = time.monotonic()
+        indexed = removed = 0
+        versions = set()
+        for name in sorted(os.listdir(root)):
+            match = OUTPUT_DIR_PATTERN.match(name)
+            if not match or not os.path.isdir(os.path.join(root, name)): continue
+            versions.add(match.group(1))
+            added, gone = self.update_directory(os.path.join(root, name), match.group(1))
+            indexed += added; removed += gone
+        if os.path.isdir(os.path.join(root, ARCHIVE_DIR)):
+            store = ArchiveStore(os.path.join(root, ARCHIVE_DIR))
+            for version in store.versions():
+                if version in versions: continue
+                versions.add(version)
+                added, gone = self.update_archived_version(store, version)
+                indexed += added; removed += gone
+        # Versions whose folder and archive entry were both deleted.
+        with self.lock:
+            gone = [row[0] for row in self.db.execute("SELECT DISTINCT version FROM files") if row[0] not in versions]
+        for version in gone:
+            removed += self.remove_missing(set(), version)
+        if indexed or removed:
+            print(f"[INFO] Search index updated: {indexed} transcripts indexed, {removed} files dropped "
+                  f"in {time.monotonic() - started:.2f}s.")
+        return indexed, removed
+
+    def rebuild(self):
+        """Empties the index; the next update_all() re-indexes everything."""
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM files")
+            self.db.execute("DELETE FROM transcripts")
+            self.db.execute("DELETE FROM turns")
+
+    # --- queries ---
+    def search(self, query, role=None, version=None, limit=DEFAULT_LIMIT, raw=False):
+        """Ranked turn hits, best first, as dicts.
+
+        A turn that is identical in several versions of a chat is listed
+        once, with every version it appears in.
+        """
+        sql = (
+            "SELECT t.turn_index, t.role, bm25(turns) AS score, "
+            f"snippet(turns, 0, '[', ']', ' ... ', {SNIPPET_TOKENS}) AS snippet, "
+            "c.chat_id, c.url, c.title, "
+            "(SELECT group_concat(DISTINCT f.version) FROM files f WHERE f.transcript_id = c.id) AS versions "
+            "FROM turns t JOIN transcripts c ON c.id = t.transcript_id WHERE turns MATCH ?"
+        )
+        params = [query if raw else fts_query(query)]
+        if role:
+            sql += " AND t.role = ?"; params.append(role)
+        if version is not None:
+            sql += " AND t.transcript_id IN (SELECT transcript_id FROM files WHERE version = ?)"; params.append(str(version))
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit * 4)
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        hits = {}
+        for row in rows:
+            hit_key = (row['url'], row['turn_index'], row['snippet'])
+            versions = set((row['versions'] or "").split(','))
+            if hit_key in hits:
+                hits[hit_key]['versions'] |= versions; continue
+            if len(hits) < limit: hits[hit_key] = dict(row, versions=versions)
+        for hit in hits.values():
+            hit['versions'] = sorted((v for v in hit['versions'] if v), key=lambda v: int(v) if v.isdigit() else v)
+        return list(hits.values())
+
+    def stats(self):
+        with self.lock:
+            transcripts, turns = self.db.execute("SELECT COUNT(*), COALESCE(SUM(turn_count), 0) FROM transcripts").fetchone()
+            files, versions = self.db.execute("SELECT COUNT(*), COUNT(DISTINCT version) FROM files").fetchone()
+        return {'transcripts': transcripts, 'turns': turns, 'files': files, 'versions': versions}
+
+def search_command(argv):
+    """Handles 'scraper_master.py search <query> [options]'."""
+    parser = argparse.ArgumentParser(prog="scraper_master.py search", description="Full-text search over every scraped transcript.")
+    parser.add_argument("query", nargs="*", help="Words to find (all must match; prefixes allowed).")
+    parser.add_argument("--role", choices=["prompt", "response"], help="Only search prompts or responses.")
+    parser.add_argument("--version", help="Only search one run version (e.g. 38).")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help=f"Maximum hits (default {DEFAULT_LIMIT}).")
+    parser.add_argument("--raw", action="store_true", help="Pass the query to FTS5 unchanged (phrases, OR, NOT, NEAR).")
+    parser.add_argument("--no-update", action="store_true", help="Search the index as it is, without picking up new transcripts.")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index every transcript from scratch.")
+    args = parser.parse_args(argv)
+
+    try:
+        index = SearchIndex()
+    except sqlite3.OperationalError as e:
+        print(f"[FATAL ERROR] The search index needs SQLite with FTS5: {e}"); return
+    try:
+        if args.rebuild: index.rebuild()
+        if args.rebuild or not args.no_update: index.update_all()
+        if not args.query:
+            stats = index.stats()
+            print(f"[INFO] '{index.path}': {stats['transcripts']} transcripts ({stats['turns']} turns) "
+                  f"behind {stats['files']} files in {stats['versions']} versions.")
+            return
+        started = time.perf_counter()
+        try:
+            hits = index.search(" ".join(args.query), role=args.role, version=args.version, limit=args.limit, raw=args.raw)
+        except sqlite3.OperationalError as e:
+            print(f"[ERROR] Invalid search query: {e}"); return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for rank, hit in enumerate(hits, 1):
+            chat_id = f"#{hit['chat_id']:03d}" if hit['chat_id'] is not None else "#?"
+            versions = ",".join(f"v{v}" for v in hit['versions'])
+            print(f"\n{rank:>3}. {chat_id} {hit['title']}  [{hit['role']} {hit['turn_index']}, {versions}]  score {-hit['score']:.2f}")
+            print(f"     {' '.join(hit['snippet'].split())}")
+        print(f"\n[INFO] {len(hits)} hit(s) in {elapsed_ms:.1f} ms.")
+    finally:
+        index.close()
+
+if __name__ == "__main__":
+    search_command(sys.argv[1:])
@@ -1,12 +1,13 @@
 #
 # FILENAME: setup_wizard.py
 # AUTHOR:   Simon & Dora
-# VERSION:  3.0 (Module with Auto-Versioning)
+# VERSION:  3.1 (Module with Auto-Versioning)
 #
 # DESCRIPTION:
 # A dedicated module to handle the interactive setup of new,
 # versioned scraping runs. Automatically detects and suggests
-# the next version number.
+# the next version number. The folder, config and changelog
+# creation is shared with the non-interactive 'run' command.
 #
 
 import os
@@ -29,6 +30,26 @@ def get_latest_version_in_dir():
                     latest_version = version
     return latest_version
 
+def create_run_files(version, config_data, title):
+    """Creates input_vNN/ (with config.json) and output_vNN/, and logs the run in the changelog."""
+    input_dir = f"input_v{version}"
+    output_dir = f"output_v{version}"
+    config_file = os.path.join(input_dir, "config.json")
+
+    print(f"\n[INFO] Creating directory: {input_dir}")
+    os.makedirs(input_dir, exist_ok=True)
+    print(f"[INFO] Creating directory: {output_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config_data, f, indent=2)
+
+    print(f"[INFO] Updating '{CHANGELOG_FILE}'...")
+    with open(CHANGELOG_FILE, 'a', encoding='utf-8') as f:
+        f.write(f"\n\n## v{version}.0 - ({datetime.now().strftime('%Y-%m-%d')})\n")
+        f.write(f"- User Note: {title}\n")
+        f.write(f"- Executed hybrid Firefox scraper using this configuration.\n")
+    return config_file
+
 def run_setup_wizard():
     """Interactively sets up a new versioned run."""
     print("--- Scraper Setup Wizard ---")
@@ -49,7 +70,6 @@ def run_setup_wizard():
 
         input_dir = f"input_v{version}"
         output_dir = f"output_v{version}"
-        config_file = os.path.join(input_dir, "config.json")
 
         if os.path.exists(input_dir) or os.path.exists(output_dir):
             print(f"[FATAL ERROR] Run v{version} already exists. Please choose a new version number.")
@@ -60,29 +80,15 @@ def run_setup_wizard():
         user_input_title = input("> Press ENTER to accept, or type your own title: ").strip()
         final_title = user_input_title if user_input_title else suggested_title
 
-        print(f"\n[INFO] Creating directory: {input_dir}")
-        os.makedirs(input_dir, exist_ok=True)
-        print(f"[INFO] Creating directory: {output_dir}")
-        os.makedirs(output_dir, exist_ok=True)
-
         previous_config_file = os.path.join(f"input_v{version - 1}", "config.json")
         if os.path.exists(previous_config_file):
             print(f"[INFO] Copying configuration from previous version (v{version - 1})...")
             with open(previous_config_file, 'r', encoding='utf-8') as f_old:
                 config_data = json.load(f_old)
-            with open(config_file, 'w', encoding='utf-8') as f_new:
-                json.dump(config_data, f_new, indent=2)
         else:
             print(f"[INFO] No previous config found. Creating default config file...")
-            default_config = {"chat_ids_to_scrape": "1-10", "delay_seconds": 5}
-            with open(config_file, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=2)
-        
-        print(f"[INFO] Updating '{CHANGELOG_FILE}'...")
-        with open(CHANGELOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(f"\n\n## v{version}.0 - ({datetime.now().strftime('%Y-%m-%d')})\n")
-            f.write(f"- User Note: {final_title}\n")
-            f.write(f"- Executed hybrid Firefox scraper using this configuration.\n")
+            config_data = {"chat_ids_to_scrape": "1-10", "delay_seconds": 5}
+        config_file = create_run_files(version, config_data, final_title)
 
         print("\n" + "="*50)
         print(f"✅ Setup for run v{version} is complete.")
@@ -0,0 +1,319 @@
+#
+# FILENAME: snapshot_parser.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.1 (Offline Snapshot Parser)
+#
+# DESCRIPTION:
+# Parses saved page sources (such as debug_page_source.html or the
+# snapshots dumped by the engine) into the usual .txt transcripts,
+# without a browser. Files are streamed through an incremental event
+# parser, and a directory of snapshots is processed across a pool
+# of worker processes.
+#
+
+import os
+import re
+import sys
+import json
+import sqlite3
+import argparse
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from scraper_engine import (
+    MASTER_CHAT_LIST_FILE, MESSAGE_CONTAINER_SELECTOR, PROMPT_SELECTOR, RESPONSE_SELECTOR,
+    SNAPSHOT_META_PREFIX, sanitize_filename
+)
+from transcript_writer import TranscriptWriter
+from chat_catalog import ChatCatalog
+
+## ------------------- CONFIGURATION ------------------- ##
+CHUNK_SIZE = 64 * 1024
+SNAPSHOT_EXTENSIONS = (".html", ".htm")
+## ----------------------------------------------------- ##
+
+# Elements whose content is never rendered as text.
+HIDDEN_TAGS = {"script", "style", "noscript", "template", "head", "title", "svg"}
+# Elements that never have a closing tag.
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# Block-level elements: text inside them starts and ends on its own line.
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "figcaption", "figure",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav",
+    "ol", "pre", "section", "table", "tr", "ul", "code-block", "response-element"
+}
+# Elements that innerText surrounds with a blank line rather than a single break.
+PARAGRAPH_TAGS = {"p"}
+PREFORMATTED_TAGS = {"pre", "textarea"}
+
+def parse_simple_selector(selector):
+    """Splits a simple 'tag', '.class' or 'tag.class' selector into (tag, class)."""
+    match = re.fullmatch(r'\s*([\w-]*)(?:\.([\w-]+))?\s*', selector)
+    if not match:
+        raise ValueError(f"Unsupported selector '{selector}'.")
+    return (match.group(1) or None, match.group(2))
+
+def selector_matches(selector, tag, classes):
+    """Checks a parsed simple selector against an element."""
+    sel_tag, sel_class = selector
+    if sel_tag and sel_tag != tag: return False
+    if sel_class and sel_class not in classes: return False
+    return True
+
+class TextCollector:
+    """Builds text for one element following the innerText line-break rules."""
+
+    def __init__(self):
+        self.items = []
+
+    def add_text(self, text):
+        self.items.append(text)
+
+    def add_break(self, count):
+        self.items.append(count)
+
+    def text(self):
+        parts, pending = [], 0
+        for item in self.items:
+            if isinstance(item, int):
+                pending = max(pending, item)
+                continue
+            if not item: continue
+            if parts and pending: parts.append("\n" * pending)
+            elif parts and parts[-1].endswith(" ") and item.startswith(" "):
+                item = item[1:] # adjacent text nodes share one collapsed space
+            pending = 0
+            parts.append(item)
+        raw = "".join(parts).replace("\u200b", "")
+        # Same normalisation as WebDriver element text / the extraction script.
+        lines = [line.strip(" \t\r\f\v") for line in raw.split("\n")]
+        return "\n".join(lines).strip(" \t\n\r\f\v").replace("\xa0", " ")
+
+class SnapshotParser(HTMLParser):
+    """Event-driven parser that emits {role, text} turns as their containers close."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.container_tags = {parse_simple_selector(s)[0] for s in MESSAGE_CONTAINER_SELECTOR.split(',')}
+        self.prompt_selector = parse_simple_selector(PROMPT_SELECTOR)
+        self.response_selector = parse_simple_selector(RESPONSE_SELECTOR)
+        self.stack = []
+        self.hidden_depth = 0
+        self.pre_depth = 0
+        self.turn = None # {'role', 'depth', 'lines' or 'text'}
+        self.collector = None
+        self.collector_depth = None
+        self.ready = []
+        self.meta = None
+
+    # --- helpers ---
+    def _break_for(self, tag):
+        if tag in PARAGRAPH_TAGS: return 2
+        if tag in BLOCK_TAGS: return 1
+        return 0
+
+    def _finish_collector(self):
+        text = self.collector.text()
+        if self.turn['role'] == 'prompt':
+            self.turn['lines'].append(text)
+        elif self.turn.get('text') is None:
+            self.turn['text'] = text
+        self.collector = None
+        self.collector_depth = None
+
+    def _finish_turn(self):
+        if self.turn['role'] == 'prompt':
+            text = "\n".join(line for line in self.turn['lines'] if line.strip())
+            self.ready.append({'role': 'prompt', 'text': text})
+        elif self.turn.get('text') is not None:
+            self.ready.append({'role': 'response', 'text': self.turn['text']})
+        self.turn = None
+
+    # --- HTMLParser events ---
+    def handle_comment(self, data):
+        data = data.strip()
+        if self.meta is None and data.startswith(SNAPSHOT_META_PREFIX):
+            try:
+                self.meta = json.loads(data[len(SNAPSHOT_META_PREFIX):])
+            except json.JSONDecodeError:
+                pass
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "br" and self.collector and not self.hidden_depth:
+            self.collector.add_text("\n")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            self.handle_startendtag(tag, attrs)
+            return
+        self.stack.append(tag)
+        depth = len(self.stack)
+        if tag in HIDDEN_TAGS:
+            self.hidden_depth += 1
+        if tag in PREFORMATTED_TAGS:
+            self.pre_depth += 1
+        if self.hidden_depth: return
+
+        if self.turn is None and tag in self.container_tags:
+            role = 'prompt' if tag == 'user-query' else 'response'
+            self.turn = {'role': role, 'depth': depth, 'lines': [], 'text': None}
+            return
+        if self.turn is None: return
+
+        if self.collector is None:
+            classes = set((dict(attrs).get('class') or '').split())
+            selector = self.prompt_selector if self.turn['role'] == 'prompt' else self.response_selector
+            wanted = self.turn['role'] == 'prompt' or self.turn['text'] is None
+            if wanted and selector_matches(selector, tag, classes):
+                self.collector = TextCollector()
+                self.collector_depth = depth
+            return
+        self.collector.add_break(self._break_for(tag))
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS or tag not in self.stack: return
+        while self.stack:
+            open_tag = self.stack.pop()
+            depth = len(self.stack) + 1
+            if open_tag in HIDDEN_TAGS:
+                self.hidden_depth -= 1
+            if open_tag in PREFORMATTED_TAGS:
+                self.pre_depth -= 1
+            if self.collector is not None:
+                if depth == self.collector_depth:
+                    self._finish_collector()
+                else:
+                    self.collector.add_break(self._break_for(open_tag))
+            if self.turn is not None and depth == self.turn['depth']:
+                self._finish_turn()
+            if open_tag == tag: break
+
+    def handle_data(self, data):
+        if self.collector is None or self.hidden_depth: return
+        if not self.pre_depth:
+            data = re.sub(r'[ \t\n\r\f]+', ' ', data)
+        self.collector.add_text(data)
+
+    def pop_turns(self):
+        """Returns (and forgets) the turns completed since the last call."""
+        turns, self.ready = self.ready, []
+        return turns
+
+def iter_snapshot_turns(path, meta_out=None, chunk_size=CHUNK_SIZE):
+    """Streams a snapshot file through the parser, yielding turns as they complete.
+
+    If `meta_out` is a dict it is filled with the snapshot's embedded chat
+    metadata (id, url, title) once parsing has finished.
+    """
+    parser = SnapshotParser()
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk: break
+            parser.feed(chunk)
+            yield from parser.pop_turns()
+    parser.close()
+    yield from parser.pop_turns()
+    if meta_out is not None and parser.meta:
+        meta_out.update(parser.meta)
+
+def lookup_chat(chat_id):
+    """Finds a chat's catalog entry by ID, if the catalog is available."""
+    if not isinstance(chat_id, int): return {}
+    try:
+        catalog = ChatCatalog(source_json=MASTER_CHAT_LIST_FILE)
+        try:
+            found = catalog.get_chats_by_ids([chat_id])
+        finally:
+            catalog.close()
+    except (sqlite3.Error, json.JSONDecodeError, OSError):
+        return {}
+    return found[0] if found else {}
+
+def resolve_chat_metadata(path, meta):
+    """Works out the chat ID, URL and title for a snapshot file."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    meta = dict(meta or {})
+    if 'id' not in meta:
+        match = re.match(r'^(\d+)', stem)
+        if match: meta['id'] = int(match.group(1))
+    known = {} if meta.get('url') and meta.get('title') else lookup_chat(meta.get('id'))
+    return (
+        meta.get('id', 'N/A'),
+        meta.get('url') or known.get('url', 'URL_MISSING'),
+        meta.get('title') or known.get('title') or stem
+    )
+
+def transcript_filename(chat_id, chat_title, path):
+    """Uses the engine's NNN_title.txt naming when the chat ID is known."""
+    if isinstance(chat_id, int):
+        return f"{chat_id:03d}_{sanitize_filename(chat_title)[:150]}.txt"
+    return f"{os.path.splitext(os.path.basename(path))[0]}.txt"
+
+def parse_snapshot_to_transcript(path, output_dir):
+    """Parses one snapshot and writes its transcript. Returns (output path, turn count)."""
+    meta, writer = {}, None
+
+    def open_writer():
+        # The metadata comment sits at the top of the file, so it has been
+        # parsed by the time the first turn is yielded.
+        chat_id, chat_url, chat_title = resolve_chat_metadata(path, meta)
+        new_writer = TranscriptWriter(os.path.join(output_dir, transcript_filename(chat_id, chat_title, path))).open()
+        new_writer.write_header(chat_id, chat_url, chat_title)
+        return new_writer
+
+    try:
+        for turn in iter_snapshot_turns(path, meta):
+            if writer is None: writer = open_writer()
+            writer.write_turn(turn['role'], turn['text'])
+        if writer is None: writer = open_writer()
+    finally:
+        if writer: writer.close()
+    writer.commit()
+    return writer.filename, writer.turn_count
+
+def find_snapshots(snapshot_dir):
+    """Lists the snapshot files in a directory, in name order."""
+    return sorted(
+        os.path.join(snapshot_dir, name) for name in os.listdir(snapshot_dir)
+        if name.lower().endswith(SNAPSHOT_EXTENSIONS)
+    )
+
+def parse_snapshot_directory(snapshot_dir, output_dir, workers=None):
+    """Parses every snapshot in a directory across a process pool."""
+    snapshots = find_snapshots(snapshot_dir)
+    if not snapshots:
+        print(f"[WARNING] No snapshots found in '{snapshot_dir}'."); return []
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"[INFO] Parsing {len(snapshots)} snapshots from '{snapshot_dir}'...")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(parse_snapshot_to_transcript, path, output_dir): path for path in snapshots}
+        for future in as_completed(futures):
+            try:
+                filename, turn_count = future.result()
+                print(f"[SUCCESS] {turn_count} turns -> '{filename}'")
+                results.append((filename, turn_count))
+            except Exception as e:
+                print(f"[ERROR] Failed to parse '{futures[future]}'. Error: {e}")
+    return results
+
+def main():
+    """Command-line entry point: parse a snapshot file or directory."""
+    parser = argparse.ArgumentParser(description="Parse saved page sources into transcripts.")
+    parser.add_argument("source", help="A snapshot .html file or a directory of snapshots.")
+    parser.add_argument("output_dir", nargs="?", default="output_snapshots", help="Where to write the .txt transcripts.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of parser processes (default: CPU count).")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        parse_snapshot_directory(args.source, args.output_dir, args.workers)
+    elif os.path.isfile(args.source):
+        os.makedirs(args.output_dir, exist_ok=True)
+        filename, turn_count = parse_snapshot_to_transcript(args.source, args.output_dir)
+        print(f"[SUCCESS] {turn_count} turns -> '{filename}'")
+    else:
+        print(f"[FATAL ERROR] Snapshot source not found: '{args.source}'"); sys.exit(1)
+
+if __name__ == "__main__":
+    main()
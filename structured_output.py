@@ -0,0 +1,183 @@
+#
+# FILENAME: structured_output.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.0 (Structured Output Formats)
+#
+# DESCRIPTION:
+# Writes the scraped turns as structured data alongside the .txt
+# transcripts, so downstream tools no longer re-parse the PROMPT /
+# RESPONSE markers. Every run gets one append-only JSONL corpus
+# (one record per turn), written as turns are extracted. An optional
+# compact columnar (Parquet) export is streamed from that corpus in
+# row-group batches; it needs the optional 'pyarrow' package.
+#
+# A chat's records are held in a temporary file while it is scraped
+# and only appended once its transcript is committed, so a failed
+# attempt leaves nothing behind. A chat saved twice (for example by a
+# rerun of the same version) appears twice; readers, and the Parquet
+# export, keep the last record for each (chat_id, turn_index).
+#
+# USAGE:
+#   python structured_output.py jsonl output_v38      (rebuild corpus from .txt files)
+#   python structured_output.py parquet output_v38    (columnar export of the corpus)
+#
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+
+from transcript_writer import clean_text, iter_transcript_turns
+
+## ------------------- CONFIGURATION ------------------- ##
+CORPUS_FILE = "corpus.jsonl"
+PARQUET_FILE = "corpus.parquet"
+PARQUET_BATCH_ROWS = 10000
+DEFAULT_OUTPUT_FORMATS = ["txt", "jsonl"]
+SUPPORTED_OUTPUT_FORMATS = {"txt", "jsonl", "parquet"}
+## ----------------------------------------------------- ##
+
+CORPUS_FIELDS = ["chat_id", "url", "title", "turn_index", "role", "text", "char_count"]
+
+def make_record(chat, turn_index, role, text):
+    """Builds one corpus record; the text is cleaned exactly as in the .txt file."""
+    text = clean_text(text)
+    return {
+        'chat_id': chat.get('id'), 'url': chat.get('url'), 'title': chat.get('title'),
+        'turn_index': turn_index, 'role': role, 'text': text, 'char_count': len(text)
+    }
+
+class JsonlCorpusWriter:
+    """Thread-safe, append-only JSONL writer shared by all workers of a run."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+        self.records_written = 0
+
+    def write_turn(self, chat, turn_index, role, text):
+        line = json.dumps(make_record(chat, turn_index, role, text), ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.records_written += 1
+
+    def chat_buffer(self, chat):
+        """A buffer for one chat's records, appended to the corpus by its commit()."""
+        return CorpusChatBuffer(self, chat)
+
+    def write_transcript(self, chat, transcript_path):
+        """Appends every turn of an already-saved transcript (e.g. an unchanged, linked chat)."""
+        for turn_index, (role, text) in enumerate(iter_transcript_turns(transcript_path)):
+            self.write_turn(chat, turn_index, role, text)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class CorpusChatBuffer:
+    """One chat's corpus records, kept in a temporary file until the chat's transcript is committed."""
+
+    def __init__(self, corpus, chat):
+        self.corpus, self.chat = corpus, chat
+        handle, self.path = tempfile.mkstemp(prefix=".corpus-", suffix=".jsonl.part", dir=os.path.dirname(corpus.path) or ".")
+        self.file = os.fdopen(handle, 'w', encoding='utf-8')
+        self.records = 0
+
+    def write_turn(self, turn_index, role, text):
+        self.file.write(json.dumps(make_record(self.chat, turn_index, role, text), ensure_ascii=False) + "\n")
+        self.records += 1
+
+    def commit(self):
+        """Appends the buffered records to the corpus in one block."""
+        self.file.close()
+        with open(self.path, 'r', encoding='utf-8') as f, self.corpus.lock:
+            shutil.copyfileobj(f, self.corpus.file)
+            self.corpus.file.flush()
+            self.corpus.records_written += self.records
+        os.remove(self.path)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path): os.remove(self.path)
+
+def rebuild_corpus_from_transcripts(output_dir):
+    """Creates output_dir/corpus.jsonl from the .txt transcripts already in the folder."""
+    path = os.path.join(output_dir, CORPUS_FILE)
+    if os.path.exists(path): os.remove(path)
+    corpus = JsonlCorpusWriter(path)
+    try:
+        for name in sorted(os.listdir(output_dir)):
+            if not name.endswith(".txt"): continue
+            header = {}
+            transcript = os.path.join(output_dir, name)
+            turns = iter_transcript_turns(transcript, header)
+            first = next(turns, None) # reading the first turn fills the header
+            chat_id = header.get('ID', 'N/A')
+            chat = {'id': int(chat_id) if chat_id.isdigit() else chat_id, 'url': header.get('URL'), 'title': header.get('TITLE')}
+            if first is None: continue
+            corpus.write_turn(chat, 0, *first)
+            for turn_index, (role, text) in enumerate(turns, start=1):
+                corpus.write_turn(chat, turn_index, role, text)
+    finally:
+        corpus.close()
+    print(f"[SUCCESS] Wrote {corpus.records_written} turn records to '{path}'.")
+    return path
+
+def export_parquet(jsonl_path, parquet_path, batch_rows=PARQUET_BATCH_ROWS):
+    """Streams a JSONL corpus into a Parquet file, one row group per batch.
+
+    Only the last record for each (chat_id, turn_index) is exported: a first
+    pass finds the line of each key's last record, the second writes those.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("[WARNING] Parquet export skipped: the optional 'pyarrow' package is not installed.")
+        return None
+    schema = pa.schema([
+        ('chat_id', pa.int64()), ('url', pa.string()), ('title', pa.string()), ('turn_index', pa.int32()),
+        ('role', pa.dictionary(pa.int8(), pa.string())), ('text', pa.string()), ('char_count', pa.int32())
+    ])
+    last_line = {}
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f):
+            record = json.loads(line)
+            last_line[(record.get('chat_id'), record.get('turn_index'))] = line_number
+    keep = set(last_line.values())
+    rows = 0
+    with pq.ParquetWriter(parquet_path, schema, compression='zstd') as writer, open(jsonl_path, 'r', encoding='utf-8') as f:
+        batch = {field: [] for field in CORPUS_FIELDS}
+        for line_number, line in enumerate(f):
+            if line_number not in keep: continue
+            record = json.loads(line)
+            for field in CORPUS_FIELDS:
+                batch[field].append(record.get(field))
+            if len(batch['text']) >= batch_rows:
+                writer.write_table(pa.table(batch, schema=schema)); rows += len(batch['text'])
+                batch = {field: [] for field in CORPUS_FIELDS}
+        if batch['text']:
+            writer.write_table(pa.table(batch, schema=schema)); rows += len(batch['text'])
+    print(f"[SUCCESS] Exported {rows} rows to '{parquet_path}'.")
+    return parquet_path
+
+def main():
+    """Command-line entry point for rebuilding or exporting a run's corpus."""
+    if len(sys.argv) > 2 and sys.argv[1] in ("jsonl", "parquet") and os.path.isdir(sys.argv[2]):
+        output_dir = sys.argv[2]
+        if sys.argv[1] == "jsonl":
+            rebuild_corpus_from_transcripts(output_dir)
+        else:
+            export_parquet(os.path.join(output_dir, CORPUS_FILE), os.path.join(output_dir, PARQUET_FILE))
+    else:
+        print("Usage: python structured_output.py jsonl|parquet <output_dir>")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+
+from snapshot_parser import iter_snapshot_turns, parse_snapshot_to_transcript
+from transcript_writer import iter_transcript_turns
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(REPO_DIR, "debug_page_source.html")
+
+SAMPLE_SNAPSHOT = """<!-- SCRAPER-META {"id": 7, "url": "https://example.test/app/abc", "title": "Sample"} -->
+<html><head><title>ignored</title><script>var fake = "<user-query>";</script></head><body>
+<user-query><div class="query-text-line">  first&nbsp;line  </div><div class="query-text-line">   </div><div class="query-text-line">second​ line</div></user-query>
+<model-response><div class="model-response-text"><p>Para one.</p><p>Para <b>two</b><br>next</p><ul><li>a</li><li>b</li></ul></div></model-response>
+<model-response><div class="other">no response text element</div></model-response>
+</body></html>"""
+
+def test_recorded_page_source():
+    assert list(iter_snapshot_turns(FIXTURE)) == [
+        {'role': 'prompt', 'text': "hello?"},
+        {'role': 'response', 'text': "Hello! How can I help you today?"},
+    ]
+
+def test_recorded_page_source_to_transcript(tmp_path):
+    path, turn_count = parse_snapshot_to_transcript(FIXTURE, str(tmp_path))
+    assert turn_count == 2
+    assert os.path.basename(path) == "debug_page_source.txt"
+    assert list(iter_transcript_turns(path)) == [('prompt', "hello?"), ('response', "Hello! How can I help you today?")]
+
+def test_inner_text_rules_and_metadata(tmp_path):
+    path = tmp_path / "snapshot.html"
+    path.write_text(SAMPLE_SNAPSHOT, encoding='utf-8')
+    meta = {}
+    # A small chunk size splits tags and text across parser feeds.
+    turns = list(iter_snapshot_turns(str(path), meta, chunk_size=16))
+    assert turns == [
+        {'role': 'prompt', 'text': "first line\nsecond line"},
+        {'role': 'response', 'text': "Para one.\n\nPara two\nnext\n\na\nb"},
+    ]
+    assert meta == {'id': 7, 'url': "https://example.test/app/abc", 'title': "Sample"}
@@ -0,0 +1,47 @@
+from transcript_writer import TranscriptWriter, iter_transcript_turns, read_tail_hashes, turn_hash, clean_text, TAIL_TURNS
+
+TURNS = [
+    ('prompt', "Show a markdown rule:\n---\nthanks"),
+    ('response', "Here:\n\n---\n\ndone"),
+    ('prompt', "## PROMPT ##\nis the marker"),
+    ('response', "Quoted:\n\n## RESPONSE ##\n\nend"),
+    ('prompt', "ends with a rule\n\n---"),
+    ('response', "  padded\n\n\n\nlines  "),
+]
+
+def write_transcript(path, turns):
+    with TranscriptWriter(str(path)) as writer:
+        writer.write_header(12, "https://example.test/app/xyz", "Round trip")
+        for role, text in turns:
+            writer.write_turn(role, text)
+    writer.commit()
+    return writer
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "012_Round trip.txt"
+    writer = write_transcript(path, TURNS)
+    header = {}
+    assert list(iter_transcript_turns(str(path), header)) == [(role, clean_text(text)) for role, text in TURNS]
+    assert header == {'ID': "12", 'URL': "https://example.test/app/xyz", 'TITLE': "Round trip"}
+    assert writer.turn_count == len(TURNS)
+
+def test_tail_hashes_match_writer(tmp_path):
+    path = tmp_path / "012_Round trip.txt"
+    writer = write_transcript(path, TURNS)
+    expected = [turn_hash(role, text) for role, text in TURNS[-TAIL_TURNS:]]
+    assert list(writer.tail_hashes) == expected
+    assert read_tail_hashes(str(path)) == (expected, len(TURNS))
+
+def test_copy_turns_then_append(tmp_path):
+    archived = tmp_path / "archived.txt"
+    first = write_transcript(archived, TURNS[:4])
+    path = tmp_path / "appended.txt"
+    with TranscriptWriter(str(path)) as writer:
+        writer.write_header(12, "https://example.test/app/xyz", "Round trip")
+        writer.copy_turns_from(str(archived), first.turn_count, list(first.tail_hashes))
+        for role, text in TURNS[4:]:
+            writer.write_turn(role, text)
+    writer.commit()
+    assert list(iter_transcript_turns(str(path))) == [(role, clean_text(text)) for role, text in TURNS]
+    assert read_tail_hashes(str(path)) == (list(writer.tail_hashes), len(TURNS))
+    assert writer.content_hash() == write_transcript(tmp_path / "full.txt", TURNS).content_hash()
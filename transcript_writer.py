@@ -0,0 +1,225 @@
+#
+# FILENAME: transcript_writer.py
+# AUTHOR:   Simon & Dora
+# VERSION:  1.1 (Streaming Transcript Writer)
+#
+# DESCRIPTION:
+# Owns the .txt transcript format and writes it one turn at a time.
+# Turns go through a buffered writer into 'NNN_title.txt.part' and are
+# flushed as they arrive; only a finished chat is atomically renamed
+# to its final name. Memory stays flat however long the chat is, and
+# a chat interrupted mid-scrape leaves a recoverable .part file.
+# The writer also keeps hashes of the last few turns, so a later delta
+# scrape can find where the archive ends in the live chat, and it can
+# copy an archived transcript's turns byte-for-byte before appending.
+#
+# USAGE:
+#   python transcript_writer.py recover output_v38
+#
+
+import os
+import re
+import sys
+import shutil
+import hashlib
+from collections import deque
+
+## ------------------- CONFIGURATION ------------------- ##
+PARTIAL_SUFFIX = ".part"
+WRITE_BUFFER_SIZE = 64 * 1024
+TAIL_TURNS = 3 # trailing turn hashes kept to locate the end of an archive
+## ----------------------------------------------------- ##
+
+TURN_MARKERS = {'prompt': "## PROMPT ##", 'response': "## RESPONSE ##"}
+
+def clean_text(text):
+    """Strips leading/trailing whitespace and collapses multiple newlines."""
+    if not text: return ""
+    stripped_text = text.strip()
+    return re.sub(r'\n{3,}', '\n\n', stripped_text)
+
+def turn_hash(role, text):
+    """Short hash of a turn as it is saved (role plus cleaned text)."""
+    return hashlib.sha1(f"{role}\n{clean_text(text)}".encode('utf-8')).hexdigest()[:16]
+
+def format_header(chat_id, chat_url, chat_title):
+    """Builds the ID/URL/TITLE block that opens every transcript."""
+    return f"ID: {chat_id}\nURL: {chat_url}\nTITLE: {chat_title}\n\n---\n\n"
+
+def format_turn(role, text):
+    """Formats a single prompt or response turn with its marker."""
+    return f"{TURN_MARKERS[role]}\n\n{clean_text(text)}\n\n---\n\n"
+
+def encode_transcript(text):
+    """Encodes transcript text exactly as a text-mode write would store it on this OS."""
+    return text.replace('\n', os.linesep).encode('utf-8')
+
+class TranscriptWriter:
+    """Streams one transcript to disk through a temporary .part file.
+
+    Use as a context manager: an exception inside the block closes the
+    .part file and leaves it in place for recovery. On success the file is
+    closed but not yet renamed; call commit() (or discard()) afterwards.
+    """
+
+    def __init__(self, filename, buffer_size=WRITE_BUFFER_SIZE):
+        self.filename = filename
+        self.partial_filename = filename + PARTIAL_SUFFIX
+        self.buffer_size = buffer_size
+        self.digest = hashlib.sha256()
+        self.turn_count = 0
+        self.bytes_written = 0
+        self.tail_hashes = deque(maxlen=TAIL_TURNS)
+        self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        if exc_type is not None:
+            print(f"[WARNING] Partial transcript kept at '{self.partial_filename}' ({self.turn_count} turns).")
+        return False
+
+    def open(self):
+        """Opens the .part file for writing. Returns self."""
+        self.file = open(self.partial_filename, 'wb', buffering=self.buffer_size)
+        return self
+
+    def _write(self, text):
+        data = encode_transcript(text)
+        self.file.write(data)
+        self.digest.update(data)
+        self.bytes_written += len(data)
+
+    def write_header(self, chat_id, chat_url, chat_title):
+        self._write(format_header(chat_id, chat_url, chat_title))
+
+    def write_turn(self, role, text):
+        """Writes one turn and pushes it to the OS so a crash cannot lose it."""
+        self._write(format_turn(role, text))
+        self.file.flush()
+        self.turn_count += 1
+        self.tail_hashes.append(turn_hash(role, text))
+
+    def copy_turns_from(self, path, turn_count, tail_hashes):
+        """Copies every turn of an earlier transcript (not its header) unchanged.
+
+        The bytes are copied, not re-parsed; `turn_count` and `tail_hashes`
+        describe the copied turns (e.g. from the run manifest).
+        """
+        header_end = encode_transcript("\n---\n\n")
+        with open(path, 'rb') as source:
+            head = source.read(64 * 1024)
+            start = head.find(header_end)
+            if start < 0: raise ValueError(f"'{path}' has no transcript header.")
+            source.seek(start + len(header_end))
+            shutil.copyfileobj(source, _DigestingFile(self), self.buffer_size)
+        self.file.flush()
+        self.turn_count += turn_count
+        self.tail_hashes.extend(tail_hashes)
+
+    def close(self):
+        if self.file and not self.file.closed:
+            self.file.close()
+
+    def content_hash(self):
+        """SHA-256 of everything written so far."""
+        return self.digest.hexdigest()
+
+    def commit(self):
+        """Atomically moves the finished .part file to its final name."""
+        self.close()
+        os.replace(self.partial_filename, self.filename)
+
+    def discard(self):
+        """Deletes the .part file (e.g. when an identical transcript is linked instead)."""
+        self.close()
+        if os.path.exists(self.partial_filename):
+            os.remove(self.partial_filename)
+
+def iter_transcript_turns(path, header_out=None):
+    """Streams (role, text) turns back out of a saved .txt transcript.
+
+    `path` may also be an open text stream (e.g. an archived blob).
+    If `header_out` is a dict it is filled with the ID/URL/TITLE header.
+    A turn ends at a '---' separator that is followed by the next turn
+    marker (or the end of the file), so '---' lines inside a turn are kept.
+    """
+    if not isinstance(path, (str, os.PathLike)):
+        yield from _iter_turns(path, header_out); return
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from _iter_turns(f, header_out)
+
+def _iter_turns(f, header_out):
+    roles = {marker: role for role, marker in TURN_MARKERS.items()}
+    for line in f:
+        line = line.rstrip('\r\n')
+        if line == '---': break
+        if header_out is not None and ': ' in line:
+            key, value = line.split(': ', 1)
+            header_out[key] = value
+    role, lines = None, []
+    for line in f:
+        line = line.rstrip('\r\n')
+        if line in roles and (role is None or lines[-3:] == ['', '---', '']):
+            if role: yield role, "\n".join(lines[1:-3])
+            role, lines = roles[line], []
+            continue
+        if role: lines.append(line)
+    if role:
+        if lines[-2:] == ['---', '']: lines = lines[:-3]
+        elif lines[-2:] == ['', '---']: lines = lines[:-2]
+        yield role, "\n".join(lines[1:])
+
+class _DigestingFile:
+    """File-like sink that writes through a TranscriptWriter's hash and byte count."""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, data):
+        self.writer.file.write(data)
+        self.writer.digest.update(data)
+        self.writer.bytes_written += len(data)
+        return len(data)
+
+def read_tail_hashes(path, count=TAIL_TURNS):
+    """Hashes of the last `count` turns of a saved transcript, plus its turn count."""
+    tail, turns = deque(maxlen=count), 0
+    for role, text in iter_transcript_turns(path):
+        tail.append(turn_hash(role, text)); turns += 1
+    return list(tail), turns
+
+def find_partial_transcripts(output_dir):
+    """Lists the .part files left behind by interrupted chats."""
+    return sorted(
+        os.path.join(output_dir, name) for name in os.listdir(output_dir)
+        if name.endswith(".txt" + PARTIAL_SUFFIX)
+    )
+
+def recover_partial_transcripts(output_dir):
+    """Promotes .part files to .txt where no complete transcript exists yet."""
+    recovered = 0
+    for partial in find_partial_transcripts(output_dir):
+        final = partial[:-len(PARTIAL_SUFFIX)]
+        with open(partial, 'r', encoding='utf-8', errors='replace') as f:
+            turns = sum(1 for line in f if line.rstrip() in TURN_MARKERS.values())
+        if os.path.exists(final):
+            print(f"[INFO] Skipping '{partial}': a complete transcript already exists.")
+            continue
+        os.replace(partial, final)
+        recovered += 1
+        print(f"[SUCCESS] Recovered {turns} turns -> '{final}'")
+    print(f"[INFO] Recovered {recovered} partial transcript(s) in '{output_dir}'.")
+    return recovered
+
+def main():
+    """Command-line entry point for recovering partial transcripts."""
+    if len(sys.argv) > 2 and sys.argv[1] == "recover" and os.path.isdir(sys.argv[2]):
+        recover_partial_transcripts(sys.argv[2])
+    else:
+        print("Usage: python transcript_writer.py recover <output_dir>")
+
+if __name__ == "__main__":
+    main()